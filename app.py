@@ -16,6 +16,7 @@ PATH_DIR = Path(__file__).resolve().parent
 PATH_DB = PATH_DIR / 'live_database.db'
 PATH_JWT_SECRET_KEY = PATH_DIR / 'auth_jwt_secret_key'
 PATH_PASSWORD = PATH_DIR / 'auth_password'
+MAX_BULK_SIZE = 1000
 
 # TODO: define a main() function?
 
@@ -96,6 +97,60 @@ def insert_into_database(table: str, request_data: dict) -> Response:
         return jsonify({'error': str(e)}), 500
 
 
+def insert_many_into_database(table: str, rows: list) -> Response:
+    """
+    Inserts rows in one transaction. A row that fails a constraint doesn't keep the others from being created,
+    its error is returned with its index, and rows that already exist are counted separately.
+    """
+    created = 0
+    existing = 0
+    errors = []
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        conn.execute('PRAGMA foreign_keys = ON')
+        with conn:
+            for index, values in enumerate(rows):
+                if 'error' in values:
+                    errors.append({'index': index, 'error': values['error']})
+                    continue
+                columns = ', '.join(values.keys())
+                placeholders = ':' + ', :'.join(values.keys())
+                try:
+                    conn.execute(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', values)
+                    created += 1
+                except sqlite3.IntegrityError as e:
+                    if 'UNIQUE constraint failed' in str(e):
+                        existing += 1
+                    else:
+                        errors.append({'index': index, 'error': str(e)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+    return jsonify({'created': created, 'existing': existing, 'errors': errors}), 200
+
+
+def bulk_request_rows() -> list:
+    """The entries of a bulk create request, raises ValueError if the body isn't a list of at most MAX_BULK_SIZE entries."""
+    data = request.get_json()
+    if not isinstance(data, list):
+        raise ValueError('A list of entries is required')
+    if len(data) > MAX_BULK_SIZE:
+        raise ValueError(f'At most {MAX_BULK_SIZE} entries per request')
+    return data
+
+
+@app.route('/capabilities', methods=['GET'])
+def get_capabilities() -> Response:
+    """
+    Lists the optional endpoints this API has, so clients can use them when available.
+
+    curl 'http://localhost:5000/capabilities'
+    """
+    return jsonify({'bulk_endpoints': {TABLE_CHAINS: '/create_chains', TABLE_RPC_URLS: '/create_rpc_urls'},
+                    'max_bulk_size': MAX_BULK_SIZE})
+
+
 @app.route('/create_chain', methods=['POST'])
 @jwt_required()
 def create_chain_record() -> Response:
@@ -117,7 +172,32 @@ def create_chain_record() -> Response:
     return insert_into_database(TABLE_CHAINS, values)
 
 
-# TODO: add endpoint to create multiple URL entries with one request?
+@app.route('/create_chains', methods=['POST'])
+@jwt_required()
+def create_chain_records() -> Response:
+    """
+    Creates records in the 'chains' table, corresponding to a list of entries like those of /create_chain.
+
+    Returns the number of created and already existing records, and the errors of the others by index, example:
+
+    curl -X POST http://localhost:5000/create_chains -d '[{"name": "chain1", "api_class": "substrate"}]' \
+        -H 'Content-Type: application/json'
+    """
+    try:
+        data = bulk_request_rows()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = []
+    for entry in data:
+        if not isinstance(entry, dict) or not all(key in entry for key in ('name', 'api_class')):
+            rows.append({'error': 'Both name and api_class entries are required'})
+        elif not is_valid_api(entry['api_class']):
+            rows.append({'error': 'Invalid api'})
+        else:
+            rows.append({'name': entry['name'], 'api_class': entry['api_class']})
+    return insert_many_into_database(TABLE_CHAINS, rows)
+
+
 @app.route('/create_rpc_url', methods=['POST'])
 @jwt_required()
 def create_rpc_url_record() -> Response:
@@ -139,10 +219,36 @@ def create_rpc_url_record() -> Response:
     return insert_into_database(TABLE_RPC_URLS, values)
 
 
+@app.route('/create_rpc_urls', methods=['POST'])
+@jwt_required()
+def create_rpc_url_records() -> Response:
+    """
+    Creates records in the 'rpc_urls' table, corresponding to a list of entries like those of /create_rpc_url.
+
+    Returns the number of created and already existing records, and the errors of the others by index, example:
+
+    curl -X POST http://localhost:5000/create_rpc_urls -d '[{"url": "http://chain2.com", "chain_name": "chain2"}]' \
+        -H 'Content-Type: application/json'
+    """
+    try:
+        data = bulk_request_rows()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = []
+    for entry in data:
+        if not isinstance(entry, dict) or not all(key in entry for key in ('url', 'chain_name')):
+            rows.append({'error': 'Both url and chain_name entries are required'})
+        elif not is_valid_url(entry['url']):
+            rows.append({'error': 'Invalid url.'})
+        else:
+            rows.append({'url': entry['url'], 'chain_name': entry['chain_name']})
+    return insert_many_into_database(TABLE_RPC_URLS, rows)
+
+
 @app.route('/all/<string:table>', methods=['GET'])
 def get_all_records(table: str) -> Response:
     """
-    Gets all the entries of the table in the path.
+    Gets all the entries of the table in the path. Supports conditional requests with ETag and Last-Modified.
 
     curl 'http://localhost:5000/all/chains'
     """
@@ -166,7 +272,11 @@ def get_all_records(table: str) -> Response:
     if table == TABLE_RPC_URLS:
         for record in records:
             results.append({'url': record[0], 'chain_name': record[1]})
-    return jsonify(results)
+    # Validators let pollers refresh with a conditional request that costs a 304 when nothing changed
+    response = jsonify(results)
+    response.add_etag()
+    response.last_modified = Path(app.config['DATABASE']).stat().st_mtime
+    return response.make_conditional(request)
 
 
 @app.route('/get_chain_by_name/<string:name>', methods=['GET'])
@@ -260,6 +370,37 @@ def get_urls(chain_name: str) -> Response:
     return jsonify({'error': f'No urls found for chain {chain_name}'}), 404
 
 
+@app.route('/update_chain', methods=['PUT'])
+@jwt_required()
+def update_chain_record() -> Response:
+    """
+    Updates the api_class of the chains entry corresponding to the input name.
+
+    Requires that url parameter 'name' is present in the request, example:
+
+    curl -X PUT -H 'Content-Type: application/json' -d '{"api_class": "ethereum"}' \
+        'http://localhost:5000/update_chain?name=chain5'
+    """
+    name = request.args.get('name')
+    if not name:
+        return jsonify({'error': "url parameter 'name' required for update_chain request"}), 400
+    try:
+        api_class = request.json['api_class']
+    except KeyError as e:
+        return jsonify({'error': f'Missing required parameters, {e}'}), 400
+    if not is_valid_api(api_class):
+        return jsonify({'error': "Invalid api"}), 500
+
+    conn = sqlite3.connect(app.config['DATABASE'])
+    cursor = conn.cursor()
+    cursor.execute(f'UPDATE {TABLE_CHAINS} SET api_class=? WHERE name=?', (api_class, name))
+    conn.commit()
+    conn.close()
+    if cursor.rowcount == 0:
+        return jsonify({'error': f'Record with name \'{name}\' not found'}), 404
+    return jsonify({'name': name, 'api_class': api_class})
+
+
 @app.route('/update_url', methods=['PUT'])
 @jwt_required()
 def update_url_record() -> Response:
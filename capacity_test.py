@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+from datetime import datetime
+import json
+import logging
+import math
+from pathlib import Path
+import random
+import sys
+import time
+import aiohttp
+import requests
+from influxdb_client import InfluxDBClient
+from influxdb_client.client.write_api import SYNCHRONOUS
+from color_logger import ColoredFormatter
+import influxdb_utils as iu
+from rpc_utils import timed_request
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+console_handler = logging.StreamHandler(sys.stdout)
+console_handler.setLevel(logging.INFO)
+formatter = ColoredFormatter('%(asctime)s - %(levelname)s - %(message)s')
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+# Cheap head-of-chain calls used when no method mix is given.
+# For aptos the "method" is a path appended to the endpoint URL.
+DEFAULT_METHOD_MIX = {
+    'ethereum': {'eth_blockNumber': 1},
+    'substrate': {'chain_getHeader': 1},
+    'aptos': {'': 1},
+}
+# Seconds a worker waits after its first failed request in a row, doubled with every further one up to the timeout
+ERROR_BACKOFF = 0.1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a concurrent capacity test against RPC endpoints and record RPS and tail latency')
+    parser.add_argument('config_file', type=str, help="The file with the target database's config", default='config.json')
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument('--chain', type=str, help='Test every RPC URL of this chain, one after the other')
+    target_group.add_argument('--url', type=str, help='Test a single RPC URL')
+    parser.add_argument('-c', '--concurrency', type=int, help='Number of concurrent requests in flight, default=10', default=10)
+    parser.add_argument('-d', '--duration', type=float, help='Duration of the burst in seconds, default=10', default=10.0)
+    parser.add_argument('-m', '--methods', type=str, help="Weighted method mix, e.g. 'eth_blockNumber:3,eth_chainId:1'")
+    parser.add_argument('-t', '--timeout', type=float, help='Timeout per request in seconds, default=5', default=5.0)
+    parser.add_argument('-i', '--interval', type=float, help='Repeat the test every INTERVAL seconds instead of running once')
+    parser.add_argument('--no_write', action='store_true', help='Only print the results, do not write them to InfluxDB')
+    args = parser.parse_args()
+
+    if not (Path.cwd() / args.config_file).exists():
+        raise FileNotFoundError
+    with open(args.config_file, encoding='utf-8') as f:
+        config = json.load(f)
+
+    if args.url:
+        endpoints = [get_endpoint_by_url(config['RPC_FLASK_API'], args.url)]
+    else:
+        endpoints = get_endpoints_by_chain(config['RPC_FLASK_API'], args.chain)
+
+    while True:
+        records = []
+        for chain, url, api_class in endpoints:
+            if not args.methods and api_class not in DEFAULT_METHOD_MIX:
+                logger.error("No default method mix for api_class %s, skipped %s. Pass one with -m", api_class, url)
+                continue
+            method_mix = parse_method_mix(args.methods) if args.methods else DEFAULT_METHOD_MIX[api_class]
+            logger.info("Capacity test of %s: concurrency=%s duration=%ss methods=%s", url, args.concurrency, args.duration, method_mix)
+            summary = asyncio.run(run_capacity_test(url, api_class, args.concurrency, args.duration, method_mix, args.timeout))
+            logger.info("Result for %s: %s", url, json.dumps(summary))
+            records.append(iu.capacity_test_point(chain, url, summary, datetime.utcnow()))
+        if not args.no_write:
+            write_capacity_results(config, records)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+async def run_capacity_test(api_url: str, api_class: str, concurrency: int, duration: float, method_mix: dict, timeout: float = 5.0) -> dict:
+    """
+    Keep `concurrency` requests in flight against `api_url` for `duration` seconds and summarize the outcome.
+
+    Methods are drawn from `method_mix`, a dict of method name to relative weight. A worker backs off after a failed
+    request, so a dead endpoint that fails requests at once isn't hammered in a busy loop for the whole duration.
+    """
+    methods = list(method_mix.keys())
+    weights = list(method_mix.values())
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(seed: int):
+        nonlocal errors
+        rng = random.Random(seed)
+        failures = 0
+        while time.monotonic() < deadline:
+            method = rng.choices(methods, weights)[0]
+            info = await timed_request(session, api_url, api_class, method)
+            if info['exit_code'] == 0:
+                latencies.append(info['time_total'])
+                failures = 0
+            else:
+                errors += 1
+                failures += 1
+                backoff = min(timeout, ERROR_BACKOFF * 2 ** (failures - 1), deadline - time.monotonic())
+                if backoff > 0:
+                    await asyncio.sleep(backoff)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        start_time = time.monotonic()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.monotonic() - start_time
+
+    return summarize(latencies, errors, elapsed, concurrency, method_mix)
+
+
+def summarize(latencies: list, errors: int, elapsed: float, concurrency: int, method_mix: dict) -> dict:
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        'methods': ','.join(f'{m or "/"}:{w}' for m, w in method_mix.items()),
+        'concurrency': concurrency,
+        'duration': elapsed,
+        'requests': total,
+        'errors': errors,
+        'rps': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'error_rate': errors / total if total > 0 else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p99': percentile(latencies, 99),
+    }
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list, 0.0 for an empty list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(len(sorted_values) * q / 100))
+    return float(sorted_values[rank - 1])
+
+
+def parse_method_mix(spec: str) -> dict:
+    """Parse 'method_a:3,method_b:1' into {'method_a': 3.0, 'method_b': 1.0}, the weight defaults to 1."""
+    method_mix = {}
+    for item in spec.split(','):
+        method, _, weight = item.strip().partition(':')
+        method_mix[method] = float(weight) if weight else 1.0
+    return method_mix
+
+
+def get_endpoint_by_url(rpc_flask_api: str, url: str) -> tuple:
+    protocol, address = url.split('://')
+    response = requests.get(f'{rpc_flask_api}/get_chain_by_url', params={'protocol': protocol, 'address': address}, timeout=3)
+    response.raise_for_status()
+    chain = response.json()
+    return (chain['name'], url, chain['api_class'])
+
+
+def get_endpoints_by_chain(rpc_flask_api: str, chain_name: str) -> list:
+    response = requests.get(f'{rpc_flask_api}/chain_info', params={'chain_name': chain_name}, timeout=3)
+    response.raise_for_status()
+    chain_info = response.json()
+    return [(chain_info['chain_name'], url, chain_info['api_class']) for url in chain_info['urls']]
+
+
+def write_capacity_results(config: dict, records: list) -> None:
+    try:
+        client = InfluxDBClient(url=config['INFLUXDB_URL'], token=config['INFLUXDB_TOKEN'], org=config['INFLUXDB_ORG'])
+        write_api = client.write_api(write_options=SYNCHRONOUS)
+        write_api.write(bucket=config['INFLUXDB_BUCKET'], record=records)
+        client.close()
+    except Exception as e:
+        logger.error("Failed writing capacity results to influx. %s", str(e))
+
+
+if __name__ == '__main__':
+    main()
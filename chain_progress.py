@@ -0,0 +1,102 @@
+class RingBuffer:
+    """Fixed-size window of (time, value) samples where appending and reading the rate over the window are O(1)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = [0.0] * capacity
+        self.values = [0] * capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, t: float, value) -> None:
+        end = (self.start + self.count) % self.capacity
+        self.times[end] = t
+        self.values[end] = value
+        if self.count < self.capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def last(self) -> tuple:
+        end = (self.start + self.count - 1) % self.capacity
+        return self.times[end], self.values[end]
+
+    def rate(self) -> float:
+        """Change of the value per second between the oldest and newest sample, None if undefined."""
+        if self.count < 2:
+            return None
+        end = (self.start + self.count - 1) % self.capacity
+        dt = self.times[end] - self.times[self.start]
+        if dt <= 0:
+            return None
+        return (self.values[end] - self.values[self.start]) / dt
+
+
+class ChainProgress:
+    """
+    Rolling-window progress statistics per chain and per endpoint, kept between probe cycles.
+
+    A block height diff means very different things on a chain with 400 ms blocks and one with 12 s blocks,
+    so this tracks the block production rate of each chain and turns diffs into seconds of lag. Per endpoint
+    it tracks when its height last advanced and how fast it's catching up (in blocks per second, negative
+    when falling further behind). Every update is O(1), windows hold the last `window` samples.
+    """
+
+    def __init__(self, window: int = 30):
+        self.window = window
+        self.chain_heights = {}
+        self.endpoint_diffs = {}
+        self.endpoint_advances = {}
+        self.chain_endpoints = {}
+
+    def observe_chain(self, chain: str, max_height: int, now: float) -> None:
+        """Record the highest height of a chain, only advances are kept so the window spans real progress."""
+        heights = self.chain_heights.get(chain)
+        if heights is None:
+            heights = self.chain_heights[chain] = RingBuffer(self.window)
+        if len(heights) == 0 or max_height > heights.last()[1]:
+            heights.append(now, max_height)
+
+    def observe_endpoint(self, chain: str, url: str, height: int, diff: int, now: float) -> None:
+        self.chain_endpoints.setdefault(chain, set()).add(url)
+        diffs = self.endpoint_diffs.get(url)
+        if diffs is None:
+            diffs = self.endpoint_diffs[url] = RingBuffer(self.window)
+        diffs.append(now, diff)
+        last_height, _ = self.endpoint_advances.get(url, (None, None))
+        if last_height is None or height > last_height:
+            self.endpoint_advances[url] = (height, now)
+
+    def block_rate(self, chain: str) -> float:
+        heights = self.chain_heights.get(chain)
+        return heights.rate() if heights else None
+
+    def stats(self, chain: str, url: str, diff: int, now: float) -> dict:
+        """Fields for the block_height_request point of an endpoint, left out when not known yet."""
+        stats = {}
+        block_rate = self.block_rate(chain)
+        if block_rate:
+            stats['block_rate'] = block_rate
+            stats['lag_seconds'] = diff / block_rate
+        if url in self.endpoint_advances:
+            stats['time_since_advance'] = now - self.endpoint_advances[url][1]
+        diffs = self.endpoint_diffs.get(url)
+        diff_rate = diffs.rate() if diffs else None
+        if diff_rate is not None:
+            stats['catch_up_rate'] = 0.0 - diff_rate
+        return stats
+
+    def forget(self, endpoints: list) -> None:
+        """Drop the state of removed endpoints, and of their chain once it has no endpoints left."""
+        for chain, url, _ in endpoints:
+            self.endpoint_diffs.pop(url, None)
+            self.endpoint_advances.pop(url, None)
+            urls = self.chain_endpoints.get(chain)
+            if urls is not None:
+                urls.discard(url)
+                if not urls:
+                    del self.chain_endpoints[chain]
+                    self.chain_heights.pop(chain, None)
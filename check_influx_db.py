@@ -1,33 +1,156 @@
 #!/usr/bin/env python3
 
 import json
-from influxdb_client import InfluxDBClient
+from datetime import datetime, timedelta, timezone
+import re
+import statistics
+import sys
+import time
+import uuid
+from influxdb_client import InfluxDBClient, Point
+from influxdb_client.client.write_api import SYNCHRONOUS
 import argparse
 from pathlib import Path
 
+PATH_DEFAULT_DASHBOARD = Path(__file__).parent.absolute() / 'grafana' / 'block-height-monitoring-dashboard.json'
+CHECK_MEASUREMENT = 'influxdb_check'
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
 
-def test_influxdb_connection(url, token, org, bucket):
-    try:
-        client = InfluxDBClient(url=url, token=token, org=org)
-        if client.ping():
-            print("Server responds")
-        else:
-            print("Server is not respongding to ping()")
 
-        query_api = client.query_api()
+def parse_duration(duration: str) -> timedelta:
+    match = re.fullmatch(r'(\d+)([smhdw])', duration)
+    if not match:
+        raise ValueError(f'Invalid duration {duration}, expected e.g. 30m, 24h or 7d')
+    return timedelta(seconds=int(match.group(1)) * DURATION_UNITS[match.group(2)])
 
-        query = f'from(bucket: "{bucket}") |> range(start: -1h) |> last()'
-        result = query_api.query(query)
 
-        print(f'Successfully connected to InfluxDB instance at {url}')
-        print(f'Result: {result}')
-    except Exception as e:
-        print(f'Error connecting to InfluxDB instance at {url}: {str(e)}')
+def flux_time(t: datetime) -> str:
+    return t.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Check InfluxDB status')
+def dashboard_queries(dashboard_file: Path) -> list:
+    """The (panel title, Flux query) of every panel in a Grafana dashboard that has its own query."""
+    with open(dashboard_file, encoding='utf-8') as f:
+        dashboard = json.load(f)
+    queries = []
+    for panel in dashboard['panels']:
+        for target in panel.get('targets', []):
+            if target.get('query'):
+                queries.append((panel['title'], target['query']))
+    return queries
+
+
+def render_query(query: str, start: datetime, stop: datetime, chain: str, max_data_points: int = 1000) -> str:
+    """Substitute the Grafana variables like Grafana does, with `$__interval` from the range and the number of points."""
+    interval = max(10, int((stop - start).total_seconds() / max_data_points))
+    query = query.replace('${chain_name}', chain).replace('$__interval', f'{interval}s')
+    # Imports have to stay first, v is defined right after them
+    lines = query.split('\n')
+    imports = [line for line in lines if line.startswith('import ')]
+    rest = [line for line in lines if not line.startswith('import ')]
+    v = f'v = {{timeRangeStart: {flux_time(start)}, timeRangeStop: {flux_time(stop)}}}'
+    return '\n'.join(imports + [v] + rest)
+
+
+def benchmark_queries(client: InfluxDBClient, queries: list, ranges: list, chain: str, repeat: int) -> list:
+    query_api = client.query_api()
+    results = []
+    for range_name in ranges:
+        stop = datetime.now(timezone.utc)
+        start = stop - parse_duration(range_name)
+        for title, query in queries:
+            flux = render_query(query, start, stop, chain)
+            seconds = []
+            rows = 0
+            for _ in range(repeat):
+                query_start = time.perf_counter()
+                tables = query_api.query(flux)
+                seconds.append(time.perf_counter() - query_start)
+                rows = sum(len(table.records) for table in tables)
+            results.append({'panel': title, 'range': range_name, 'rows': rows, 'seconds': seconds,
+                            'median_seconds': statistics.median(seconds), 'max_seconds': max(seconds)})
+    return results
+
+
+def cardinality_report(client: InfluxDBClient, bucket: str, tags: list, lookback: str) -> dict:
+    """The number of series per measurement and of distinct values per tag over the lookback."""
+    query_api = client.query_api()
+
+    def scalar(flux: str) -> int:
+        tables = query_api.query(flux)
+        return sum(int(record.get_value()) for table in tables for record in table.records)
+
+    measurements = [record.get_value() for table in query_api.query(
+        f'import "influxdata/influxdb/schema"\nschema.measurements(bucket: "{bucket}", start: -{lookback})') for record in table.records]
+    report = {
+        'lookback': lookback,
+        'series': scalar(f'import "influxdata/influxdb"\ninfluxdb.cardinality(bucket: "{bucket}", start: -{lookback})'),
+        'measurements': {},
+        'tags': {},
+    }
+    for measurement in measurements:
+        report['measurements'][measurement] = scalar(
+            f'import "influxdata/influxdb"\ninfluxdb.cardinality(bucket: "{bucket}", start: -{lookback}, '
+            f'predicate: (r) => r._measurement == "{measurement}")')
+    for tag in tags:
+        report['tags'][tag] = scalar(
+            f'import "influxdata/influxdb/schema"\nschema.tagValues(bucket: "{bucket}", tag: "{tag}", start: -{lookback}) |> count()')
+    return report
+
+
+def write_read_latency(client: InfluxDBClient, org: str, bucket: str, timeout: float = 30.0) -> dict:
+    """Write a point and poll until a query returns it, then delete it again."""
+    probe_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    start = time.perf_counter()
+    client.write_api(write_options=SYNCHRONOUS).write(bucket=bucket, record=Point(CHECK_MEASUREMENT).tag('probe', probe_id).field('value', 1).time(now))
+    write_seconds = time.perf_counter() - start
+    flux = f'from(bucket: "{bucket}") |> range(start: -5m) ' \
+           f'|> filter(fn: (r) => r._measurement == "{CHECK_MEASUREMENT}" and r.probe == "{probe_id}")'
+    visible_seconds = None
+    while time.perf_counter() - start < timeout:
+        if any(table.records for table in client.query_api().query(flux)):
+            visible_seconds = time.perf_counter() - start
+            break
+        time.sleep(0.05)
+    client.delete_api().delete(now - timedelta(minutes=1), now + timedelta(minutes=1), f'_measurement="{CHECK_MEASUREMENT}" AND probe="{probe_id}"',
+                               bucket=bucket, org=org)
+    return {'write_seconds': write_seconds, 'visible_seconds': visible_seconds}
+
+
+def first_chain(client: InfluxDBClient, bucket: str) -> str:
+    tables = client.query_api().query(f'import "influxdata/influxdb/schema"\nschema.tagValues(bucket: "{bucket}", tag: "chain", start: -1d)')
+    values = [record.get_value() for table in tables for record in table.records]
+    return values[0] if values else ''
+
+
+def check_report(report: dict, max_series: int = None, max_query_seconds: float = None) -> list:
+    """Descriptions of the thresholds the report exceeds."""
+    violations = []
+    cardinality = report.get('cardinality')
+    if max_series is not None and cardinality and cardinality['series'] > max_series:
+        violations.append(f"{cardinality['series']} series, more than {max_series}")
+    for result in report.get('queries', []):
+        if max_query_seconds is not None and result['median_seconds'] > max_query_seconds:
+            violations.append(f"{result['panel']} over {result['range']} took {result['median_seconds']:.3f}s, more than {max_query_seconds}s")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check InfluxDB status, benchmark the dashboard queries and report the series cardinality')
     parser.add_argument('config_file', type=str, help="The file with the target database's config")
+    parser.add_argument('--dashboard', type=str, help=f'Grafana dashboard with the queries to time, default={PATH_DEFAULT_DASHBOARD}',
+                        default=PATH_DEFAULT_DASHBOARD)
+    parser.add_argument('--ranges', type=str, help='Comma separated time ranges to run the queries over, default=1h,24h,7d,30d', default='1h,24h,7d,30d')
+    parser.add_argument('--chain', type=str, help='The chain the queries are run for, default=the first chain in the bucket')
+    parser.add_argument('--repeat', type=int, help='How many times each query is run, default=3', default=3)
+    parser.add_argument('--tags', type=str, help='Comma separated tags to count the values of, default=url,chain,host,provider',
+                        default='url,chain,host,provider')
+    parser.add_argument('--lookback', type=str, help='Time range of the cardinality report, default=30d', default='30d')
+    parser.add_argument('--no_write', action='store_true', help="Don't measure the write-then-read latency")
+    parser.add_argument('--max_series', type=int, help='Exit with 1 if the bucket has more series than this')
+    parser.add_argument('--max_query_seconds', type=float, help='Exit with 1 if the median time of a query is longer than this')
+    parser.add_argument('-o', '--output', type=str, help='Write the JSON report to this file instead of stdout')
     args = parser.parse_args()
 
     if not (Path.cwd() / args.config_file).exists():
@@ -35,10 +158,35 @@ if __name__ == '__main__':
     with open(args.config_file, encoding='utf-8') as f:
         config = json.load(f)
 
-    rpc_flask_api = config['RPC_FLASK_API']
     influxdb_url = config['INFLUXDB_URL']
     influxdb_token = config['INFLUXDB_TOKEN']
     influxdb_org = config['INFLUXDB_ORG']
     influxdb_bucket = config['INFLUXDB_BUCKET']
 
-    test_influxdb_connection(influxdb_url, influxdb_token, influxdb_org, influxdb_bucket)
+    report = {'url': influxdb_url, 'bucket': influxdb_bucket, 'time': flux_time(datetime.now(timezone.utc))}
+    with InfluxDBClient(url=influxdb_url, token=influxdb_token, org=influxdb_org) as client:
+        try:
+            report['ping'] = client.ping()
+            if report['ping']:
+                chain = args.chain or first_chain(client, influxdb_bucket)
+                report['chain'] = chain
+                report['queries'] = benchmark_queries(client, dashboard_queries(args.dashboard), args.ranges.split(','), chain, args.repeat)
+                report['cardinality'] = cardinality_report(client, influxdb_bucket, args.tags.split(','), args.lookback)
+                if not args.no_write:
+                    report['write_read'] = write_read_latency(client, influxdb_org, influxdb_bucket)
+        except Exception as e:
+            report['error'] = str(e)
+    report['violations'] = check_report(report, args.max_series, args.max_query_seconds)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if not report.get('ping') or 'error' in report or report['violations']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,23 @@
 import requests
 import json
 import argparse
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import gzip
+import hashlib
+import itertools
+import os
+import random
+import re
+import shutil
 import sqlite3
-import websocket
+import tempfile
+import time
+from datetime import datetime, timezone
 from pathlib import Path
+from urllib.parse import urlsplit
+import aiohttp
 
 
 DEFAULT_URL = 'http://localhost:5000'
@@ -21,6 +35,11 @@ PATH_DEFAULT_OUT_DIR = PATH_DIR / 'out'
 TABLE_CHAINS = 'chains'
 TABLE_RPC_URLS = 'rpc_urls'
 
+IMPORT_MODES = ('ignore', 'upsert')
+IMPORT_BATCH_SIZE = 500
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description='Utility script to work with an SQLite database served by a Flask API')
@@ -34,6 +53,14 @@ def main() -> None:
     import_target_group = parser_import.add_mutually_exclusive_group(required=True)
     import_target_group.add_argument('-db', '--target_db', type=str, help='The path to the local database file')
     import_target_group.add_argument('-url', '--target_url', type=str, help='The url for the API of the database')
+    parser_import.add_argument('--mode', type=str, choices=IMPORT_MODES,
+                               help='Skip entries of a --target_db import that already exist with other values, or update them (upsert), '
+                                    'default=ignore')
+    parser_import.add_argument('--concurrency', type=int, default=8, help='Concurrent requests of an API import, default=8')
+    parser_import.add_argument('--retries', type=int, default=3,
+                               help='Retries of a request of an API import that failed with a transient error, default=3')
+    parser_import.add_argument('--checkpoint', type=str,
+                               help='File to save the progress of an API import to, an interrupted import run again with it resumes')
     parser_import.set_defaults(func=import_data)
     # Export
     parser_export = subparsers.add_parser('export', help='Export data from a database to JSON files')
@@ -44,6 +71,32 @@ def main() -> None:
     export_target_group.add_argument('-db', '--source_db', type=str, help='The path to the local database file')
     export_target_group.add_argument('-url', '--source_url', type=str, help='The URL for the API of the database')
     parser_export.set_defaults(func=export_data)
+    # Sync
+    parser_sync = subparsers.add_parser('sync', help='Make a database hold exactly the chains and RPC URL:s of JSON files')
+    parser_sync.add_argument('--chains', type=str,
+                             help=f'JSON file with the chains to sync, default={PATH_DEFAULT_CHAINS}', default=PATH_DEFAULT_CHAINS)
+    parser_sync.add_argument('--rpc_urls', type=str,
+                             help=f'JSON file with the RPC URL:s to sync, default={PATH_DEFAULT_RPC_URLS}', default=PATH_DEFAULT_RPC_URLS)
+    sync_target_group = parser_sync.add_mutually_exclusive_group(required=True)
+    sync_target_group.add_argument('-db', '--target_db', type=str, help='The path to the local database file')
+    sync_target_group.add_argument('-url', '--target_url', type=str, help='The url for the API of the database')
+    parser_sync.add_argument('--dry_run', action='store_true', help='Only print the changes the sync would make')
+    parser_sync.add_argument('--concurrency', type=int, default=8, help='Concurrent requests of an API sync, default=8')
+    parser_sync.add_argument('--retries', type=int, default=3,
+                             help='Retries of a request of an API sync that failed with a transient error, default=3')
+    parser_sync.set_defaults(func=sync_data)
+    # Snapshot and restore
+    parser_snapshot = subparsers.add_parser('snapshot', help='Take a compressed and checksummed copy of a local database, also while it is in use')
+    parser_snapshot.add_argument('--source_db', type=str, help=f'The path to the local database file, default={PATH_DEFAULT_DB}', default=PATH_DEFAULT_DB)
+    parser_snapshot.add_argument('--target', type=str,
+                                 help=f'The snapshot file, default=<database name>_<UTC time>.db.gz in {PATH_DEFAULT_OUT_DIR}')
+    parser_snapshot.add_argument('--force', action='store_true', help='Force snapshot to overwrite files without asking')
+    parser_snapshot.set_defaults(func=snapshot_data)
+    parser_restore = subparsers.add_parser('restore', help='Replace a local database with a snapshot')
+    parser_restore.add_argument('snapshot', type=str, help='The snapshot file, with its checksum file next to it')
+    parser_restore.add_argument('--target_db', type=str, help=f'The path to the local database file, default={PATH_DEFAULT_DB}', default=PATH_DEFAULT_DB)
+    parser_restore.add_argument('--force', action='store_true', help='Force restore to overwrite the database without asking')
+    parser_restore.set_defaults(func=restore_data)
 
     # Make an RPC request
     parser_request = subparsers.add_parser('request', help='Send a request to the Flask API serving the database')
@@ -76,9 +129,15 @@ def main() -> None:
                              help=f'Directory containing the JSON files, default={PATH_DEFAULT_OUT_DIR}', default=PATH_DEFAULT_OUT_DIR)
     parser_json.add_argument('-r', '--reverse', action='store_true', help='Reverse the order the list of RPC:s is parsed')
     parser_json.add_argument('-f', '--filter', type=str, help='Filter the list of chains to validate')
+    parser_json.add_argument('--concurrency', type=int, default=64, help='Endpoints validated at a time, default=64')
+    parser_json.add_argument('--per_host', type=int, default=4, help='Endpoints of the same host validated at a time, default=4')
+    parser_json.add_argument('--timeout', type=float, default=5, help='Timeout of the validation of an endpoint in seconds, default=5')
+    parser_json.add_argument('-o', '--output', type=str, help='Write a JSON report with the result, latency and block height of every URL to this file')
     parser_json.set_defaults(func=validate_json)
 
     args = parser.parse_args()
+    if args.func is import_data and args.mode and args.target_url:
+        parser_import.error('--mode only applies to --target_db, an API import never changes existing entries')
     args.func(args)
 
 
@@ -87,95 +146,579 @@ def main() -> None:
 def import_data(args) -> None:
     print(f'Import source: chains file  {args.chains}')
     print(f'Import source: RPC URL file {args.rpc_urls}')
-    chains = load_json_file(args.chains)
-    rpc_urls = load_json_file(args.rpc_urls)
     if args.target_url:
         print(f'Import target: API at URL {args.target_url}')
-        api_import_from_json_files(chains, rpc_urls, args.target_url)
+        chains = load_json_file(args.chains)
+        rpc_urls = load_json_file(args.rpc_urls)
+        counters = api_import_from_json_files(chains, rpc_urls, args.target_url, args.concurrency, args.retries, args.checkpoint)
+        print_import_summary(counters)
     if args.target_db:
         print(f'Import target: database on path {args.target_db}')
-        local_import_from_json_files(chains, rpc_urls, args.target_db)
+        # Stream the files, so huge imports don't have to fit in memory as JSON text and objects at once
+        chains = stream_json_file(args.chains)
+        rpc_urls = stream_json_file(args.rpc_urls)
+        counters = local_import_from_json_files(chains, rpc_urls, args.target_db, mode=args.mode or 'ignore')
+        print_import_summary(counters)
 
 
-def api_import_from_json_files(chains: dict, rpc_urls: dict, api_url: str) -> None:
+def api_import_from_json_files(chains: list, rpc_urls: list, api_url: str, concurrency: int = 8, retries: int = 3,
+                               checkpoint_path: Path = None) -> dict:
     """
-    Imports data from JSON files into an SQLite database.
-    Assumes the JSON files has a specific format as defined by XYZ. # TODO: mention the schema when implemented
+    Imports chains and RPC URL:s through the API, with `concurrency` requests at a time over one keep-alive session.
+
+    Uses the bulk endpoints if the API advertises them in /capabilities and posts the entries one by one otherwise.
+    Chains are imported before RPC URL:s, which need their chain to exist. With a checkpoint file, the entries
+    imported so far are saved to it as they're done and skipped when the import is run again.
+    Returns counters per table of added, existing, resumed and failed entries.
     """
     authorization_header = get_auth_header(api_url)
+    checkpoint = ImportCheckpoint(checkpoint_path)
+    counters = {}
+    with create_session(concurrency) as session:
+        capabilities = get_capabilities(session, api_url)
+        for table, entries, key_field, endpoint in ((TABLE_CHAINS, chains, 'name', '/create_chain'),
+                                                    (TABLE_RPC_URLS, rpc_urls, 'url', '/create_rpc_url')):
+            if entries:
+                bulk_endpoint = capabilities.get('bulk_endpoints', {}).get(table)
+                bulk_size = capabilities.get('max_bulk_size', 1) if bulk_endpoint else 1
+                counters[table] = api_import_entries(session, api_url + (bulk_endpoint or endpoint), bool(bulk_endpoint), bulk_size,
+                                                     entries, table, key_field, authorization_header, checkpoint, concurrency, retries)
+    if checkpoint.path and checkpoint.path.exists() and not any(c['invalid'] for c in counters.values()):
+        checkpoint.path.unlink()  # Everything is imported, a later import should start over
+    return counters
+
+
+def api_import_entries(session: requests.Session, url: str, bulk: bool, bulk_size: int, entries: list, table: str, key_field: str,
+                       headers: dict, checkpoint, concurrency: int, retries: int) -> dict:
+    counters = {'added': 0, 'existing': 0, 'resumed': 0, 'invalid': 0}
+    pending = []
+    for entry in entries:
+        if checkpoint.is_done(table, entry[key_field]):
+            counters['resumed'] += 1
+        else:
+            pending.append(entry)
+    batches = [pending[i:i + bulk_size] for i in range(0, len(pending), bulk_size)]
+
+    def post_batch(batch: list) -> dict:
+        """The number of added and existing entries of the batch and the errors of the others by index."""
+        try:
+            response = request_with_retry(session, 'POST', url, headers, retries, json=batch if bulk else batch[0])
+        except requests.exceptions.RequestException as e:
+            return {'added': 0, 'existing': 0, 'errors': dict.fromkeys(range(len(batch)), str(e))}
+        if bulk and response.status_code == 200:
+            result = response.json()
+            return {'added': result['created'], 'existing': result['existing'],
+                    'errors': {error['index']: error['error'] for error in result['errors']}}
+        if not bulk and response.status_code == 201:
+            return {'added': 1, 'existing': 0, 'errors': {}}
+        if not bulk and 'UNIQUE constraint failed' in response.text:
+            return {'added': 0, 'existing': 1, 'errors': {}}
+        return {'added': 0, 'existing': 0, 'errors': dict.fromkeys(range(len(batch)), f'{response.status_code} {response.text}')}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(post_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Like a bulk response without JSON or its counts, the batch failed but the others go on
+                result = {'added': 0, 'existing': 0, 'errors': dict.fromkeys(range(len(batch)), f'invalid response, {e!r}')}
+            counters['added'] += result['added']
+            counters['existing'] += result['existing']
+            counters['invalid'] += len(result['errors'])
+            for index, error in result['errors'].items():
+                print(f'Error: {batch[index][key_field]}: {error}')
+            checkpoint.mark(table, [entry[key_field] for index, entry in enumerate(batch) if index not in result['errors']])
+    return counters
+
+
+def request_with_retry(session: requests.Session, method: str, url: str, headers: dict, retries: int = 3, backoff: float = 0.5,
+                       timeout: float = 30, **kwargs) -> requests.Response:
+    """
+    A request with up to `retries` retries on connection errors, timeouts and overload responses, with exponential
+    backoff and jitter. Keyword arguments like `json` and `params` are passed on to the session.
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == retries:
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def create_session(concurrency: int) -> requests.Session:
+    """A session that keeps a connection alive per concurrent request, instead of connecting for every request."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_capabilities(session: requests.Session, api_url: str) -> dict:
+    """The optional endpoints of the API, or an empty dict for an API without /capabilities."""
+    try:
+        response = session.get(api_url + '/capabilities', timeout=5)
+    except requests.exceptions.RequestException:
+        return {}
+    return response.json() if response.status_code == 200 else {}
 
-    if chains:
-        url_format = api_url + '/create_chain'
-        unique_chain_counter = 0
-        for chain in chains:
-            response = requests.post(url_format, json=chain, headers=authorization_header, timeout=5)
-            if response.status_code == 201:
-                print(f'> Added chain {chain["name"]}')
-            elif "UNIQUE constraint failed" in response.text:
-                unique_chain_counter = unique_chain_counter + 1
-            else:
-                print(f"Error: {response.status_code}", response.text)
-        if unique_chain_counter > 0:
-            print(f"{unique_chain_counter} chains already existing in the database were skipped")
-
-    if rpc_urls:
-        url_format = api_url + '/create_rpc_url'
-        unique_rpc_counter = 0
-        for rpc_url in rpc_urls:
-            response = requests.post(url_format, json=rpc_url, headers=authorization_header, timeout=5)
-            if response.status_code == 201:
-                print(f'> Added RPC URL {rpc_url["url"]}')
-            elif "UNIQUE constraint failed" in response.text:
-                unique_rpc_counter = unique_rpc_counter + 1
-            else:
-                print(f"Error: {response.status_code}", response.text)
-        if unique_rpc_counter > 0:
-            print(f"{unique_rpc_counter} RPC URL:s already existing in the database were skipped")
 
+class ImportCheckpoint:
+    """
+    The keys of the entries imported so far per table, appended to a JSON lines file if there is one.
 
-def local_import_from_json_files(chains: dict, rpc_urls: dict, db_file: str) -> None:
+    Every batch appends a line with its table and keys, so a save costs the batch instead of all keys so far.
+    A line cut off by an interrupted save is dropped when the file is loaded, its entries are imported again.
     """
-    Imports data from JSON files into an SQLite database.
-    Assumes the JSON files has a specific format as defined by XYZ. # TODO: mention the schema when implemented
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path) if path else None
+        self.done = {TABLE_CHAINS: set(), TABLE_RPC_URLS: set()}
+        if self.path and self.path.exists():
+            size = 0
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    batch = json.loads(line)
+                    self.done[batch['table']].update(batch['keys'])
+                    size += len(line)
+            os.truncate(self.path, size)
+            print(f'Resuming import from checkpoint {self.path}')
+
+    def is_done(self, table: str, key: str) -> bool:
+        return key.lower() in self.done[table]
+
+    def mark(self, table: str, keys: list) -> None:
+        keys = [key.lower() for key in keys]
+        self.done[table].update(keys)
+        if self.path and keys:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'table': table, 'keys': keys}) + '\n')
+
+
+def local_import_from_json_files(chains, rpc_urls, db_file: str, mode: str = 'ignore', batch_size: int = IMPORT_BATCH_SIZE) -> dict:
     """
+    Imports chains and RPC URL:s into an SQLite database in one transaction, from lists or iterators of entries.
+
+    Entries are planned and written in batches of `batch_size`, each compared with the existing rows of its keys,
+    case-insensitively like the NOCASE columns, so only new entries (and with mode 'upsert', changed ones) are
+    written. The keys imported so far are kept in a temporary table instead of memory, to count duplicates.
+    RPC URL:s whose chain is neither in the database nor imported are skipped, since they would fail the foreign key.
+    Returns counters per table of added, updated, unchanged, skipped, duplicate and invalid entries.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f'Invalid import mode {mode}, expected one of {IMPORT_MODES}')
     conn = sqlite3.connect(db_file)
     conn.execute('PRAGMA foreign_keys = ON')
-    cursor = conn.cursor()
+    conn.execute('CREATE TEMP TABLE imported_keys (key TEXT PRIMARY KEY NOT NULL, written INTEGER NOT NULL)')
+    counters = {}
+    try:
+        with conn:
+            counters[TABLE_CHAINS] = import_batches(conn, TABLE_CHAINS, 'name', 'api_class', chains or [], mode, batch_size)
+            conn.execute('DELETE FROM imported_keys')
+            counters[TABLE_RPC_URLS] = import_batches(conn, TABLE_RPC_URLS, 'url', 'chain_name', rpc_urls or [], mode, batch_size)
+    finally:
+        conn.close()
+    return counters
+
+
+def import_batches(conn: sqlite3.Connection, table: str, key_field: str, value_field: str, entries, mode: str, batch_size: int) -> dict:
+    counters = {'added': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'duplicates': 0, 'invalid': 0}
+    conflict = f'DO UPDATE SET {value_field} = excluded.{value_field}' if mode == 'upsert' else 'DO NOTHING'
+    entries = iter(entries)
+    while batch := list(itertools.islice(entries, batch_size)):
+        for entry in batch:
+            if not is_valid_entry(entry, key_field, value_field):
+                counters['invalid'] += 1
+                print(f'Error: entry {entry} needs the text fields {key_field} and {value_field}, skipped')
+        batch = [entry for entry in batch if is_valid_entry(entry, key_field, value_field)]
+        if table == TABLE_RPC_URLS:
+            chains = select_in(conn, f'SELECT lower(name), NULL FROM {TABLE_CHAINS} WHERE name IN', {e['chain_name'] for e in batch})
+            for entry in batch:
+                if entry['chain_name'].lower() not in chains:
+                    counters['invalid'] += 1
+                    print(f'Error: chain {entry["chain_name"]} of RPC URL {entry["url"]} does not exist, skipped')
+            batch = [entry for entry in batch if entry['chain_name'].lower() in chains]
+        keys = {entry[key_field].lower() for entry in batch}
+        existing = select_in(conn, f'SELECT lower({key_field}), {value_field} FROM {table} WHERE {key_field} IN', keys)
+        imported = select_in(conn, 'SELECT key, written FROM imported_keys WHERE key IN', keys)
+        rows, overwrites = plan_import(batch, key_field, value_field, existing, imported, mode, counters)
+        conn.executemany(f'INSERT INTO {table} ({key_field}, {value_field}) VALUES (?, ?) ON CONFLICT({key_field}) {conflict}', rows)
+        conn.executemany(f'UPDATE {table} SET {value_field} = ? WHERE {key_field} = ?', [(value, key) for key, value in overwrites])
+        written = {key.lower() for key, _ in rows + overwrites}
+        conn.executemany('INSERT INTO imported_keys (key, written) VALUES (?, ?) '
+                         'ON CONFLICT(key) DO UPDATE SET written = max(written, excluded.written)', [(key, key in written) for key in keys])
+    return counters
+
+
+def is_valid_entry(entry, key_field: str, value_field: str) -> bool:
+    return isinstance(entry, dict) and isinstance(entry.get(key_field), str) and isinstance(entry.get(value_field), str)
+
+
+def select_in(conn: sqlite3.Connection, query: str, keys: set) -> dict:
+    """The (key, value) rows of a query ending with `IN`, for a batch of keys."""
+    if not keys:
+        return {}
+    return dict(conn.execute(f'{query} ({", ".join("?" * len(keys))})', list(keys)).fetchall())
+
+
+def plan_import(entries: list, key_field: str, value_field: str, existing: dict, imported: dict, mode: str, counters: dict) -> tuple:
+    """
+    Returns the (key, value) rows to insert and the ones to overwrite for a batch of entries of a table with a key
+    and one value, and counts the batch in `counters`. `existing` maps the lowercased keys of the batch in the table to
+    their values and `imported` the ones of earlier batches to whether they were written. The last of duplicate
+    entries wins, a duplicate of an earlier batch is only counted as a duplicate.
+    """
+    planned = {}
+    for entry in entries:
+        key = entry[key_field].lower()
+        if key in planned or key in imported:
+            counters['duplicates'] += 1
+        planned[key] = (entry[key_field], entry[value_field])
+    rows = []
+    overwrites = []
+    for key, row in planned.items():
+        if imported.get(key):
+            overwrites.append(row)
+            continue
+        if key not in existing:
+            outcome = 'added'
+            rows.append(row)
+        elif existing[key].lower() == row[1].lower():
+            outcome = 'unchanged'
+        elif mode == 'upsert':
+            outcome = 'updated'
+            rows.append(row)
+        else:
+            outcome = 'skipped'
+        if key not in imported:
+            counters[outcome] += 1
+    return rows, overwrites
+
+
+def print_import_summary(counters: dict) -> None:
+    descriptions = {'added': 'added', 'updated': 'updated', 'unchanged': 'unchanged', 'existing': 'already existing',
+                    'skipped': 'existing with other values skipped', 'resumed': 'imported before resuming',
+                    'duplicates': 'duplicates', 'invalid': 'invalid'}
+    for table, label in ((TABLE_CHAINS, 'Chains'), (TABLE_RPC_URLS, 'RPC URL:s')):
+        c = counters.get(table)
+        if c:
+            print(f'{label}: ' + ', '.join(f'{c[key]} {description}' for key, description in descriptions.items() if key in c))
+
+
+# # # SYNC # # #
+
+def sync_data(args) -> None:
+    print(f'Sync source: chains file  {args.chains}')
+    print(f'Sync source: RPC URL file {args.rpc_urls}')
+    chains = load_json_file(args.chains)
+    rpc_urls = load_json_file(args.rpc_urls)
+    if chains is None or rpc_urls is None:
+        return
+    if args.target_db:
+        print(f'Sync target: database on path {args.target_db}')
+        target_chains, target_rpc_urls = local_read_entries(args.target_db)
+    else:
+        print(f'Sync target: API at URL {args.target_url}')
+        try:
+            target_chains, target_rpc_urls = api_read_entries(args.target_url, args.retries)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f'Error: reading the target failed, {e}')
+            return
 
-    if chains:
-        unique_chain_counter = 0
-        for entry in chains:
-            name = entry['name']
-            api_class = entry['api_class']
-            query = f'INSERT INTO {TABLE_CHAINS} (name, api_class) VALUES (?, ?)'
-            values = (name, api_class)
-            try:
-                cursor.execute(query, values)
-                print(f'> Added chain {entry["name"]}')
-            except sqlite3.IntegrityError as e:
-                if "UNIQUE constraint failed" in str(e):
-                    unique_chain_counter = unique_chain_counter + 1
-        if unique_chain_counter > 0:
-            print(f"{unique_chain_counter} chains already existing in the database were skipped")
-
-    if rpc_urls:
-        unique_rpc_counter = 0
-        for entry in rpc_urls:
-            url = entry['url']
-            chain_name = entry['chain_name']
-            query = f'INSERT INTO {TABLE_RPC_URLS} (url, chain_name) VALUES (?, ?)'
-            values = (url, chain_name)
+    try:
+        plan = plan_sync(chains, rpc_urls, target_chains, target_rpc_urls)
+    except ValueError as e:
+        print(f'Error: {e}')
+        return
+    print_sync_plan(plan)
+    if args.dry_run:
+        print('Dry run, no changes were made')
+        return
+    if not any(changes for table_plan in plan.values() for changes in table_plan.values()):
+        print('Target already in sync')
+        return
+    if args.target_db:
+        local_apply_sync(plan, args.target_db)
+        print('Sync applied')
+    else:
+        failed = api_apply_sync(plan, args.target_url, args.concurrency, args.retries)
+        print(f'Sync applied, {failed} changes failed' if failed else 'Sync applied')
+
+
+def plan_sync(chains: list, rpc_urls: list, target_chains: list, target_rpc_urls: list) -> dict:
+    """
+    The changes that make the target hold exactly the source entries, per table: entries to `add` and `remove`,
+    and (current, new) pairs of entries to `change`. Keys and values are compared case-insensitively, like
+    the NOCASE columns. Raises ValueError if a source RPC URL has a chain that isn't in the source.
+    """
+    chain_names = {chain['name'].lower() for chain in chains}
+    orphans = [rpc['url'] for rpc in rpc_urls if rpc['chain_name'].lower() not in chain_names]
+    if orphans:
+        raise ValueError(f'Chains missing in the source for RPC URL:s {", ".join(orphans)}')
+    return {
+        TABLE_CHAINS: diff_entries(chains, target_chains, 'name', 'api_class'),
+        TABLE_RPC_URLS: diff_entries(rpc_urls, target_rpc_urls, 'url', 'chain_name'),
+    }
+
+
+def diff_entries(source: list, target: list, key_field: str, value_field: str) -> dict:
+    source_by_key = {entry[key_field].lower(): entry for entry in source}
+    target_by_key = {entry[key_field].lower(): entry for entry in target}
+    diff = {'add': [], 'remove': [], 'change': []}
+    for key, entry in source_by_key.items():
+        current = target_by_key.get(key)
+        if current is None:
+            diff['add'].append(entry)
+        elif current[value_field].lower() != entry[value_field].lower():
+            diff['change'].append((current, entry))
+    diff['remove'] = [entry for key, entry in target_by_key.items() if key not in source_by_key]
+    return diff
+
+
+def print_sync_plan(plan: dict) -> None:
+    for table, key_field, value_field, label in ((TABLE_CHAINS, 'name', 'api_class', 'chain'),
+                                                 (TABLE_RPC_URLS, 'url', 'chain_name', 'RPC URL')):
+        diff = plan[table]
+        for entry in diff['add']:
+            print(f'+ {label} {entry[key_field]} ({entry[value_field]})')
+        for current, entry in diff['change']:
+            print(f'~ {label} {entry[key_field]} ({current[value_field]} -> {entry[value_field]})')
+        for entry in diff['remove']:
+            print(f'- {label} {entry[key_field]} ({entry[value_field]})')
+    print(f"Chains: {len(plan[TABLE_CHAINS]['add'])} to add, {len(plan[TABLE_CHAINS]['change'])} to change, "
+          f"{len(plan[TABLE_CHAINS]['remove'])} to remove")
+    print(f"RPC URL:s: {len(plan[TABLE_RPC_URLS]['add'])} to add, {len(plan[TABLE_RPC_URLS]['change'])} to change, "
+          f"{len(plan[TABLE_RPC_URLS]['remove'])} to remove")
+
+
+def local_read_entries(db_file: str) -> tuple:
+    conn = sqlite3.connect(db_file)
+    try:
+        chains = [{'name': name, 'api_class': api_class} for name, api_class in conn.execute(f'SELECT name, api_class FROM {TABLE_CHAINS}')]
+        rpc_urls = [{'url': url, 'chain_name': chain_name} for url, chain_name in conn.execute(f'SELECT url, chain_name FROM {TABLE_RPC_URLS}')]
+    finally:
+        conn.close()
+    return chains, rpc_urls
+
+
+def api_read_entries(api_url: str, retries: int = 3) -> tuple:
+    """The chains and RPC URL:s of the API. Raises ValueError for a response that isn't a 200 with a JSON list."""
+    entries = []
+    with create_session(1) as session:
+        for table in (TABLE_CHAINS, TABLE_RPC_URLS):
+            response = request_with_retry(session, 'GET', api_url + f'/all/{table}', {}, retries)
             try:
-                cursor.execute(query, values)
-                print(f'> Added RPC URL {entry["url"]}')
-            except sqlite3.IntegrityError as e:
-                if "UNIQUE constraint failed" in str(e):
-                    unique_rpc_counter = unique_rpc_counter + 1
-        if unique_rpc_counter > 0:
-            print(f"{unique_rpc_counter} RPC URL:s already existing in the database were skipped")
+                data = response.json() if response.status_code == 200 else None
+            except ValueError:
+                data = None
+            if not isinstance(data, list):
+                raise ValueError(f'GET /all/{table} answered {response.status_code} {response.text[:200]}')
+            entries.append(data)
+    return tuple(entries)
 
-    conn.commit()
-    conn.close()
+
+def local_apply_sync(plan: dict, db_file: str) -> None:
+    """
+    Applies a sync plan to an SQLite database in one transaction, in an order that keeps every RPC URL's
+    chain existing: chains are added before RPC URL:s and removed after them.
+    """
+    chains = plan[TABLE_CHAINS]
+    rpc_urls = plan[TABLE_RPC_URLS]
+    conn = sqlite3.connect(db_file)
+    conn.execute('PRAGMA foreign_keys = ON')
+    try:
+        with conn:
+            conn.executemany(f'INSERT INTO {TABLE_CHAINS} (name, api_class) VALUES (?, ?)',
+                             [(entry['name'], entry['api_class']) for entry in chains['add']])
+            conn.executemany(f'UPDATE {TABLE_CHAINS} SET api_class=? WHERE name=?',
+                             [(entry['api_class'], current['name']) for current, entry in chains['change']])
+            conn.executemany(f'DELETE FROM {TABLE_RPC_URLS} WHERE url=?', [(entry['url'],) for entry in rpc_urls['remove']])
+            conn.executemany(f'INSERT INTO {TABLE_RPC_URLS} (url, chain_name) VALUES (?, ?)',
+                             [(entry['url'], entry['chain_name']) for entry in rpc_urls['add']])
+            conn.executemany(f'UPDATE {TABLE_RPC_URLS} SET chain_name=? WHERE url=?',
+                             [(entry['chain_name'], current['url']) for current, entry in rpc_urls['change']])
+            conn.executemany(f'DELETE FROM {TABLE_CHAINS} WHERE name=?', [(entry['name'],) for entry in chains['remove']])
+    finally:
+        conn.close()
+
+
+def api_apply_sync(plan: dict, api_url: str, concurrency: int = 8, retries: int = 3) -> int:
+    """
+    Applies a sync plan through the API, in the same order as `local_apply_sync` with every step's requests
+    sent concurrently. Entries are added through the bulk endpoints if the API has them. Returns the number of
+    changes that failed.
+    """
+    headers = get_auth_header(api_url)
+    chains = plan[TABLE_CHAINS]
+    rpc_urls = plan[TABLE_RPC_URLS]
+    failed = 0
+    with create_session(concurrency) as session:
+        capabilities = get_capabilities(session, api_url)
+
+        def add(table: str, entries: list, key_field: str, endpoint: str) -> int:
+            if not entries:
+                return 0
+            bulk_endpoint = capabilities.get('bulk_endpoints', {}).get(table)
+            bulk_size = capabilities.get('max_bulk_size', 1) if bulk_endpoint else 1
+            counters = api_import_entries(session, api_url + (bulk_endpoint or endpoint), bool(bulk_endpoint), bulk_size,
+                                          entries, table, key_field, headers, ImportCheckpoint(), concurrency, retries)
+            return counters['invalid']
+
+        def send_all(changes: list) -> int:
+            """Sends (description, method, path, params, json) requests, returns how many failed."""
+            def send(change: tuple) -> str:
+                description, method, path, params, payload = change
+                try:
+                    response = request_with_retry(session, method, api_url + path, headers, retries, params=params, json=payload)
+                    if response.status_code == 200 and 'error' not in response.json():
+                        return None
+                except ValueError:
+                    pass  # Not a JSON body, like the error page of a proxy
+                except requests.exceptions.RequestException as e:
+                    return f'{description}: {e}'
+                return f'{description}: {response.status_code} {response.text}'
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                errors = [error for error in executor.map(send, changes) if error]
+            for error in errors:
+                print(f'Error: {error}')
+            return len(errors)
+
+        failed += add(TABLE_CHAINS, chains['add'], 'name', '/create_chain')
+        failed += send_all([(f'change chain {current["name"]}', 'PUT', '/update_chain', {'name': current['name']},
+                             {'api_class': entry['api_class']}) for current, entry in chains['change']])
+        failed += send_all([(f'remove RPC URL {entry["url"]}', 'DELETE', '/delete_url', url_request_params(entry['url']), None)
+                            for entry in rpc_urls['remove']])
+        failed += add(TABLE_RPC_URLS, rpc_urls['add'], 'url', '/create_rpc_url')
+        failed += send_all([(f'change RPC URL {current["url"]}', 'PUT', '/update_url', url_request_params(current['url']),
+                             {'url': current['url'], 'chain_name': entry['chain_name']}) for current, entry in rpc_urls['change']])
+        failed += send_all([(f'remove chain {entry["name"]}', 'DELETE', '/delete_chain', {'name': entry['name']}, None)
+                            for entry in chains['remove']])
+    return failed
+
+
+def url_request_params(url: str) -> dict:
+    """The 'protocol' and 'address' url parameters the API identifies an RPC URL by."""
+    protocol, address = url.split('://', 1)
+    return {'protocol': protocol, 'address': address}
+
+
+# # # SNAPSHOT # # #
+
+def snapshot_data(args) -> None:
+    source = Path(args.source_db)
+    if not source.exists():
+        print(f'Error: database {source} does not exist')
+        return
+    if args.target:
+        target = Path(args.target)
+    else:
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        target = PATH_DEFAULT_OUT_DIR / f'{source.stem}_{timestamp}.db.gz'
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if not allow_overwrite(target, args.force):
+        return
+    digest = create_snapshot(source, target)
+    print(f'Snapshot of {source} written to {target}, {target.stat().st_size} bytes, sha256 {digest}')
+
+
+def restore_data(args) -> None:
+    target = Path(args.target_db)
+    if not allow_overwrite(target, args.force):
+        return
+    try:
+        restore_snapshot(Path(args.snapshot), target)
+    except (OSError, ValueError, sqlite3.DatabaseError) as e:
+        print(f'Error: {e}')
+        return
+    print(f'Database {target} restored from {args.snapshot}')
+
+
+def create_snapshot(db_file: Path, target: Path) -> str:
+    """
+    Writes a gzip compressed copy of an SQLite database to `target` and its SHA-256 to a checksum file next to it.
+
+    The copy is taken with SQLite's online backup API, so it's consistent even while the app is writing to the
+    database. Both files are written to temporary files first and renamed, so they're either complete or absent.
+    Returns the checksum.
+    """
+    with tempfile.TemporaryDirectory(dir=target.parent) as tmp_dir:
+        copy_path = Path(tmp_dir) / 'copy.db'
+        source = sqlite3.connect(db_file)
+        copy = sqlite3.connect(copy_path)
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+            source.close()
+        compressed_path = Path(tmp_dir) / target.name
+        with open(copy_path, 'rb') as f_in, gzip.open(compressed_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        digest = file_sha256(compressed_path)
+        checksum_tmp_path = Path(tmp_dir) / checksum_path(target).name
+        # The format of sha256sum, so a snapshot can be checked with `sha256sum -c` too
+        checksum_tmp_path.write_text(f'{digest}  {target.name}\n', encoding='utf-8')
+        os.replace(compressed_path, target)
+        os.replace(checksum_tmp_path, checksum_path(target))
+    return digest
+
+
+def restore_snapshot(snapshot: Path, db_file: Path) -> None:
+    """
+    Replaces a database file with a snapshot taken by `create_snapshot`, after verifying its checksum and integrity.
+
+    The snapshot is decompressed next to the database and renamed over it, so the swap is atomic: connections
+    opened after it see the snapshot, and if anything fails before it the database is untouched.
+    Raises ValueError if the checksum or the integrity check fails, and `gzip.BadGzipFile` or
+    `sqlite3.DatabaseError` if the snapshot, with a matching checksum file, isn't a gzip compressed database.
+    """
+    if not checksum_path(snapshot).exists():
+        raise FileNotFoundError(f'Checksum file {checksum_path(snapshot)} of the snapshot not found')
+    expected = checksum_path(snapshot).read_text(encoding='utf-8').split()[0]
+    if file_sha256(snapshot) != expected:
+        raise ValueError(f'Checksum of {snapshot} does not match {checksum_path(snapshot)}')
+    if Path(f'{db_file}-wal').exists():
+        raise ValueError(f'{db_file} has a write-ahead log, stop the app using it before restoring')
+    if Path(f'{db_file}-journal').exists():
+        raise ValueError(f'{db_file} has a rollback journal, stop the app using it before restoring')
+
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=db_file.parent) as tmp_dir:
+        restored_path = Path(tmp_dir) / db_file.name
+        with gzip.open(snapshot, 'rb') as f_in, open(restored_path, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        conn = sqlite3.connect(restored_path)
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        finally:
+            conn.close()
+        if result != 'ok':
+            raise ValueError(f'Integrity check of {snapshot} failed: {result}')
+        if not {TABLE_CHAINS, TABLE_RPC_URLS} <= tables:
+            raise ValueError(f'{snapshot} is missing the {TABLE_CHAINS} and {TABLE_RPC_URLS} tables')
+        if db_file.exists():
+            shutil.copymode(db_file, restored_path)
+        os.replace(restored_path, db_file)
+
+
+def checksum_path(snapshot: Path) -> Path:
+    return snapshot.with_name(snapshot.name + '.sha256')
+
+
+def file_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
 
 
 # # # EXPORT # # #
@@ -313,54 +856,107 @@ def validate_json(args) -> None:
     if args.filter:
         chains = list(filter(lambda x: args.filter.lower() in x['name'].lower(), chains))
         rpcs = list(filter(lambda x: args.filter.lower() in x['chain_name'].lower(), rpcs))
-    chain_names = [c['name'] for c in chains]
     if args.reverse:
         rpcs.reverse()
-    error_log = []
-
-    # TODO: make this a session of async tasks
-    for rpc in rpcs:
-        print(f'Validating {rpc["url"]}')
-        # Confirm chain exists for URLs
-        if not rpc['chain_name'] in chain_names:
-            print(f'#> Chain name error for {rpc["url"]}')
-            error_log.append(f'Chain {rpc["chain_name"]} missing for URL {rpc["url"]}')
-            continue
 
-        # Confirm endpoints respond
-        chain = [c for c in chains if c.get('name') == rpc['chain_name']][0]
-        api_class = chain['api_class']
-        headers = {'Content-Type': 'application/json'}
-        payload = {
-            "jsonrpc": "2.0",
-            "method": get_jsonrpc_method(api_class),
-            "params": [],
-            "id": 1
-        }
-        if 'http' in rpc['url']:
+    print(f'Validating {len(rpcs)} URL:s')
+    start_time = time.monotonic()
+    results = asyncio.run(validate_rpcs(rpcs, chains, args.concurrency, args.per_host, args.timeout))
+    failed = [result for result in results if not result['ok']]
+    print(f'Validated {len(results)} URL:s in {time.monotonic() - start_time:.1f} s, {len(failed)} failed')
+
+    if len(failed) > 0:
+        print('#> Error report <#')
+        for result in failed:
+            print(f'URL {result["url"]}: {result["error"]}')
+    if args.output:
+        report = {'time': datetime.now(timezone.utc).isoformat(), 'urls': len(results), 'failed': len(failed), 'results': results}
+        export_to_file(args.output, report)
+        print(f'Report written to {args.output}')
+
+
+async def validate_rpcs(rpcs: list, chains: list, concurrency: int = 64, per_host: int = 4, timeout: float = 5) -> list:
+    """
+    Validates that every RPC URL has a chain and responds to a request for the latest block, concurrently.
+
+    At most `concurrency` endpoints and `per_host` endpoints of the same host are validated at a time, since
+    many URL:s share a provider. Returns the results in the order of `rpcs`.
+    """
+    # Chain names are case-insensitive in the database
+    chains_by_name = {chain['name'].lower(): chain for chain in chains}
+    # Limits are applied before a request starts, so its timeout doesn't count the wait for a free slot
+    semaphore = asyncio.Semaphore(concurrency)
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(per_host))
+
+    async def validate_limited(session: aiohttp.ClientSession, rpc: dict) -> dict:
+        async with host_semaphores[urlsplit(rpc['url']).netloc.lower()], semaphore:
+            return await validate_rpc(session, rpc, chains_by_name.get(rpc['chain_name'].lower()), timeout)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        return await asyncio.gather(*(validate_limited(session, rpc) for rpc in rpcs))
+
+
+async def validate_rpc(session: aiohttp.ClientSession, rpc: dict, chain: dict, timeout: float) -> dict:
+    """The result of validating one RPC URL, with the latency of the request and the block height it returned."""
+    result = {'url': rpc['url'], 'chain_name': rpc['chain_name'], 'ok': False, 'latency': None, 'block_height': None, 'error': None}
+    if chain is None:
+        result['error'] = f'Chain {rpc["chain_name"]} missing'
+        print(f'#> Chain name error for {rpc["url"]}')
+        return result
+
+    api_class = chain['api_class']
+    payload = {
+        "jsonrpc": "2.0",
+        "method": get_jsonrpc_method(api_class),
+        "params": [],
+        "id": 1
+    }
+    scheme = urlsplit(rpc['url']).scheme
+
+    async def request() -> str:
+        if scheme in ('http', 'https'):
             if api_class == 'aptos':
-                response = requests.get(rpc['url'], timeout=5)
+                pending = session.get(rpc['url'])
             else:
-                response = requests.post(rpc['url'], json=payload, headers=headers, timeout=5)
-            if not response.status_code == 200:
-                print(f'#> URL error for {rpc["url"]}')
-                error_log.append(f'URL {rpc["url"]} produced response.text={response.text} with status_code={response.status_code}')
-        elif 'ws' in rpc['url']:
-            try:
-                ws = websocket.create_connection(rpc['url'])
-                ws.send(json.dumps(payload))
-                response = json.loads(ws.recv())
-                ws.close()
-                if not 'jsonrpc' in response.keys():
-                    print(f'#> error for {rpc["url"]}')
-                    error_log.append(f'URL {rpc["url"]} produced WS response={response}')
-            except Exception as e:
-                error_log.append(f'URL {rpc["url"]} failed WS connection: {e}')
+                pending = session.post(rpc['url'], json=payload, headers={'Content-Type': 'application/json'})
+            async with pending as response:
+                text = await response.text()
+            if response.status != 200:
+                raise ValueError(f'Response status_code={response.status}, text={text[:200]}')
+            return text
+        if scheme in ('ws', 'wss'):
+            async with session.ws_connect(rpc['url']) as ws:
+                await ws.send_json(payload)
+                message = await ws.receive()
+            if message.type != aiohttp.WSMsgType.TEXT:
+                raise ValueError(f'WS response of type {message.type.name}')
+            return message.data
+        raise ValueError(f'Unsupported scheme {scheme}')
+
+    start_time = time.monotonic()
+    try:
+        text = await asyncio.wait_for(request(), timeout)
+        result['latency'] = time.monotonic() - start_time
+        result['block_height'] = block_height_of_response(api_class, json.loads(text))
+        result['ok'] = True
+    except asyncio.TimeoutError:
+        result['error'] = f'Timed out after {timeout} s'
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    if not result['ok']:
+        print(f'#> URL error for {rpc["url"]}')
+    return result
 
-    if len(error_log) > 0:
-        print('#> Error report <#')
-        for e in error_log:
-            print(e)
+
+def block_height_of_response(api_class: str, response: dict) -> int:
+    """The latest block height in a response to the request of `get_jsonrpc_method`, raises if the response has none."""
+    if api_class == 'aptos':
+        return int(response['block_height'])
+    if 'result' not in response:
+        raise ValueError(f'No result in response {json.dumps(response)[:200]}')
+    if api_class == 'substrate':
+        return int(response['result']['number'], 16)
+    return int(response['result'], 16)
 
 
 # # # UTILS # # #
@@ -387,6 +983,55 @@ def get_jsonrpc_method(api_class: str) -> str:
     return method
 
 
+def iter_json_array(filepath: Path, chunk_size: int = 1 << 16):
+    """
+    Yields the items of a JSON file holding one array, reading it in chunks instead of all at once.
+    Items are decoded in place at an index into the buffer, which is only trimmed when the next chunk is read.
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        buffer = ''
+        i = 0
+        eof = False
+        started = False
+        while True:
+            i = JSON_WHITESPACE.match(buffer, i).end()
+            if not started and i < len(buffer):
+                if buffer[i] != '[':
+                    raise ValueError(f'{filepath} does not hold a JSON array')
+                i = JSON_WHITESPACE.match(buffer, i + 1).end()
+                started = True
+            if started and buffer.startswith(',', i):
+                i = JSON_WHITESPACE.match(buffer, i + 1).end()
+            if started and buffer.startswith(']', i):
+                return
+            if started and i < len(buffer):
+                try:
+                    item, end = decoder.raw_decode(buffer, i)
+                    # An item ending right at the end of the buffer might continue in the next chunk
+                    if end < len(buffer) or eof:
+                        yield item
+                        i = end
+                        continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            if eof:
+                raise ValueError(f'{filepath} ends before its JSON array does')
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[i:] + chunk
+            i = 0
+
+
+def stream_json_file(filepath: Path):
+    """Like `load_json_file`, but returns an iterator over the items of the array in the file."""
+    if not Path(filepath).exists():
+        print(f'File not found: {filepath}')
+        return None
+    return iter_json_array(filepath)
+
+
 # TODO: set return type, dict or None
 def load_json_file(filepath: Path):
     try:
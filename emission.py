@@ -0,0 +1,32 @@
+class EmissionPolicy:
+    """
+    Decides whether a block_height_request point is worth writing, to cut the write volume of slow chains.
+
+    A point is emitted when the block height changed, the diff moved by at least `diff_deadband` blocks, the
+    latency moved by more than `latency_deadband` (relative to the last emitted latency, but at least
+    `latency_deadband_min` seconds), or when nothing was emitted for the series in `heartbeat` seconds, so
+    series never go stale. Comparisons are against the last emitted values, so slow drifts are still caught.
+    """
+
+    def __init__(self, diff_deadband: int = 1, latency_deadband: float = 0.2, latency_deadband_min: float = 0.01, heartbeat: float = 60.0):
+        self.diff_deadband = diff_deadband
+        self.latency_deadband = latency_deadband
+        self.latency_deadband_min = latency_deadband_min
+        self.heartbeat = heartbeat
+        self.last_emitted = {}
+
+    def should_emit(self, url: str, height: int, diff: int, latency: float, now: float) -> bool:
+        last = self.last_emitted.get(url)
+        if last is not None:
+            last_height, last_diff, last_latency, last_time = last
+            if (height == last_height
+                    and abs(diff - last_diff) < self.diff_deadband
+                    and abs(latency - last_latency) <= max(self.latency_deadband_min, self.latency_deadband * last_latency)
+                    and now - last_time < self.heartbeat):
+                return False
+        self.last_emitted[url] = (height, diff, latency, now)
+        return True
+
+    def forget(self, endpoints: list) -> None:
+        for endpoint in endpoints:
+            self.last_emitted.pop(endpoint[1], None)
@@ -0,0 +1,32 @@
+from functools import lru_cache
+import ipaddress
+from urllib.parse import urlsplit
+
+# Second-level labels under which domains are registered in many country code TLDs, e.g. example.co.uk
+_SECOND_LEVEL_LABELS = {'ac', 'co', 'com', 'edu', 'gov', 'net', 'org'}
+
+
+@lru_cache(maxsize=100_000)
+def endpoint_tags(url: str) -> dict:
+    """
+    The `scheme`, `host` and `provider` tags of an endpoint URL, written alongside `url`.
+
+    `host` is the lowercased host name (and port, if any) and `provider` the registered domain, e.g.
+    rpc.ankr.com gives ankr.com, so dashboards can show and group endpoints without string processing in Flux.
+    """
+    parts = urlsplit(url.strip())
+    hostname = (parts.hostname or '').rstrip('.')
+    host = f'{hostname}:{parts.port}' if parts.port else hostname
+    return {'scheme': parts.scheme.lower(), 'host': host, 'provider': provider(hostname)}
+
+
+def provider(hostname: str) -> str:
+    try:
+        ipaddress.ip_address(hostname)
+        return hostname
+    except ValueError:
+        pass
+    labels = hostname.split('.')
+    if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from influxdb_client import InfluxDBClient, Point
+from influxdb_client.client.write_api import SYNCHRONOUS
+from sinks import Sink
+
+logger = logging.getLogger(__name__)
+
+
+class Spool:
+    """
+    Bounded on-disk queue of line protocol, stored as append-only segment files.
+
+    Segments are named by a increasing sequence number so they drain oldest first. When the spool grows past
+    `max_bytes` the oldest segments are dropped, since the newest data is the most valuable for monitoring.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 100_000_000, segment_max_bytes: int = 1_000_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.segment_max_bytes = segment_max_bytes
+        segments = self.segments()
+        self.next_seq = int(segments[-1].stem) + 1 if segments else 0
+        self.current = None
+
+    def segments(self) -> list:
+        # Skip files that aren't segments, like a copy left in the directory by hand
+        return sorted(segment for segment in self.directory.glob('*.lp') if segment.stem.isdigit())
+
+    def size(self) -> int:
+        return sum(segment.stat().st_size for segment in self.segments())
+
+    def is_empty(self) -> bool:
+        return not self.segments()
+
+    def append(self, lines: list) -> None:
+        if not lines:
+            return
+        if self.current is None or self.current.stat().st_size >= self.segment_max_bytes:
+            self.rotate()
+        with open(self.current, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        self.enforce_limit()
+
+    def rotate(self) -> None:
+        self.current = self.directory / f'{self.next_seq:012d}.lp'
+        self.current.touch()
+        self.next_seq += 1
+
+    def enforce_limit(self) -> None:
+        segments = self.segments()
+        total = sum(segment.stat().st_size for segment in segments)
+        while total > self.max_bytes and len(segments) > 1:
+            oldest = segments.pop(0)
+            total -= oldest.stat().st_size
+            logger.warning("Spool over %s bytes, dropping oldest segment %s", self.max_bytes, oldest)
+            oldest.unlink()
+
+    def drain(self, send, batch_size: int) -> bool:
+        """
+        Send spooled lines oldest first with `send(lines) -> bool` and delete every segment that was fully sent.
+
+        A segment that fails half way is kept whole and resent later, which is safe since Influx overwrites
+        points with identical series and timestamp. Returns True if the spool was emptied.
+        """
+        self.current = None  # Start a new segment for anything spooled while draining
+        for segment in self.segments():
+            with open(segment, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            for i in range(0, len(lines), batch_size):
+                if not send(lines[i:i + batch_size]):
+                    return False
+            segment.unlink()
+            logger.info("Drained spool segment %s with %s lines", segment.name, len(lines))
+        return True
+
+
+class InfluxWriter(Sink):
+    """
+    Long-lived InfluxDB writer that batches by size and time, compresses with gzip and never exits on failure.
+
+    Batches that can't be written are put in a `Spool` and retried with exponential backoff, so an Influx
+    outage or a restart of the poller doesn't lose data. A background thread flushes the buffer every
+    `flush_interval` seconds also when no points are written, and a lock keeps it, the writing thread and
+    `close` from sending or spooling the same buffer at once.
+    """
+
+    def __init__(self, url: str, token: str, org: str, bucket: str, spool: Spool,
+                 batch_size: int = 5000, flush_interval: float = 10.0, max_backoff: float = 300.0, timeout_ms: int = 10_000,
+                 metrics=None):
+        self.client = InfluxDBClient(url=url, token=token, org=org, enable_gzip=True, timeout=timeout_ms)
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        self.bucket = bucket
+        self.spool = spool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self.flusher.start()
+
+    def write(self, records: list) -> None:
+        """Add Points or line protocol strings to the buffer and flush if the batch is full or old enough."""
+        with self.lock:
+            for record in records:
+                self.buffer.append(record.to_line_protocol() if isinstance(record, Point) else record)
+            if len(self.buffer) >= self.batch_size or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush_periodically(self) -> None:
+        while not self.closed.wait(self.flush_interval / 2):
+            with self.lock:
+                if self.buffer and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._flush()
+
+    def _flush(self) -> None:
+        self.last_flush = time.monotonic()
+        batch, self.buffer = self.buffer, []
+        if time.monotonic() < self.next_attempt:
+            self.spool.append(batch)
+            return
+        for i in range(0, len(batch), self.batch_size):
+            if not self._send(batch[i:i + self.batch_size]):
+                self.spool.append(batch[i:])
+                return
+        if not self.spool.is_empty():
+            self.spool.drain(self._send, self.batch_size)
+
+    def close(self) -> None:
+        """Spool whatever is left in the buffer instead of risking a slow write on shutdown."""
+        self.closed.set()
+        with self.lock:
+            self.spool.append(self.buffer)
+            self.buffer = []
+        self.client.close()
+
+    def _send(self, lines: list) -> bool:
+        start = time.perf_counter()
+        try:
+            self.write_api.write(bucket=self.bucket, record=lines)
+        except Exception as e:
+            if self.metrics:
+                self.metrics.inc('write_batches_total', result='failed')
+            self.backoff = min(self.max_backoff, self.backoff * 2 if self.backoff else 1.0)
+            self.next_attempt = time.monotonic() + self.backoff
+            logger.error("Failed writing %s lines to influx, retrying in %ss. %s", len(lines), self.backoff, str(e))
+            return False
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+        if self.metrics:
+            self.metrics.inc('write_batches_total', result='written')
+            self.metrics.inc('written_lines_total', len(lines))
+            self.metrics.observe('write_batch_lines', len(lines))
+            self.metrics.observe('stage_seconds', time.perf_counter() - start, stage='write')
+        return True
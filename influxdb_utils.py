@@ -2,20 +2,74 @@ from datetime import datetime
 import asyncio
 from influxdb_client import InfluxDBClient, Point
 
+from endpoint_tags import endpoint_tags
 from rpc_utils import get_aptos, get_ethereum, get_substrate
 
 
-def block_height_request_point(chain: str, url: str, data: dict, block_height_diff: int, timestamp: datetime) -> Point:
+def block_height_request_point(chain: str, url: str, data: dict, block_height_diff: int, timestamp: datetime, progress: dict = None) -> Point:
     time_total = float(data.get('time_total') or 0)
     latest_block_height = int(data.get('latest_block_height') or -1)
 
-    return Point("block_height_request") \
+    point = Point("block_height_request") \
         .tag("chain", chain) \
         .tag("url", url) \
         .field("block_height", latest_block_height) \
         .field("block_height_diff", block_height_diff) \
         .field("request_time_total", time_total) \
         .time(timestamp)
+    for tag, value in endpoint_tags(url).items():
+        point.tag(tag, value)
+    # Rolling-window fields from chain_progress, e.g. block_rate and lag_seconds
+    for field, value in (progress or {}).items():
+        point.field(field, float(value))
+    return point
+
+
+def chain_stats_point(chain: str, stats: dict, timestamp: datetime) -> Point:
+    return Point("chain_stats") \
+        .tag("chain", chain) \
+        .field("max_block_height", int(stats['max_block_height'])) \
+        .field("median_block_height_diff", int(stats['median_block_height_diff'])) \
+        .field("latency_p50", float(stats['latency_p50'])) \
+        .field("latency_p99", float(stats['latency_p99'])) \
+        .field("healthy_endpoints", int(stats['healthy_endpoints'])) \
+        .field("endpoints", int(stats['endpoints'])) \
+        .time(timestamp)
+
+
+def probe_request_point(chain: str, url: str, profile: str, data: dict, timestamp: datetime) -> Point:
+    point = Point("probe_request") \
+        .tag("chain", chain) \
+        .tag("url", url) \
+        .tag("profile", profile) \
+        .field("success", data.get('exit_code') == 0) \
+        .time(timestamp)
+    for tag, value in endpoint_tags(url).items():
+        point.tag(tag, value)
+    if data.get('time_total') is not None and data.get('exit_code') == 0:
+        point.field("request_time_total", float(data['time_total']))
+    if data.get('http_code') is not None:
+        point.field("http_code", int(data['http_code']))
+    return point
+
+
+def capacity_test_point(chain: str, url: str, summary: dict, timestamp: datetime) -> Point:
+    point = Point("endpoint_capacity") \
+        .tag("chain", chain) \
+        .tag("url", url) \
+        .tag("methods", summary['methods']) \
+        .field("concurrency", int(summary['concurrency'])) \
+        .field("duration", float(summary['duration'])) \
+        .field("requests", int(summary['requests'])) \
+        .field("errors", int(summary['errors'])) \
+        .field("rps", float(summary['rps'])) \
+        .field("error_rate", float(summary['error_rate'])) \
+        .field("latency_p50", float(summary['latency_p50'])) \
+        .field("latency_p99", float(summary['latency_p99'])) \
+        .time(timestamp)
+    for tag, value in endpoint_tags(url).items():
+        point.tag(tag, value)
+    return point
 
 
 def test_influxdb_connection(url: str, token: str, org: str) -> bool:
@@ -0,0 +1,100 @@
+import math
+
+
+class LatencySketch:
+    """
+    Mergeable latency histogram with logarithmic buckets, quantiles are within `relative_accuracy` of the truth.
+
+    Like a DDSketch, a value v goes into bucket ceil(log(v) / log(gamma)), so memory only grows with the
+    range of latencies, not with the number of samples, and two sketches merge by adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-6):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self.buckets = {}
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        index = math.ceil(math.log(max(value, self.min_value)) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'LatencySketch') -> None:
+        if other.gamma != self.gamma:
+            raise ValueError('Only sketches with the same relative accuracy can be merged')
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """The value at quantile q (0 to 1), None for an empty sketch."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # The midpoint of the bucket, in relative terms, bounds the error to relative_accuracy
+                return min(self.max, 2 * self.gamma ** index / (self.gamma + 1))
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'count': self.count,
+        }
+
+
+class LatencySketches:
+    """
+    Latency sketches per endpoint, flushed as p50/p90/p99/max summaries every `period` seconds.
+
+    Chain summaries are made by merging the sketches of the chain's endpoints at flush time, so a tail-latency
+    panel reads a few summary points per period instead of scanning every raw sample.
+    """
+
+    def __init__(self, period: float = 60.0, relative_accuracy: float = 0.01):
+        self.period = period
+        self.relative_accuracy = relative_accuracy
+        self.sketches = {}
+        self.period_start = None
+
+    def add(self, chain: str, url: str, latency: float, now: float) -> None:
+        if self.period_start is None:
+            self.period_start = now
+        key = (chain, url)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = LatencySketch(self.relative_accuracy)
+        sketch.add(latency)
+
+    def due(self, now: float) -> bool:
+        return self.period_start is not None and now - self.period_start >= self.period
+
+    def flush(self, now: float) -> list:
+        """Return (chain, url, summary) for every endpoint and (chain, None, summary) for every chain, and reset."""
+        chains = {}
+        summaries = []
+        for (chain, url), sketch in self.sketches.items():
+            summaries.append((chain, url, sketch.summary()))
+            if chain not in chains:
+                chains[chain] = LatencySketch(self.relative_accuracy)
+            chains[chain].merge(sketch)
+        summaries.extend((chain, None, sketch.summary()) for chain, sketch in chains.items())
+        self.sketches = {}
+        self.period_start = now
+        return summaries
+
+    def forget(self, endpoints: list) -> None:
+        for endpoint in endpoints:
+            self.sketches.pop((endpoint[0], endpoint[1]), None)
@@ -0,0 +1,114 @@
+import math
+import re
+from endpoint_tags import endpoint_tags
+
+# Same escaping as influxdb_client's Point, so series written either way are identical
+_MEASUREMENT_ESCAPES = str.maketrans({',': r'\,', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_TAG_ESCAPES = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_STRING_ESCAPES = str.maketrans({'"': r'\"', '\\': r'\\'})
+
+
+def escape_measurement(measurement: str) -> str:
+    return measurement.translate(_MEASUREMENT_ESCAPES)
+
+
+def escape_tag(value: str) -> str:
+    """Escape a tag key or value, or a field key."""
+    return value.translate(_TAG_ESCAPES)
+
+
+def format_field_value(value) -> str:
+    # bool has to be checked before int, since it's a subclass of it
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f'{value}i'
+    if isinstance(value, float):
+        return repr(value)
+    return f'"{str(value).translate(_STRING_ESCAPES)}"'
+
+
+class LineProtocolSerializer:
+    """
+    Serializes points straight to InfluxDB line protocol, without building `influxdb_client.Point` objects.
+
+    The escaped measurement and tag set of a series is built once and cached, since the tags of an endpoint
+    (chain, url) don't change between probes. Series with a `url` tag also get the `endpoint_tags` of the URL,
+    so those are only computed once per endpoint. Lines are appended to a list owned by the caller, which is
+    handed to the writer as is. The cache is reset if it grows past `max_series`, e.g. after endpoint churn.
+    """
+
+    def __init__(self, max_series: int = 100_000):
+        self.max_series = max_series
+        self.series = {}
+
+    def series_key(self, measurement: str, tags: dict) -> str:
+        cache_key = (measurement, *tags.items())
+        key = self.series.get(cache_key)
+        if key is None:
+            if len(self.series) >= self.max_series:
+                self.series.clear()
+            if 'url' in tags:
+                tags = {**endpoint_tags(tags['url']), **tags}
+            tag_set = ''.join(f',{escape_tag(k)}={escape_tag(str(v))}' for k, v in sorted(tags.items()) if v != '')
+            key = self.series[cache_key] = escape_measurement(measurement) + tag_set
+        return key
+
+    def write(self, out: list, measurement: str, tags: dict, fields: dict, timestamp_ns: int) -> None:
+        """Append one line to `out`. Fields that are None or not a finite number are left out."""
+        field_set = ','.join(f'{escape_tag(k)}={format_field_value(v)}' for k, v in fields.items()
+                             if v is not None and not (isinstance(v, float) and not math.isfinite(v)))
+        if field_set:
+            out.append(f'{self.series_key(measurement, tags)} {field_set} {timestamp_ns}')
+
+    def block_height_request(self, out: list, chain: str, url: str, data: dict, block_height_diff: int, timestamp_ns: int,
+                             progress: dict = None) -> None:
+        """Line protocol equivalent of `influxdb_utils.block_height_request_point`."""
+        fields = {
+            'block_height': int(data.get('latest_block_height') or -1),
+            'block_height_diff': int(block_height_diff),
+            'request_time_total': float(data.get('time_total') or 0),
+        }
+        for field, value in (progress or {}).items():
+            fields[field] = float(value)
+        self.write(out, 'block_height_request', {'chain': chain, 'url': url}, fields, timestamp_ns)
+
+
+_UNESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+
+# One pattern per part of a line instead of a character loop, an escaped character is a backslash and any character
+_LINE = re.compile(r'((?:[^\\ ]+|\\.)+) ((?:[^\\" ]+|\\.|"(?:[^"\\]+|\\.)*")+)(?: (-?\d+))?', re.DOTALL)
+_MEASUREMENT = re.compile(r'(?:[^\\,]+|\\.)+', re.DOTALL)
+_TAG = re.compile(r',((?:[^\\=,]+|\\.)+)=((?:[^\\,]+|\\.)*)', re.DOTALL)
+_FIELD = re.compile(r'((?:[^\\=,]+|\\.)+)=("(?:[^"\\]+|\\.)*"|[^,]*),?', re.DOTALL)
+_ESCAPED = re.compile(r'\\(.)', re.DOTALL)
+
+
+def parse(line: str) -> tuple:
+    """Parse a line into (measurement, tags, fields, timestamp_ns), the inverse of `LineProtocolSerializer.write`."""
+    match = _LINE.fullmatch(line.rstrip('\n'))
+    if match is None:
+        raise ValueError(f'Invalid line protocol: {line!r}')
+    series, field_set, timestamp = match.groups()
+    measurement = _MEASUREMENT.match(series)
+    tags = {_unescape(key): _unescape(value) for key, value in _TAG.findall(series, measurement.end())}
+    fields = {_unescape(key): _parse_field_value(value) for key, value in _FIELD.findall(field_set)}
+    return _unescape(measurement.group()), tags, fields, int(timestamp) if timestamp else None
+
+
+def _unescape(text: str, unescapes: dict = _UNESCAPES) -> str:
+    if '\\' not in text:
+        return text
+    return _ESCAPED.sub(lambda match: unescapes.get(match.group(1), match.group(1)), text)
+
+
+def _parse_field_value(value: str):
+    if value.startswith('"'):
+        return _unescape(value[1:-1], {})
+    if value in ('t', 'T', 'true', 'True', 'TRUE'):
+        return True
+    if value in ('f', 'F', 'false', 'False', 'FALSE'):
+        return False
+    if value.endswith('i') or value.endswith('u'):
+        return int(value[:-1])
+    return float(value)
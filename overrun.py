@@ -0,0 +1,74 @@
+POLICIES = ('skip', 'shrink', 'deprioritize')
+
+
+class OverrunGuard:
+    """
+    Detects probe overruns and sheds load according to `policy`, instead of letting probes pile up.
+
+    An overrun is a probe batch that takes longer than the probe interval of its endpoints, or an endpoint that
+    is due again while its last probe is still in flight. With every policy, endpoints still in flight skip
+    their turn. With `shrink` the number of endpoints in flight is also capped: the cap is halved on every
+    overrun and grown by a tenth after every batch that finished in time. With `deprioritize` endpoints whose
+    circuit is open, i.e. that failed `failure_threshold` probes in a row, are skipped while overrunning.
+    """
+
+    def __init__(self, policy: str = 'skip', max_in_flight: int = 1000, min_in_flight: int = 1, failure_threshold: int = 3):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overrun policy {policy}, expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.failure_threshold = failure_threshold
+        self.limit = max_in_flight
+        self.in_flight = set()
+        self.failures = {}
+        self.overrunning = False
+
+    def circuit_open(self, url: str) -> bool:
+        return self.failures.get(url, 0) >= self.failure_threshold
+
+    def admit(self, due: list) -> tuple:
+        """Split the due endpoints in the ones to probe now and the ones skipping their turn, with a reason."""
+        admitted, skipped = [], []
+        for endpoint in due:
+            url = endpoint[1]
+            if url in self.in_flight:
+                skipped.append((endpoint, 'in_flight'))
+            elif self.policy == 'deprioritize' and self.overrunning and self.circuit_open(url):
+                skipped.append((endpoint, 'circuit_open'))
+            elif self.policy == 'shrink' and len(self.in_flight) >= self.limit:
+                skipped.append((endpoint, 'fan_out'))
+            else:
+                admitted.append(endpoint)
+                self.in_flight.add(url)
+        if any(reason == 'in_flight' for _, reason in skipped):
+            self._overrun()
+        return admitted, skipped
+
+    def finish(self, endpoints: list, duration: float, interval: float) -> bool:
+        """Take a probe batch out of flight, return whether it overran."""
+        peak_in_flight = len(self.in_flight)
+        for endpoint in endpoints:
+            self.in_flight.discard(endpoint[1])
+        if duration > interval:
+            self._overrun(peak_in_flight)
+            return True
+        self.overrunning = False
+        if self.policy == 'shrink':
+            self.limit = min(self.max_in_flight, self.limit + max(1, self.limit // 10))
+        return False
+
+    def record(self, endpoints: list, healthy: list) -> None:
+        """Count consecutive failures per endpoint, a healthy probe closes the circuit again."""
+        for endpoint, ok in zip(endpoints, healthy):
+            self.failures[endpoint[1]] = 0 if ok else self.failures.get(endpoint[1], 0) + 1
+
+    def forget(self, endpoints: list) -> None:
+        for endpoint in endpoints:
+            self.failures.pop(endpoint[1], None)
+
+    def _overrun(self, in_flight: int = None) -> None:
+        self.overrunning = True
+        if self.policy == 'shrink':
+            in_flight = len(self.in_flight) if in_flight is None else in_flight
+            self.limit = max(self.min_in_flight, min(self.limit, in_flight) // 2)
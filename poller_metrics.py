@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PollerMetrics:
+    """
+    Counters, gauges and stage timers of the poller itself.
+
+    Metrics are exposed in the Prometheus text format by `serve()` and can be written to an internal Influx
+    measurement with `lines()`. Stage timers are summaries, i.e. a sum and a count, plus the max since start.
+    """
+
+    def __init__(self, prefix: str = 'poller'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def add(self, name: str, value: float, **labels) -> None:
+        """Move a gauge up or down, e.g. the number of probes in flight."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            total, count, maximum = self.timers.get(key, (0.0, 0, 0.0))
+            self.timers[key] = (total + value, count + 1, max(maximum, value))
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage)
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        with self.lock:
+            counters, gauges, timers = dict(self.counters), dict(self.gauges), dict(self.timers)
+        out = []
+        for kind, metrics in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({name for name, _ in metrics}):
+                out.append(f'# TYPE {self.prefix}_{name} {kind}')
+                out.extend(f'{self.prefix}_{name}{_labels(labels)} {value}' for (n, labels), value in metrics.items() if n == name)
+        for name in sorted({name for name, _ in timers}):
+            observed = [(labels, value) for (n, labels), value in timers.items() if n == name]
+            out.append(f'# TYPE {self.prefix}_{name} summary')
+            for labels, (total, count, _) in observed:
+                out.append(f'{self.prefix}_{name}_sum{_labels(labels)} {total}')
+                out.append(f'{self.prefix}_{name}_count{_labels(labels)} {count}')
+            out.append(f'# TYPE {self.prefix}_{name}_max gauge')
+            out.extend(f'{self.prefix}_{name}_max{_labels(labels)} {maximum}' for labels, (_, _, maximum) in observed)
+        return '\n'.join(out) + '\n'
+
+    def lines(self, serializer, timestamp_ns: int) -> list:
+        """The metrics as line protocol for the internal `poller_metrics` measurement."""
+        with self.lock:
+            counters, gauges, timers = dict(self.counters), dict(self.gauges), dict(self.timers)
+        lines = []
+        for (name, labels), value in list(counters.items()) + list(gauges.items()):
+            serializer.write(lines, 'poller_metrics', {'metric': name, **dict(labels)}, {'value': float(value)}, timestamp_ns)
+        for (name, labels), (total, count, maximum) in timers.items():
+            serializer.write(lines, 'poller_metrics', {'metric': name, **dict(labels)},
+                             {'sum': float(total), 'count': int(count), 'max': float(maximum)}, timestamp_ns)
+        return lines
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Serve /metrics on a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info("Serving poller metrics on http://%s:%s/metrics", host, port)
+        return server
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
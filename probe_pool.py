@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import influxdb_utils as iu
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(requests, results, probe) -> None:
+    """
+    Run one worker process: an event loop that probes every chunk it receives as a task of its own, so chunks
+    sent while others are still being probed run concurrently instead of queueing behind them.
+    """
+    loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    tasks = set()
+
+    async def probe_chunk(request_id: int, chunk: list) -> None:
+        try:
+            rows = [compact_result(result) for result in await probe(chunk)]
+        except Exception:
+            rows = [None] * len(chunk)
+        results.put((request_id, rows))
+
+    def start(request_id: int, chunk: list) -> None:
+        task = loop.create_task(probe_chunk(request_id, chunk))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    def read_requests() -> None:
+        # Queue.get blocks, so requests are read in a thread and handed over to the loop
+        for request in iter(requests.get, None):
+            loop.call_soon_threadsafe(start, *request)
+        loop.call_soon_threadsafe(loop.stop)
+
+    threading.Thread(target=read_requests, daemon=True).start()
+    loop.run_forever()
+
+
+def compact_result(result) -> tuple:
+    """Pack a probe result into a tuple, which is a lot cheaper to pickle back to the parent than a dict."""
+    if not isinstance(result, dict):
+        return None
+    return (result.get('latest_block_height'), result.get('time_total'), result.get('http_code'), result.get('exit_code'))
+
+
+def expand_result(row: tuple):
+    if row is None:
+        return None
+    return {'latest_block_height': row[0], 'time_total': row[1], 'http_code': row[2], 'exit_code': row[3]}
+
+
+class ProbePool:
+    """
+    Probes endpoints in a pool of worker processes, each running its own long-lived event loop (uvloop if installed).
+
+    JSON decoding, TLS and the probes' logging then scale with the cores of the host instead of saturating the
+    one core of the parent's event loop. Endpoints are split into at most one chunk per worker, but never into
+    chunks smaller than `min_chunk_size` since every chunk costs a round trip to a worker. Chunks go to the
+    workers with the fewest chunks in flight, and a worker probes all its chunks concurrently, so the small
+    batches the scheduler sends every tick overlap like they would on a single event loop.
+
+    A worker that dies is restarted and its chunks fail, like a chunk that isn't answered within `timeout` seconds,
+    so the endpoints of a dead or stuck worker are probed again instead of staying in flight forever.
+    """
+
+    def __init__(self, workers: int, min_chunk_size: int = 16, probe=iu.fetch_results, timeout: float = 60.0,
+                 check_interval: float = 1.0):
+        self.workers = workers
+        self.min_chunk_size = min_chunk_size
+        self.probe = probe
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.request_ids = itertools.count()
+        self.pending = {}
+        self.in_flight = [0] * workers
+        self.lock = threading.Lock()
+        self.closed = False
+        self.results = multiprocessing.Queue()
+        self.requests = [None] * workers
+        self.processes = [None] * workers
+        for worker in range(workers):
+            self._start_worker(worker)
+        self.reader = threading.Thread(target=self._read_results, daemon=True)
+        self.reader.start()
+
+    def _start_worker(self, worker: int) -> None:
+        # A new request queue, since a worker killed while reading its queue may leave it locked
+        self.requests[worker] = multiprocessing.Queue()
+        self.processes[worker] = multiprocessing.Process(target=_worker_main, args=(self.requests[worker], self.results, self.probe),
+                                                         daemon=True)
+        self.processes[worker].start()
+
+    def _read_results(self) -> None:
+        last_check = time.monotonic()
+        while True:
+            try:
+                item = self.results.get(timeout=self.check_interval)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                return
+            if item:
+                self._resolve(*item)
+            if time.monotonic() - last_check >= self.check_interval:
+                last_check = time.monotonic()
+                self._restart_dead_workers()
+
+    def _resolve(self, request_id: int, rows: list) -> None:
+        future, loop, _, _ = self.pending.pop(request_id, (None, None, None, None))
+        if future is not None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(rows))
+
+    def _restart_dead_workers(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            for worker, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                lost = [(request_id, size) for request_id, (_, _, w, size) in list(self.pending.items()) if w == worker]
+                logger.error("Probe worker %s died with exit code %s, failing its %s chunks and restarting it",
+                             process.pid, process.exitcode, len(lost))
+                self._start_worker(worker)
+                for request_id, size in lost:
+                    self._resolve(request_id, [None] * size)
+
+    async def _probe_chunk(self, chunk: list) -> list:
+        request_id = next(self.request_ids)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self.lock:
+            worker = min(range(self.workers), key=self.in_flight.__getitem__)
+            self.pending[request_id] = (future, loop, worker, len(chunk))
+            self.in_flight[worker] += 1
+            self.requests[worker].put((request_id, chunk))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            logger.error("Probe worker %s didn't answer a chunk of %s endpoints within %ss", worker, len(chunk), self.timeout)
+            return [None] * len(chunk)
+        finally:
+            self.in_flight[worker] -= 1
+            self.pending.pop(request_id, None)
+
+    async def fetch_results(self, all_url_api_tuples: list) -> list:
+        """Same contract as `influxdb_utils.fetch_results`, results are in the order of the input."""
+        n_chunks = max(1, min(self.workers, len(all_url_api_tuples) // self.min_chunk_size))
+        chunks = [all_url_api_tuples[i::n_chunks] for i in range(n_chunks)]
+        chunk_results = await asyncio.gather(*(self._probe_chunk(chunk) for chunk in chunks))
+        results = [None] * len(all_url_api_tuples)
+        for i, rows in enumerate(chunk_results):
+            results[i::n_chunks] = [expand_result(row) for row in rows]
+        return results
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        for future, loop, _, _ in list(self.pending.values()):
+            loop.call_soon_threadsafe(future.cancel)
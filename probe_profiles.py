@@ -0,0 +1,99 @@
+import asyncio
+import json
+import re
+import time
+from pathlib import Path
+import aiohttp
+
+from rpc_utils import timed_request
+
+# `$head` or `$head-N`, optionally suffixed with `:hex`, resolved against the latest block height seen on the endpoint.
+HEAD_TOKEN = re.compile(r'\$head(?:-(\d+))?(:hex)?')
+BLOCK_HASH_TOKEN = '$block_hash'
+
+
+def load_probe_profiles(path: Path) -> dict:
+    """
+    Load probe profiles from a JSON file mapping an api_class to a list of profiles.
+
+    Every profile needs a 'name', a 'method' and an 'interval' in seconds. 'params' is optional and may contain
+    head tokens. A profile with 'at_block' first resolves that height to a block hash, which is then available
+    to 'params' as `$block_hash`.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        profiles = json.load(f)
+    for api_class, class_profiles in profiles.items():
+        for profile in class_profiles:
+            missing = [key for key in ('name', 'method', 'interval') if key not in profile]
+            if missing:
+                raise ValueError(f'Probe profile {profile} for api_class {api_class} is missing {missing}')
+    return profiles
+
+
+def resolve_params(value, head: int, block_hash: str = None):
+    """Replace head and block hash tokens in (nested) params with concrete values."""
+    if isinstance(value, list):
+        return [resolve_params(v, head, block_hash) for v in value]
+    if isinstance(value, dict):
+        return {k: resolve_params(v, head, block_hash) for k, v in value.items()}
+    if isinstance(value, str):
+        if block_hash is not None:
+            value = value.replace(BLOCK_HASH_TOKEN, block_hash)
+        return HEAD_TOKEN.sub(lambda m: _format_height(head, m.group(1), m.group(2)), value)
+    return value
+
+
+def _format_height(head: int, offset: str, as_hex: str) -> str:
+    height = max(0, head - int(offset or 0))
+    return hex(height) if as_hex else str(height)
+
+
+class ProbeProfiles:
+    """Keeps track of when each profile last ran on each endpoint and runs the ones that are due."""
+
+    def __init__(self, profiles: dict, timeout: float = 10.0):
+        self.profiles = profiles
+        self.timeout = timeout
+        self.last_run = {}
+
+    def due(self, all_endpoints: list, heads: dict, now: float = None) -> list:
+        """
+        Return (endpoint, profile) pairs whose interval has passed and mark them as run.
+
+        Only endpoints with a known head height in `heads` are considered, since most profiles are relative to it.
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+        for endpoint in all_endpoints:
+            url, api_class = endpoint[1], endpoint[2]
+            if url not in heads:
+                continue
+            for profile in self.profiles.get(api_class, []):
+                key = (url, profile['name'])
+                if now - self.last_run.get(key, float('-inf')) >= profile['interval']:
+                    self.last_run[key] = now
+                    due.append((endpoint, profile))
+        return due
+
+    async def fetch_results(self, due: list, heads: dict) -> list:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            tasks = [run_profile(session, endpoint[1], endpoint[2], profile, heads[endpoint[1]]) for endpoint, profile in due]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_profile(session: aiohttp.ClientSession, api_url: str, api_class: str, profile: dict, head: int) -> dict:
+    """Run one profile against an endpoint, only the profile's own request is part of the measured latency."""
+    block_hash = None
+    if 'at_block' in profile:
+        height = int(resolve_params(profile['at_block'], head))
+        info = await timed_request(session, api_url, api_class, 'chain_getBlockHash', [height])
+        if info['exit_code'] != 0 or not info['response'].get('result'):
+            return {'http_code': info['http_code'], 'time_total': None, 'exit_code': info['exit_code'] if info['exit_code'] is not None else 1}
+        block_hash = info['response']['result']
+    method = resolve_params(profile['method'], head)
+    params = resolve_params(profile.get('params', []), head, block_hash)
+    info = await timed_request(session, api_url, api_class, method, params)
+    if info['exit_code'] == 0 and isinstance(info['response'], dict) and info['response'].get('result', True) is None:
+        # A null result usually means the node has pruned the requested state
+        info['exit_code'] = 1
+    return info
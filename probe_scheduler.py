@@ -0,0 +1,120 @@
+import heapq
+import random
+import time
+
+
+class BlockTimeEstimator:
+    """Estimates the block time of each chain from how fast its highest observed block height advances."""
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.block_times = {}
+        self.last_advance = {}
+
+    def observe(self, chain: str, height: int, now: float) -> None:
+        last = self.last_advance.get(chain)
+        if last is None:
+            self.last_advance[chain] = (height, now)
+            return
+        last_height, last_time = last
+        if height <= last_height:
+            return
+        sample = (now - last_time) / (height - last_height)
+        previous = self.block_times.get(chain)
+        self.block_times[chain] = sample if previous is None else previous + self.smoothing * (sample - previous)
+        self.last_advance[chain] = (height, now)
+
+    def get(self, chain: str) -> float:
+        """The estimated block time in seconds, or None if the chain hasn't advanced yet."""
+        return self.block_times.get(chain)
+
+
+class ProbeScheduler:
+    """
+    Heap-based scheduler where every endpoint has its own next due time.
+
+    The interval of an endpoint follows the observed block time of its chain, clamped to
+    [min_interval, max_interval], and is `default_interval` until a block time is known. New endpoints get a
+    random start within their first interval and every reschedule adds jitter, so probes don't fire in
+    synchronized bursts. The jitter is applied around a nominal due time that advances by whole intervals from
+    the previous nominal due time, rather than from when the probe ran, so the cadence doesn't drift by the
+    probe duration or the jitter, and slots that were missed are skipped.
+    """
+
+    def __init__(self, default_interval: float = 10.0, min_interval: float = 2.0, max_interval: float = 60.0,
+                 blocks_per_probe: float = 1.0, jitter: float = 0.1):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.blocks_per_probe = blocks_per_probe
+        self.jitter = jitter
+        self.block_times = BlockTimeEstimator()
+        self.heap = []
+        self.endpoints = {}
+        self.generation = {}
+        self.nominal = {}
+        self.counter = 0
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def interval(self, chain: str) -> float:
+        block_time = self.block_times.get(chain)
+        if block_time is None:
+            return self.default_interval
+        return min(self.max_interval, max(self.min_interval, block_time * self.blocks_per_probe))
+
+    def observe_height(self, chain: str, height: int, now: float = None) -> None:
+        self.block_times.observe(chain, height, time.monotonic() if now is None else now)
+
+    def update_endpoints(self, all_endpoints: list, now: float = None) -> tuple:
+        """Add endpoints that are new and drop the ones that are gone, returns the (added, removed) endpoints."""
+        now = time.monotonic() if now is None else now
+        current = {endpoint[1]: tuple(endpoint) for endpoint in all_endpoints}
+        removed = [self.endpoints.pop(url) for url in list(self.endpoints) if url not in current]
+        for endpoint in removed:
+            self.generation.pop(endpoint[1], None)
+            self.nominal.pop(endpoint[1], None)
+        added = []
+        for url, endpoint in current.items():
+            if url not in self.endpoints:
+                self.endpoints[url] = endpoint
+                start = now + random.uniform(0, self.interval(endpoint[0]))
+                self._push(url, start, start)
+                added.append(endpoint)
+            else:
+                self.endpoints[url] = endpoint  # Pick up a changed chain or api_class
+        return added, removed
+
+    def pop_due(self, now: float = None) -> list:
+        """Return all endpoints that are due and schedule their next probe."""
+        now = time.monotonic() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, generation, url = heapq.heappop(self.heap)
+            if self.generation.get(url) != generation:
+                continue  # Removed or rescheduled since this entry was pushed
+            endpoint = self.endpoints[url]
+            due.append(endpoint)
+            interval = self.interval(endpoint[0])
+            nominal = self._next_nominal(self.nominal[url], interval, now)
+            self._push(url, nominal, nominal + interval * random.uniform(-self.jitter, self.jitter))
+        return due
+
+    def next_due_time(self) -> float:
+        """The earliest due time in the heap, or None if nothing is scheduled."""
+        while self.heap and self.generation.get(self.heap[0][2]) != self.heap[0][1]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def _next_nominal(self, nominal: float, interval: float, now: float) -> float:
+        next_nominal = nominal + interval
+        if next_nominal <= now:
+            next_nominal += ((now - next_nominal) // interval + 1) * interval
+        return next_nominal
+
+    def _push(self, url: str, nominal: float, due_time: float) -> None:
+        self.counter += 1
+        self.generation[url] = self.counter
+        self.nominal[url] = nominal
+        heapq.heappush(self.heap, (due_time, self.counter, url))
@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+
+RESULT_FIELDS = ('latest_block_height', 'time_total', 'http_code', 'exit_code')
+
+
+class Recorder:
+    """
+    Appends raw probe results to a file, so a stretch of real traffic can be replayed with `read_recording`.
+
+    The file holds one JSON array per line. An endpoint is written once as ["E", id, chain, url, api_class] and
+    then referred to by its id, a probe batch is ["B", time, duration, [[id, height, latency, http_code,
+    exit_code, error], ...]], where a probe that raised is just [id, exception]. Every line is flushed when
+    written, so a crash loses at most the last batch.
+    """
+
+    def __init__(self, path: Path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.ids = {}
+
+    def record(self, recorded_at: float, duration: float, due: list, all_results: list) -> None:
+        lines = []
+        rows = []
+        for endpoint, results in zip(due, all_results):
+            endpoint_id = self.ids.get(endpoint)
+            if endpoint_id is None:
+                endpoint_id = self.ids[endpoint] = len(self.ids)
+                lines.append(['E', endpoint_id, *endpoint])
+            if isinstance(results, dict):
+                rows.append([endpoint_id, *(results.get(field) for field in RESULT_FIELDS), results.get('error')])
+            else:
+                rows.append([endpoint_id, str(results)])
+        lines.append(['B', round(recorded_at, 6), round(duration, 6), rows])
+        self.file.write(''.join(json.dumps(line, separators=(',', ':')) + '\n' for line in lines))
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def read_recording(path: Path):
+    """Yield (recorded_at, duration, due, all_results) for every batch, with results shaped like the probes' own."""
+    endpoints = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # A batch cut off by a crash, everything before it is complete
+            if entry[0] == 'E':
+                endpoints[entry[1]] = tuple(entry[2:])
+                continue
+            _, recorded_at, duration, rows = entry
+            due = []
+            all_results = []
+            for endpoint_id, *values, error in rows:
+                due.append(endpoints[endpoint_id])
+                if not values:
+                    all_results.append(Exception(error))
+                    continue
+                results = dict(zip(RESULT_FIELDS, values))
+                if error is not None:
+                    results['error'] = error
+                all_results.append(results)
+            yield recorded_at, duration, due, all_results
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+import requests
+
+logger = logging.getLogger(__name__)
+
+CACHE_SCHEMA_VERSION = 1
+RESOURCES = ('/all/chains', '/all/rpc_urls')
+
+
+class RegistryCache:
+    """
+    The endpoints of the registry behind the Flask API, cached on disk and refreshed with conditional requests.
+
+    Each resource is stored with its ETag and Last-Modified validators, so once the cache is older than
+    `max_age` an unchanged registry costs a 304 per resource instead of a full download and rewrite. The
+    cache file is written atomically (temp file and rename) with a schema version and a checksum, and a
+    file that fails either check is ignored. If a refresh fails the last good endpoints are kept.
+    """
+
+    def __init__(self, rpc_flask_api: str, state_dir: Path, max_age: float, filename: str = 'cache.json', timeout: float = 3.0):
+        self.rpc_flask_api = rpc_flask_api
+        self.path = Path(state_dir) / filename
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.resources, self.refreshed_at = self._read()
+        self.endpoints = self._endpoints()
+
+    def load(self) -> list:
+        """Return the endpoints as (chain, url, api_class) tuples, refreshing them first if the cache is stale."""
+        age = time.time() - self.refreshed_at
+        if age <= self.max_age:
+            logger.info("%s will be updated in: %s", self.path, self.max_age - age)
+            return self.endpoints
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error("An error occurred while updating cache, using the last good endpoints: %s", str(e))
+        return self.endpoints
+
+    def refresh(self) -> bool:
+        """Revalidate all resources, returns True if any of them changed."""
+        changed = {}
+        for resource in RESOURCES:
+            entry = self._get(resource, self.resources.get(resource))
+            if entry is not None:
+                changed[resource] = entry
+        self.refreshed_at = time.time()
+        if not changed:
+            logger.info("Registry unchanged, using cached values")
+            return False
+        logger.info("Registry changed, updating %s", self.path)
+        self.resources.update(changed)
+        self.endpoints = self._endpoints()
+        self._write()
+        return True
+
+    def _get(self, resource: str, cached: dict) -> dict:
+        """GET a resource, conditional if it's cached. Returns None if it's unchanged."""
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        response = self.session.get(self.rpc_flask_api + resource, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            return None
+        response.raise_for_status()
+        return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'), 'body': response.json()}
+
+    def _endpoints(self) -> list:
+        if not all(resource in self.resources for resource in RESOURCES):
+            return []
+        chains = {chain['name'].lower(): chain for chain in self.resources['/all/chains']['body']}
+        endpoints = []
+        for rpc_url in self.resources['/all/rpc_urls']['body']:
+            chain = chains.get(rpc_url['chain_name'].lower())
+            if chain:
+                endpoints.append((chain['name'], rpc_url['url'], chain['api_class']))
+        return endpoints
+
+    def _read(self) -> tuple:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            # The cache file of earlier versions is a JSON list of [endpoints, refreshed_at]
+            if not isinstance(cache, dict):
+                raise ValueError(f'not a cache object but {type(cache).__name__}')
+            if cache.get('schema_version') != CACHE_SCHEMA_VERSION:
+                raise ValueError(f"schema version {cache.get('schema_version')} is not {CACHE_SCHEMA_VERSION}")
+            if cache.get('checksum') != checksum(cache['resources']):
+                raise ValueError('checksum mismatch')
+            return cache['resources'], cache['refreshed_at']
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning('Could not load values from %s: %s', self.path, str(e))
+            return {}, 0
+
+    def _write(self) -> None:
+        cache = {
+            'schema_version': CACHE_SCHEMA_VERSION,
+            'refreshed_at': self.refreshed_at,
+            'checksum': checksum(self.resources),
+            'resources': self.resources,
+        }
+        atomic_write_json(self.path, cache)
+
+
+def checksum(data) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def atomic_write_json(path: Path, data) -> None:
+    """Write JSON to a temp file in the same directory and rename it over `path`, readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,131 @@
+import numpy as np
+
+UNKNOWN = 0
+HEALTHY = 1
+FAILED = 2
+
+
+def grouped_percentiles(groups: np.ndarray, values: np.ndarray, n_groups: int, percentiles: list) -> np.ndarray:
+    """
+    Nearest-rank percentiles of `values` per group, computed with one sort for all groups.
+
+    Returns an array of shape (len(percentiles), n_groups) with NaN for groups without values.
+    """
+    out = np.full((len(percentiles), n_groups), np.nan)
+    if len(values) == 0:
+        return out
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    nonempty = counts > 0
+    for i, q in enumerate(percentiles):
+        ranks = np.maximum(np.ceil(counts * q / 100).astype(np.int64), 1)
+        out[i, nonempty] = sorted_values[(starts + ranks - 1)[nonempty]]
+    return out
+
+
+class ResultFrame:
+    """
+    Columnar store of the latest probe result of every endpoint.
+
+    Each endpoint owns a row in NumPy arrays of chain index, block height, latency and status, so the per-chain
+    statistics are grouped vector operations instead of Python loops over nested dicts. Rows of removed
+    endpoints are reused by new ones.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.rows_by_url = {}
+        self.free_rows = []
+        self.chain_index = {}
+        self.chains = []
+        self.size = 0
+        self.chain_idx = np.full(capacity, -1, dtype=np.int32)
+        self.height = np.full(capacity, -1, dtype=np.int64)
+        self.latency = np.full(capacity, np.nan)
+        self.status = np.zeros(capacity, dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.rows_by_url)
+
+    def rows(self, endpoints: list) -> np.ndarray:
+        """The rows of the endpoints, rows are added for endpoints that aren't in the frame yet."""
+        rows = np.empty(len(endpoints), dtype=np.int64)
+        for i, endpoint in enumerate(endpoints):
+            row = self.rows_by_url.get(endpoint[1])
+            if row is None:
+                row = self._add(endpoint)
+            rows[i] = row
+        return rows
+
+    def remove(self, endpoints: list) -> None:
+        for endpoint in endpoints:
+            row = self.rows_by_url.pop(endpoint[1], None)
+            if row is not None:
+                self._clear(row)
+                self.free_rows.append(row)
+
+    def update(self, rows: np.ndarray, heights: np.ndarray, latencies: np.ndarray, statuses: np.ndarray) -> None:
+        self.height[rows] = heights
+        self.latency[rows] = latencies
+        self.status[rows] = statuses
+
+    def chain_max_height(self) -> np.ndarray:
+        """The highest block height of the healthy endpoints of each chain, -1 for chains without any."""
+        healthy = self.status[:self.size] == HEALTHY
+        max_height = np.full(len(self.chains), -1, dtype=np.int64)
+        np.maximum.at(max_height, self.chain_idx[:self.size][healthy], self.height[:self.size][healthy])
+        return max_height
+
+    def block_height_diffs(self, rows: np.ndarray) -> np.ndarray:
+        """How many blocks each row is behind the highest healthy endpoint of its chain."""
+        return self.chain_max_height()[self.chain_idx[rows]] - self.height[rows]
+
+    def chain_stats(self) -> dict:
+        """Per-chain max height, median diff, latency p50/p99 and endpoint counts, as arrays indexed like `chains`."""
+        n_chains = len(self.chains)
+        live = self.chain_idx[:self.size] >= 0
+        healthy = live & (self.status[:self.size] == HEALTHY)
+        chains = self.chain_idx[:self.size][healthy]
+        max_height = self.chain_max_height()
+        diffs = max_height[chains] - self.height[:self.size][healthy]
+        latency = grouped_percentiles(chains, self.latency[:self.size][healthy], n_chains, [50, 99])
+        return {
+            'chain': self.chains,
+            'max_block_height': max_height,
+            'median_block_height_diff': grouped_percentiles(chains, diffs, n_chains, [50])[0],
+            'latency_p50': latency[0],
+            'latency_p99': latency[1],
+            'healthy_endpoints': np.bincount(chains, minlength=n_chains),
+            'endpoints': np.bincount(self.chain_idx[:self.size][live], minlength=n_chains),
+        }
+
+    def _add(self, endpoint: tuple) -> int:
+        chain = endpoint[0]
+        if chain not in self.chain_index:
+            self.chain_index[chain] = len(self.chains)
+            self.chains.append(chain)
+        if self.free_rows:
+            row = self.free_rows.pop()
+        else:
+            if self.size == len(self.chain_idx):
+                self._grow()
+            row = self.size
+            self.size += 1
+        self._clear(row)
+        self.chain_idx[row] = self.chain_index[chain]
+        self.rows_by_url[endpoint[1]] = row
+        return row
+
+    def _clear(self, row: int) -> None:
+        self.chain_idx[row] = -1
+        self.height[row] = -1
+        self.latency[row] = np.nan
+        self.status[row] = UNKNOWN
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self.chain_idx)
+        self.chain_idx = np.concatenate((self.chain_idx, np.full(capacity - len(self.chain_idx), -1, dtype=np.int32)))
+        self.height = np.concatenate((self.height, np.full(capacity - len(self.height), -1, dtype=np.int64)))
+        self.latency = np.concatenate((self.latency, np.full(capacity - len(self.latency), np.nan)))
+        self.status = np.concatenate((self.status, np.zeros(capacity - len(self.status), dtype=np.int8)))
@@ -96,3 +96,28 @@ async def get_ethereum(api_url, chain_id=1):
         }
 
         return info
+
+
+def jsonrpc_payload(method: str, params: list = None, request_id=1) -> dict:
+    return {'jsonrpc': '2.0', 'method': method, 'params': params if params is not None else [], 'id': request_id}
+
+
+async def timed_request(session: aiohttp.ClientSession, api_url: str, api_class: str, method: str, params: list = None) -> dict:
+    """
+    Send a single request over an existing session and time it until the full body is read.
+
+    For the 'aptos' api_class there is no JSON-RPC, so `method` is a path appended to `api_url` instead.
+    """
+    start_time = time.monotonic()
+    try:
+        if api_class == 'aptos':
+            async with session.get(api_url + method) as resp:
+                response = await resp.json()
+        else:
+            async with session.post(api_url, json=jsonrpc_payload(method, params)) as resp:
+                response = await resp.json()
+        latency = time.monotonic() - start_time
+        failed = resp.status != 200 or (isinstance(response, dict) and ('error' in response or 'error_code' in response))
+        return {'http_code': resp.status, 'time_total': latency, 'exit_code': 1 if failed else 0, 'response': response}
+    except Exception as e:
+        return {'http_code': None, 'time_total': time.monotonic() - start_time, 'exit_code': None, 'response': None, 'error': str(e)}
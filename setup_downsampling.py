@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+from pathlib import Path
+import re
+from string import Template
+import sys
+from influxdb_client import BucketRetentionRules, InfluxDBClient, TaskCreateRequest, TaskUpdateRequest
+from color_logger import ColoredFormatter
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+console_handler = logging.StreamHandler(sys.stdout)
+console_handler.setLevel(logging.INFO)
+formatter = ColoredFormatter('%(asctime)s - %(levelname)s - %(message)s')
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+PATH_TASK_TEMPLATE = Path(__file__).parent.absolute() / 'flux' / 'downsample_task.flux'
+
+# The dashboard picks these tiers by the bucket suffix, keep them in sync with its queries
+DEFAULT_TIERS = [
+    {'every': '1m', 'retention_days': 30},
+    {'every': '1h', 'retention_days': 730},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the rollup buckets and the Flux tasks downsampling block_height_request into them')
+    parser.add_argument('config_file', type=str, help="The file with the target database's config", default='config.json')
+    parser.add_argument('--dry_run', action='store_true', help="Only print the tasks, don't change anything")
+    args = parser.parse_args()
+
+    if not (Path.cwd() / args.config_file).exists():
+        raise FileNotFoundError
+    with open(args.config_file, encoding='utf-8') as f:
+        config = json.load(f)
+
+    tiers = config.get('DOWNSAMPLING_TIERS', DEFAULT_TIERS)
+    if args.dry_run:
+        for tier in tiers:
+            print(task_flux(config['INFLUXDB_BUCKET'], tier))
+        return
+    with InfluxDBClient(url=config['INFLUXDB_URL'], token=config['INFLUXDB_TOKEN'], org=config['INFLUXDB_ORG']) as client:
+        setup_downsampling(client, config['INFLUXDB_ORG'], config['INFLUXDB_BUCKET'], tiers)
+
+
+def tier_bucket(source: str, tier: dict) -> str:
+    return f"{source}_{tier['every']}"
+
+
+def task_flux(source: str, tier: dict) -> str:
+    """The Flux of the task rolling `source` up into the bucket of the tier, over a lookback of two windows."""
+    amount, unit = re.fullmatch(r'(\d+)([a-z]+)', tier['every']).groups()
+    with open(PATH_TASK_TEMPLATE, encoding='utf-8') as f:
+        template = Template(f.read())
+    return template.substitute(name=f'downsample_{tier_bucket(source, tier)}', source=source, destination=tier_bucket(source, tier),
+                               every=tier['every'], offset=tier.get('offset', '30s'), lookback=f'{2 * int(amount)}{unit}')
+
+
+def setup_downsampling(client: InfluxDBClient, org: str, source: str, tiers: list) -> None:
+    """Create or update the bucket and task of every tier, so running this again applies changed settings."""
+    org_id = client.organizations_api().find_organizations(org=org)[0].id
+    buckets_api = client.buckets_api()
+    tasks_api = client.tasks_api()
+    for tier in tiers:
+        name = tier_bucket(source, tier)
+        retention_rules = BucketRetentionRules(type='expire', every_seconds=int(tier['retention_days'] * 86400))
+        bucket = buckets_api.find_bucket_by_name(name)
+        if bucket is None:
+            buckets_api.create_bucket(bucket_name=name, org_id=org_id, retention_rules=retention_rules,
+                                      description=f"{tier['every']} rollups of {source}")
+            logger.info("Created bucket %s with a retention of %s days", name, tier['retention_days'])
+        else:
+            bucket.retention_rules = [retention_rules]
+            buckets_api.update_bucket(bucket)
+            logger.info("Updated the retention of bucket %s to %s days", name, tier['retention_days'])
+
+        flux = task_flux(source, tier)
+        existing = tasks_api.find_tasks(name=f'downsample_{name}', org_id=org_id)
+        if existing:
+            tasks_api.update_task_request(existing[0].id, TaskUpdateRequest(flux=flux, status='active'))
+            logger.info("Updated task downsample_%s", name)
+        else:
+            tasks_api.create_task(task_create_request=TaskCreateRequest(flux=flux, org_id=org_id, status='active'))
+            logger.info("Created task downsample_%s", name)
+
+
+if __name__ == '__main__':
+    main()
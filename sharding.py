@@ -0,0 +1,92 @@
+import hashlib
+import os
+import socket
+import sqlite3
+import time
+
+
+def rendezvous_owner(key: str, members: list) -> str:
+    """
+    Pick the member that owns `key` with rendezvous (highest random weight) hashing.
+
+    Every instance computes the same owner from the same members, and adding or removing a member only
+    moves the keys of that member, so slices rebalance with minimal churn.
+    """
+    return max(members, key=lambda member: hashlib.blake2b(f'{member}/{key}'.encode('utf-8'), digest_size=8).digest())
+
+
+class SqliteMembership:
+    """
+    Local membership of poller instances through leases in an SQLite database shared by the instances.
+
+    Each instance renews its own lease on every heartbeat, instances whose lease has expired are no longer
+    members and their slice is taken over by the others.
+    """
+
+    def __init__(self, db_file: str, instance_id: str = None, lease_ttl: float = 30.0):
+        self.db_file = db_file
+        self.instance_id = instance_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_ttl = lease_ttl
+        conn = sqlite3.connect(self.db_file)
+        conn.execute('CREATE TABLE IF NOT EXISTS leases (instance_id TEXT PRIMARY KEY NOT NULL, expires_at REAL NOT NULL)')
+        conn.commit()
+        conn.close()
+
+    def heartbeat(self) -> list:
+        """Renew this instance's lease and return the sorted ids of all live members."""
+        now = time.time()
+        conn = sqlite3.connect(self.db_file, timeout=10)
+        with conn:
+            conn.execute('DELETE FROM leases WHERE expires_at < ?', (now,))
+            conn.execute('INSERT INTO leases (instance_id, expires_at) VALUES (?, ?) '
+                         'ON CONFLICT(instance_id) DO UPDATE SET expires_at=excluded.expires_at',
+                         (self.instance_id, now + self.lease_ttl))
+            members = [row[0] for row in conn.execute('SELECT instance_id FROM leases ORDER BY instance_id')]
+        conn.close()
+        return members
+
+    def leave(self) -> None:
+        conn = sqlite3.connect(self.db_file, timeout=10)
+        with conn:
+            conn.execute('DELETE FROM leases WHERE instance_id=?', (self.instance_id,))
+        conn.close()
+
+
+class Shard:
+    """
+    The slice of endpoints this poller instance is responsible for.
+
+    Endpoints are assigned by chain, not by URL, so all endpoints of a chain are probed by the same instance
+    and the block height diffs stay correct. Either a static `shard_id` out of `shard_count` is used, or the
+    members are taken from a `SqliteMembership` on every `refresh()`.
+
+    With a membership, a chain is only owned once it's assigned to this instance on two heartbeats in a row, so an
+    instance that joins or takes over a chain waits for the previous owner to notice at its own heartbeat, and
+    a failed heartbeat owns nothing, since the lease may expire and the other instances take over its chains.
+    """
+
+    def __init__(self, shard_id: int = 0, shard_count: int = 1, membership: SqliteMembership = None):
+        if not 0 <= shard_id < shard_count:
+            raise ValueError(f'Shard id {shard_id} is not within shard count {shard_count}')
+        self.membership = membership
+        self.members = [str(i) for i in range(shard_count)]
+        self.me = str(shard_id)
+        if membership:
+            self.me = membership.instance_id
+            self.members = []
+        self.previous_members = self.members
+
+    def refresh(self) -> None:
+        if self.membership:
+            self.previous_members = self.members
+            try:
+                self.members = self.membership.heartbeat()
+            except Exception:
+                self.members = []
+                raise
+
+    def owns(self, endpoint: tuple) -> bool:
+        return all(members and rendezvous_owner(endpoint[0], members) == self.me for members in (self.previous_members, self.members))
+
+    def filter(self, all_endpoints: list) -> list:
+        return [endpoint for endpoint in all_endpoints if self.owns(endpoint)]
@@ -0,0 +1,170 @@
+from abc import ABC, abstractmethod
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import sys
+import time
+from influxdb_client import Point
+from line_protocol import parse
+
+logger = logging.getLogger(__name__)
+
+
+def to_line(record) -> str:
+    return record.to_line_protocol() if isinstance(record, Point) else record
+
+
+class Sink(ABC):
+    """
+    Where the updater's points go. Records are line protocol strings or `influxdb_client.Point`s.
+
+    `write` may buffer, `flush` makes sure everything written so far is stored and `close` flushes and releases
+    the sink. `InfluxWriter` is the sink for InfluxDB, the others let the updater run without external services.
+    """
+
+    @abstractmethod
+    def write(self, records: list) -> None:
+        """Write the records, or buffer them until the next flush."""
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class NullSink(Sink):
+    """Drops all records but counts them, to benchmark the updater without the cost of storing anything."""
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, records: list) -> None:
+        self.count += len(records)
+
+
+class StdoutSink(Sink):
+    """Prints every record as line protocol."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, records: list) -> None:
+        for record in records:
+            self.stream.write(to_line(record) + '\n')
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+class BufferedSink(Sink):
+    """Sink that stores its records in batches, when `buffer_size` items are buffered or after `flush_interval` seconds."""
+
+    def __init__(self, buffer_size: int = 1000, flush_interval: float = 10.0):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def write(self, records: list) -> None:
+        # Lines from `LineProtocolSerializer` are parsed as they are, only Points are serialized first
+        for record in records:
+            self.buffer.extend(self.encode(*parse(to_line(record))))
+        if len(self.buffer) >= self.buffer_size or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self.last_flush = time.monotonic()
+        if self.buffer:
+            self.store(self.buffer)
+            self.buffer = []
+
+    @abstractmethod
+    def encode(self, measurement: str, tags: dict, fields: dict, timestamp: int) -> list:
+        """Turn a record into the items to buffer."""
+
+    @abstractmethod
+    def store(self, items: list) -> None:
+        """Store a batch of buffered items."""
+
+
+class JsonlSink(BufferedSink):
+    """Appends every record as a JSON object with measurement, tags, fields and time (in ns) to a file."""
+
+    def __init__(self, path: Path, buffer_size: int = 1000, flush_interval: float = 10.0):
+        super().__init__(buffer_size, flush_interval)
+        self.path = Path(path)
+
+    def encode(self, measurement: str, tags: dict, fields: dict, timestamp: int) -> list:
+        return [json.dumps({'measurement': measurement, 'tags': tags, 'fields': fields, 'time': timestamp})]
+
+    def store(self, items: list) -> None:
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(items) + '\n')
+
+
+class SqliteSink(BufferedSink):
+    """
+    Stores every field of every record as a row of a local SQLite time-series table.
+
+    The table has one row per (time, measurement, tags, field), with the tags as a JSON object with sorted keys,
+    so a series can be selected with an equality on the tags column. Rows are inserted in one transaction per flush.
+    """
+
+    def __init__(self, path: Path, buffer_size: int = 1000, flush_interval: float = 10.0):
+        super().__init__(buffer_size, flush_interval)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS points '
+                                '(time INTEGER NOT NULL, measurement TEXT NOT NULL, tags TEXT NOT NULL, field TEXT NOT NULL, value)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS points_series ON points (measurement, tags, time)')
+        self.connection.commit()
+
+    def encode(self, measurement: str, tags: dict, fields: dict, timestamp: int) -> list:
+        tag_set = json.dumps(tags, sort_keys=True)
+        return [(timestamp, measurement, tag_set, field, value) for field, value in fields.items()]
+
+    def store(self, items: list) -> None:
+        with self.connection:
+            self.connection.executemany('INSERT INTO points (time, measurement, tags, field, value) VALUES (?, ?, ?, ?, ?)', items)
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+
+class FanOutSink(Sink):
+    """Writes every record to several sinks, a failing sink doesn't keep the records from the others."""
+
+    def __init__(self, sinks: list):
+        self.sinks = sinks
+
+    def write(self, records: list) -> None:
+        self._each('write', records)
+
+    def flush(self) -> None:
+        self._each('flush')
+
+    def close(self) -> None:
+        self._each('close')
+
+    def _each(self, method: str, *args) -> None:
+        for sink in self.sinks:
+            try:
+                getattr(sink, method)(*args)
+            except Exception as e:
+                logger.error("%s of %s failed: %s", method, type(sink).__name__, str(e))
+
+
+def create_sink(spec: dict) -> Sink:
+    """Create a local sink from its config, e.g. {"type": "jsonl", "path": "points.jsonl"}."""
+    if spec['type'] == 'null':
+        return NullSink()
+    if spec['type'] == 'stdout':
+        return StdoutSink()
+    if spec['type'] == 'jsonl':
+        return JsonlSink(spec['path'], spec.get('buffer_size', 1000), spec.get('flush_interval', 10.0))
+    if spec['type'] == 'sqlite':
+        return SqliteSink(spec['path'], spec.get('buffer_size', 1000), spec.get('flush_interval', 10.0))
+    raise ValueError(f"Unknown sink type {spec['type']}")
@@ -124,6 +124,32 @@ class CRUDTestCase(unittest.TestCase):
         self.assertIsNotNone(record)
         self.assertEqual(record[1], url_data['chain_name'])
 
+    def test_create_records_bulk(self):
+        chains = [{'name': 'Kusama', 'api_class': 'substrate'}, {'name': 'Polkadot', 'api_class': 'substrate'},
+                  {'name': 'Bad', 'api_class': 'unknown'}, {'name': 'Missing api_class'}]
+        response = self.app.post('/create_chains', json=chains, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['created'], 1)
+        self.assertEqual(response.json['existing'], 1)
+        self.assertEqual([error['index'] for error in response.json['errors']], [2, 3])
+
+        urls = [{'url': 'wss://kusama-rpc.polkadot.io', 'chain_name': 'Kusama'},
+                {'url': 'https://rpc.unknown.io', 'chain_name': 'Unknown'}]
+        response = self.app.post('/create_rpc_urls', json=urls, headers=self.auth_header)
+        self.assertEqual(response.json['created'], 1)
+        self.assertEqual(response.json['errors'][0]['index'], 1)
+        self.assertIn('FOREIGN KEY', response.json['errors'][0]['error'])
+
+        response = self.app.post('/create_rpc_urls', json={'url': 'https://rpc.kusama.io'}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 400)
+        response = self.app.post('/create_rpc_urls', json=urls)
+        self.assertEqual(response.status_code, 401)
+
+    def test_capabilities(self):
+        response = self.app.get('/capabilities')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['bulk_endpoints']['rpc_urls'], '/create_rpc_urls')
+
     def test_get_all_chain_records(self):
         response = self.app.get('/all/chains')
         self.assertEqual(response.status_code, 200)
@@ -134,6 +160,17 @@ class CRUDTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIsInstance(response.json, list)
 
+    def test_get_all_records_conditional(self):
+        response = self.app.get('/all/chains')
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+        unchanged = self.app.get('/all/chains', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(unchanged.status_code, 304)
+        self.app.post('/create_chain', json={'name': 'Kusama', 'api_class': 'substrate'}, headers=self.auth_header)
+        changed = self.app.get('/all/chains', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json), 3)
+
     def test_get_chain_record_by_name(self):
         chain_data = {'name': 'Polkadot', 'api_class': 'substrate'}
         response = self.app.get(f'/get_chain_by_name/{chain_data["name"]}')
@@ -186,6 +223,21 @@ class CRUDTestCase(unittest.TestCase):
         self.assertEqual(updated_record['url'], new_url_data['url'])
         self.assertEqual(updated_record['chain_name'], new_url_data['chain_name'])
 
+    def test_update_chain_record(self):
+        response = self.app.put('/update_chain?name=polkadot', json={'api_class': 'ethereum'}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['api_class'], 'ethereum')
+        response = self.app.get('/get_chain_by_name/Polkadot')
+        self.assertEqual(response.json['api_class'], 'ethereum')
+
+        response = self.app.put('/update_chain?name=Unknown', json={'api_class': 'ethereum'}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json)
+        response = self.app.put('/update_chain?name=Polkadot', json={'api_class': 'unknown'}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 500)
+        response = self.app.put('/update_chain?name=Polkadot', json={}, headers=self.auth_header)
+        self.assertEqual(response.status_code, 400)
+
     def test_delete_chain_record(self):
         query_string = {'name': 'Polkadot'}  # Added in setUp()
         response = self.app.delete('/delete_chain', query_string=query_string, headers=self.auth_header)
@@ -0,0 +1,68 @@
+#!/bin/env python3
+
+import asyncio
+import unittest
+from unittest import mock
+import capacity_test
+from capacity_test import parse_method_mix, percentile, run_capacity_test, summarize
+
+
+def fake_timed_request(calls: list, latency: float = 0.01):
+    """A `timed_request` that answers 'ok' after `latency` seconds and fails every other method at once."""
+    async def timed_request(session, api_url, api_class, method):
+        calls.append(method)
+        if method != 'ok':
+            return {'http_code': None, 'time_total': 0.001, 'exit_code': None, 'response': None, 'error': 'connection refused'}
+        await asyncio.sleep(latency)
+        return {'http_code': 200, 'time_total': latency, 'exit_code': 0, 'response': {'result': '0x1'}}
+    return timed_request
+
+
+class CapacityTestTestCase(unittest.TestCase):
+
+    def test_parse_method_mix(self):
+        self.assertEqual(parse_method_mix('eth_blockNumber:3, eth_chainId:0.5'), {'eth_blockNumber': 3.0, 'eth_chainId': 0.5})
+        self.assertEqual(parse_method_mix('eth_blockNumber,system_health:2'), {'eth_blockNumber': 1.0, 'system_health': 2.0})
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([0.5], 50), 0.5)
+        self.assertEqual(percentile([0.5], 99), 0.5)
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile([1, 2, 3], 50), 2.0)
+        self.assertEqual(percentile([1, 2, 3], 99), 3.0)
+
+    def test_summarize_without_time_or_requests(self):
+        summary = summarize([], 0, 0.0, 4, {'eth_blockNumber': 1})
+        self.assertEqual((summary['requests'], summary['rps'], summary['error_rate']), (0, 0.0, 0.0))
+        summary = summarize([0.2, 0.1], 2, 0.0, 4, {'': 1})
+        self.assertEqual((summary['requests'], summary['rps'], summary['error_rate']), (4, 0.0, 0.5))
+        self.assertEqual(summary['methods'], '/:1')
+        self.assertEqual(summary['latency_p50'], 0.1)
+
+    def test_burst(self):
+        calls = []
+        with mock.patch.object(capacity_test, 'timed_request', fake_timed_request(calls)):
+            summary = asyncio.run(run_capacity_test('https://rpc.example.com', 'ethereum', 2, 0.2, {'ok': 1}))
+        self.assertEqual(summary['requests'], len(calls))
+        self.assertGreater(summary['requests'], 10)
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual(summary['latency_p50'], 0.01)
+        self.assertEqual(summary['latency_p99'], 0.01)
+        self.assertAlmostEqual(summary['rps'], summary['requests'] / summary['duration'])
+
+    def test_failing_endpoint_backs_off(self):
+        calls = []
+        with mock.patch.object(capacity_test, 'timed_request', fake_timed_request(calls)):
+            summary = asyncio.run(run_capacity_test('https://rpc.example.com', 'ethereum', 3, 0.3, {'fail': 1}))
+        # Every worker waits 0.1 s and then 0.2 s after its failures instead of retrying at once
+        self.assertLessEqual(summary['requests'], 9)
+        self.assertEqual(summary['requests'], len(calls))
+        self.assertEqual(summary['errors'], summary['requests'])
+        self.assertEqual((summary['error_rate'], summary['rps'], summary['latency_p50']), (1.0, 0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/bin/env python3
+
+import unittest
+from chain_progress import ChainProgress, RingBuffer
+
+
+class ChainProgressTestCase(unittest.TestCase):
+
+    def test_ring_buffer_window(self):
+        ring = RingBuffer(3)
+        self.assertIsNone(ring.rate())
+        for t in range(10):
+            ring.append(float(t), t * t)
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring.last(), (9.0, 81))
+        self.assertAlmostEqual(ring.rate(), (81 - 49) / 2)
+
+    def test_block_rate_and_lag(self):
+        progress = ChainProgress(window=5)
+        for t in range(6):
+            progress.observe_chain('Polkadot', 1000 + t * 2, now=t * 12.0)
+        self.assertAlmostEqual(progress.block_rate('Polkadot'), 2 / 12)
+        stats = progress.stats('Polkadot', 'wss://rpc.polkadot.io', diff=4, now=60.0)
+        self.assertAlmostEqual(stats['lag_seconds'], 24.0)
+
+    def test_chain_only_counts_advances(self):
+        progress = ChainProgress()
+        progress.observe_chain('Polkadot', 10, now=0.0)
+        progress.observe_chain('Polkadot', 10, now=5.0)
+        progress.observe_chain('Polkadot', 9, now=6.0)
+        self.assertIsNone(progress.block_rate('Polkadot'))
+
+    def test_endpoint_stall_and_catch_up(self):
+        progress = ChainProgress()
+        progress.observe_endpoint('Ethereum mainnet', 'https://a', 100, 10, now=0.0)
+        progress.observe_endpoint('Ethereum mainnet', 'https://a', 100, 6, now=2.0)
+        progress.observe_endpoint('Ethereum mainnet', 'https://a', 100, 2, now=4.0)
+        stats = progress.stats('Ethereum mainnet', 'https://a', 2, now=5.0)
+        self.assertEqual(stats['time_since_advance'], 5.0)
+        self.assertAlmostEqual(stats['catch_up_rate'], 2.0)
+        self.assertNotIn('lag_seconds', stats)
+        progress.forget([('Ethereum mainnet', 'https://a', 'ethereum')])
+        self.assertEqual(progress.stats('Ethereum mainnet', 'https://a', 2, now=5.0), {})
+
+    def test_forget_last_endpoint_of_chain(self):
+        progress = ChainProgress()
+        for t in range(3):
+            progress.observe_chain('Polkadot', 1000 + t, now=t * 6.0)
+        progress.observe_endpoint('Polkadot', 'wss://a', 1002, 0, now=12.0)
+        progress.observe_endpoint('Polkadot', 'wss://b', 1002, 0, now=12.0)
+        progress.forget([('Polkadot', 'wss://a', 'substrate')])
+        self.assertIsNotNone(progress.block_rate('Polkadot'))
+        progress.forget([('Polkadot', 'wss://b', 'substrate')])
+        self.assertIsNone(progress.block_rate('Polkadot'))
+        self.assertNotIn('Polkadot', progress.chain_heights)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/bin/env python3
+
+from datetime import datetime, timedelta, timezone
+import unittest
+from check_influx_db import PATH_DEFAULT_DASHBOARD, check_report, dashboard_queries, parse_duration, render_query
+
+
+class CheckInfluxDbTestCase(unittest.TestCase):
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('90m'), timedelta(minutes=90))
+        self.assertEqual(parse_duration('7d'), timedelta(days=7))
+        with self.assertRaises(ValueError):
+            parse_duration('7 days')
+
+    def test_render_dashboard_queries(self):
+        queries = dashboard_queries(PATH_DEFAULT_DASHBOARD)
+        self.assertEqual(len(queries), 3)
+        stop = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        for _, query in queries:
+            flux = render_query(query, stop - timedelta(days=1), stop, 'Polkadot')
+            self.assertTrue(flux.startswith('v = {timeRangeStart: 2024-01-01T00:00:00Z, timeRangeStop: 2024-01-02T00:00:00Z}\n'))
+            self.assertIn('r.chain == "Polkadot"', flux)
+            self.assertIn('aggregateWindow(every: 86s, fn: max)', flux)
+            self.assertNotIn('$', flux)
+
+    def test_render_keeps_imports_first(self):
+        flux = render_query('import "strings"\n\nfrom(bucket: "b")', datetime(2024, 1, 1, tzinfo=timezone.utc),
+                            datetime(2024, 1, 1, 1, tzinfo=timezone.utc), 'x')
+        self.assertEqual(flux.split('\n')[:2], ['import "strings"', 'v = {timeRangeStart: 2024-01-01T00:00:00Z, timeRangeStop: 2024-01-01T01:00:00Z}'])
+
+    def test_check_report(self):
+        report = {
+            'cardinality': {'series': 5000},
+            'queries': [{'panel': 'Latency', 'range': '30d', 'median_seconds': 2.5}, {'panel': 'Latency', 'range': '1h', 'median_seconds': 0.1}],
+        }
+        self.assertEqual(check_report(report), [])
+        self.assertEqual(len(check_report(report, max_series=1000, max_query_seconds=1.0)), 2)
+        self.assertEqual(check_report(report, max_series=10000, max_query_seconds=5.0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,366 @@
+#!/bin/env python3
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from aiohttp import web
+import requests
+import db_util
+from db_util import (ImportCheckpoint, api_apply_sync, api_import_entries, api_read_entries, create_snapshot, iter_json_array,
+                     local_apply_sync, local_import_from_json_files, local_read_entries, plan_sync, request_with_retry, restore_data,
+                     restore_snapshot, validate_rpcs)
+
+CHAINS = [{'name': 'Ethereum', 'api_class': 'ethereum'}, {'name': 'Polkadot', 'api_class': 'substrate'}]
+RPC_URLS = [{'url': 'https://eth.example.com', 'chain_name': 'Ethereum'},
+            {'url': 'wss://dot.example.com', 'chain_name': 'polkadot'}]
+
+
+class LocalImportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = str(Path(self.tmp_dir.name) / 'test.db')
+        conn = sqlite3.connect(self.db_file)
+        conn.execute('CREATE TABLE chains (name TEXT PRIMARY KEY UNIQUE COLLATE NOCASE NOT NULL, '
+                     'api_class TEXT COLLATE NOCASE NOT NULL)')
+        conn.execute('CREATE TABLE rpc_urls (url TEXT PRIMARY KEY UNIQUE COLLATE NOCASE NOT NULL, '
+                     'chain_name TEXT COLLATE NOCASE NOT NULL, FOREIGN KEY(chain_name) REFERENCES chains(name))')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def rows(self, table):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return sorted(conn.execute(f'SELECT * FROM {table}').fetchall())
+        finally:
+            conn.close()
+
+    def test_import(self):
+        counters = local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        self.assertEqual(counters['chains']['added'], 2)
+        self.assertEqual(counters['rpc_urls']['added'], 2)
+        self.assertEqual(len(self.rows('rpc_urls')), 2)
+
+        counters = local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        self.assertEqual(counters['chains']['added'], 0)
+        self.assertEqual(counters['chains']['unchanged'], 2)
+        self.assertEqual(counters['rpc_urls']['unchanged'], 2)
+
+    def test_ignore_and_upsert(self):
+        local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        changed = [{'name': 'ETHEREUM', 'api_class': 'aptos'}]
+
+        counters = local_import_from_json_files(changed, [], self.db_file, mode='ignore')
+        self.assertEqual(counters['chains']['skipped'], 1)
+        self.assertIn(('Ethereum', 'ethereum'), self.rows('chains'))
+
+        counters = local_import_from_json_files(changed, [], self.db_file, mode='upsert')
+        self.assertEqual(counters['chains']['updated'], 1)
+        self.assertIn(('Ethereum', 'aptos'), self.rows('chains'))
+
+    def test_missing_chain_and_duplicates(self):
+        rpc_urls = RPC_URLS + [{'url': 'https://ETH.example.com', 'chain_name': 'Ethereum'},
+                               {'url': 'https://unknown.example.com', 'chain_name': 'Unknown'}]
+        counters = local_import_from_json_files(CHAINS, rpc_urls, self.db_file)
+        self.assertEqual(counters['rpc_urls']['duplicates'], 1)
+        self.assertEqual(counters['rpc_urls']['invalid'], 1)
+        self.assertEqual(counters['rpc_urls']['added'], 2)
+        self.assertEqual(len(self.rows('rpc_urls')), 2)
+
+    def test_duplicates_across_batches(self):
+        chains = CHAINS + [{'name': 'ethereum', 'api_class': 'substrate'}]
+        rpc_urls = [{'url': 'https://eth.example.com', 'chain_name': 'Unknown'}] + RPC_URLS + [RPC_URLS[0]]
+        counters = local_import_from_json_files(iter(chains), iter(rpc_urls), self.db_file, batch_size=1)
+        self.assertEqual(counters['chains'], {'added': 2, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'duplicates': 1, 'invalid': 0})
+        self.assertEqual(counters['rpc_urls'], {'added': 2, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'duplicates': 1, 'invalid': 1})
+        self.assertEqual(self.rows('chains'), [('Ethereum', 'substrate'), ('Polkadot', 'substrate')])
+
+        # Only the first of duplicate entries is counted, as skipped since mode 'ignore' keeps the row
+        counters = local_import_from_json_files(chains, [], self.db_file, batch_size=2)
+        self.assertEqual(counters['chains'], {'added': 0, 'updated': 0, 'unchanged': 1, 'skipped': 1, 'duplicates': 1, 'invalid': 0})
+        self.assertEqual(self.rows('chains'), [('Ethereum', 'substrate'), ('Polkadot', 'substrate')])
+
+    def test_entries_with_missing_fields(self):
+        chains = [{'name': 'Kusama'}, CHAINS[0], {'api_class': 'substrate'}, 'Polkadot']
+        rpc_urls = [{'url': 'wss://ksm.example.com'}, RPC_URLS[0], {'url': None, 'chain_name': 'Ethereum'}]
+        with mock.patch('builtins.print'):
+            counters = local_import_from_json_files(iter(chains), iter(rpc_urls), self.db_file)
+        self.assertEqual((counters['chains']['added'], counters['chains']['invalid']), (1, 3))
+        self.assertEqual((counters['rpc_urls']['added'], counters['rpc_urls']['invalid']), (1, 2))
+
+    def test_mode_of_api_import(self):
+        with mock.patch('sys.argv', ['db_util.py', 'import', '--target_url', 'http://localhost:5000', '--mode', 'upsert']), \
+                mock.patch('sys.stderr'), mock.patch.object(db_util, 'import_data') as import_data:
+            with self.assertRaises(SystemExit):
+                db_util.main()
+        import_data.assert_not_called()
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            local_import_from_json_files(CHAINS, RPC_URLS, self.db_file, mode='replace')
+
+    def test_sync(self):
+        local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        chains = [{'name': 'ethereum', 'api_class': 'substrate'}, {'name': 'Kusama', 'api_class': 'substrate'}]
+        rpc_urls = [{'url': 'https://ETH.example.com', 'chain_name': 'Ethereum'},
+                    {'url': 'wss://ksm.example.com', 'chain_name': 'Kusama'}]
+        plan = plan_sync(chains, rpc_urls, *local_read_entries(self.db_file))
+        self.assertEqual(plan['chains']['add'], [chains[1]])
+        self.assertEqual(plan['chains']['change'], [(CHAINS[0], chains[0])])
+        self.assertEqual(plan['chains']['remove'], [CHAINS[1]])
+        self.assertEqual(plan['rpc_urls']['add'], [rpc_urls[1]])
+        self.assertEqual(plan['rpc_urls']['change'], [])
+        self.assertEqual(plan['rpc_urls']['remove'], [RPC_URLS[1]])
+
+        local_apply_sync(plan, self.db_file)
+        self.assertEqual(self.rows('chains'), [('Ethereum', 'substrate'), ('Kusama', 'substrate')])
+        self.assertEqual(self.rows('rpc_urls'), [('https://eth.example.com', 'Ethereum'), ('wss://ksm.example.com', 'Kusama')])
+        plan = plan_sync(chains, rpc_urls, *local_read_entries(self.db_file))
+        self.assertFalse(any(changes for table_plan in plan.values() for changes in table_plan.values()))
+
+    def test_sync_missing_chain(self):
+        with self.assertRaises(ValueError):
+            plan_sync(CHAINS[:1], RPC_URLS, [], [])
+
+    def test_snapshot_and_restore(self):
+        local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        snapshot = Path(self.tmp_dir.name) / 'snapshot.db.gz'
+        create_snapshot(Path(self.db_file), snapshot)
+        self.assertTrue(Path(self.tmp_dir.name, 'snapshot.db.gz.sha256').exists())
+
+        local_import_from_json_files([{'name': 'Kusama', 'api_class': 'substrate'}], [], self.db_file)
+        restore_snapshot(snapshot, Path(self.db_file))
+        self.assertEqual(len(self.rows('chains')), 2)
+        self.assertEqual(len(self.rows('rpc_urls')), 2)
+
+    def test_restore_corrupt_snapshot(self):
+        snapshot = Path(self.tmp_dir.name) / 'snapshot.db.gz'
+        create_snapshot(Path(self.db_file), snapshot)
+        local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        with open(snapshot, 'ab') as f:
+            f.write(b'garbage')
+        with self.assertRaises(ValueError):
+            restore_snapshot(snapshot, Path(self.db_file))
+        self.assertEqual(len(self.rows('chains')), 2)
+
+        Path(self.tmp_dir.name, 'snapshot.db.gz.sha256').unlink()
+        with self.assertRaises(FileNotFoundError):
+            restore_snapshot(snapshot, Path(self.db_file))
+
+    def test_restore_invalid_snapshot(self):
+        local_import_from_json_files(CHAINS, RPC_URLS, self.db_file)
+        snapshot = Path(self.tmp_dir.name) / 'snapshot.db.gz'
+        for content, error in ((b'not gzip', gzip.BadGzipFile), (gzip.compress(b'not a database' * 100), sqlite3.DatabaseError)):
+            snapshot.write_bytes(content)
+            Path(self.tmp_dir.name, 'snapshot.db.gz.sha256').write_text(f'{hashlib.sha256(content).hexdigest()}  snapshot.db.gz\n')
+            with self.assertRaises(error):
+                restore_snapshot(snapshot, Path(self.db_file))
+            with mock.patch('builtins.print') as printed:
+                restore_data(argparse.Namespace(snapshot=str(snapshot), target_db=self.db_file, force=True))
+            self.assertTrue(printed.call_args.args[0].startswith('Error: '))
+        self.assertEqual(len(self.rows('chains')), 2)
+
+    def test_restore_with_journal(self):
+        snapshot = Path(self.tmp_dir.name) / 'snapshot.db.gz'
+        create_snapshot(Path(self.db_file), snapshot)
+        Path(f'{self.db_file}-journal').touch()
+        with self.assertRaises(ValueError):
+            restore_snapshot(snapshot, Path(self.db_file))
+
+    def test_iter_json_array(self):
+        path = Path(self.tmp_dir.name) / 'rpc_urls.json'
+        path.write_text(json.dumps(RPC_URLS * 50, indent=4), encoding='utf-8')
+        self.assertEqual(list(iter_json_array(path, chunk_size=7)), RPC_URLS * 50)
+        path.write_text(' [ 1, 22 ,[3] ] ', encoding='utf-8')
+        self.assertEqual(list(iter_json_array(path, chunk_size=1)), [1, 22, [3]])
+        path.write_text('[]', encoding='utf-8')
+        self.assertEqual(list(iter_json_array(path)), [])
+        path.write_text('[1, 2', encoding='utf-8')
+        with self.assertRaises(ValueError):
+            list(iter_json_array(path))
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, text=None):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body) if text is None else text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeSession:
+    """Answers every request with the next of `responses`, raising it if it's an exception."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    def request(self, method, url, json=None, params=None, headers=None, timeout=None):
+        self.payloads.append(json)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def get(self, url, timeout=None):
+        raise requests.exceptions.ConnectionError()  # An API without /capabilities
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+@mock.patch.object(db_util.time, 'sleep', lambda seconds: None)
+class ApiImportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = Path(self.tmp_dir.name) / 'checkpoint.jsonl'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_request_with_retry(self):
+        session = FakeSession([requests.exceptions.ConnectionError(), FakeResponse(503), FakeResponse(201)])
+        self.assertEqual(request_with_retry(session, 'POST', 'url', {}, retries=3).status_code, 201)
+        session = FakeSession([FakeResponse(503), FakeResponse(503)])
+        self.assertEqual(request_with_retry(session, 'POST', 'url', {}, retries=1).status_code, 503)
+        session = FakeSession([FakeResponse(500)])
+        self.assertEqual(request_with_retry(session, 'POST', 'url', {}, retries=3).status_code, 500)
+        session = FakeSession([requests.exceptions.Timeout(), requests.exceptions.Timeout()])
+        with self.assertRaises(requests.exceptions.Timeout):
+            request_with_retry(session, 'POST', 'url', {}, retries=1)
+
+    def test_bulk_import_and_resume(self):
+        checkpoint = ImportCheckpoint(self.checkpoint_path)
+        session = FakeSession([FakeResponse(200, {'created': 1, 'existing': 0, 'errors': [{'index': 1, 'error': 'FOREIGN KEY constraint failed'}]})])
+        counters = api_import_entries(session, 'url', True, 10, RPC_URLS, 'rpc_urls', 'url', {}, checkpoint, 2, 0)
+        self.assertEqual(counters, {'added': 1, 'existing': 0, 'resumed': 0, 'invalid': 1})
+
+        # Only the failed entry is posted again when resuming from the saved checkpoint
+        session = FakeSession([FakeResponse(201)])
+        counters = api_import_entries(session, 'url', False, 1, RPC_URLS, 'rpc_urls', 'url', {},
+                                      ImportCheckpoint(self.checkpoint_path), 2, 0)
+        self.assertEqual(counters, {'added': 1, 'existing': 0, 'resumed': 1, 'invalid': 0})
+        self.assertEqual(session.payloads, [RPC_URLS[1]])
+
+    def test_interrupted_checkpoint_save(self):
+        checkpoint = ImportCheckpoint(self.checkpoint_path)
+        checkpoint.mark('chains', ['Ethereum'])
+        checkpoint.mark('rpc_urls', ['https://ETH.example.com', 'wss://dot.example.com'])
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as f:
+            f.write('{"table": "chains", "keys": ["polk')
+        checkpoint = ImportCheckpoint(self.checkpoint_path)
+        self.assertEqual(checkpoint.done, {'chains': {'ethereum'}, 'rpc_urls': {'https://eth.example.com', 'wss://dot.example.com'}})
+        checkpoint.mark('chains', ['Polkadot'])
+        self.assertEqual(ImportCheckpoint(self.checkpoint_path).done['chains'], {'ethereum', 'polkadot'})
+
+    def test_api_sync_failures(self):
+        target_chains = CHAINS + [{'name': 'Kusama', 'api_class': 'substrate'}]
+        plan = plan_sync([{'name': 'Ethereum', 'api_class': 'substrate'}, CHAINS[1]], [], target_chains, [])
+        session = FakeSession([FakeResponse(200, text='<html>Bad Gateway</html>'), FakeResponse(404, {'error': 'not found'})])
+        with mock.patch.object(db_util, 'create_session', return_value=session), \
+                mock.patch.object(db_util, 'get_auth_header', return_value={}), mock.patch('builtins.print') as printed:
+            self.assertEqual(api_apply_sync(plan, 'url', concurrency=1, retries=0), 2)
+        self.assertEqual(printed.call_args_list, [mock.call('Error: change chain Ethereum: 200 <html>Bad Gateway</html>'),
+                                                  mock.call('Error: remove chain Kusama: 404 {"error": "not found"}')])
+
+    def test_api_read_entries(self):
+        session = FakeSession([FakeResponse(200, CHAINS), FakeResponse(200, RPC_URLS)])
+        with mock.patch.object(db_util, 'create_session', return_value=session):
+            self.assertEqual(api_read_entries('url'), (CHAINS, RPC_URLS))
+        for response in (FakeResponse(401, {'msg': 'Missing Authorization Header'}), FakeResponse(200, text='<html>Bad Gateway</html>')):
+            with mock.patch.object(db_util, 'create_session', return_value=FakeSession([response])):
+                with self.assertRaises(ValueError):
+                    api_read_entries('url', retries=0)
+
+    def test_invalid_bulk_responses(self):
+        checkpoint = ImportCheckpoint(self.checkpoint_path)
+        session = FakeSession([FakeResponse(200, text='<html>Bad Gateway</html>'), FakeResponse(200, {'created': 1})])
+        with mock.patch('builtins.print'):
+            counters = api_import_entries(session, 'url', True, 1, RPC_URLS, 'rpc_urls', 'url', {}, checkpoint, 1, 0)
+        self.assertEqual(counters, {'added': 0, 'existing': 0, 'resumed': 0, 'invalid': 2})
+        self.assertEqual(checkpoint.done['rpc_urls'], set())
+
+    def test_single_import_existing_and_failed(self):
+        session = FakeSession([FakeResponse(400, {'error': 'UNIQUE constraint failed: chains.name'}), requests.exceptions.ConnectionError()])
+        counters = api_import_entries(session, 'url', False, 1, CHAINS, 'chains', 'name', {}, ImportCheckpoint(), 1, 0)
+        self.assertEqual(counters, {'added': 0, 'existing': 1, 'resumed': 0, 'invalid': 1})
+
+
+class ValidateTestCase(unittest.IsolatedAsyncioTestCase):
+    """Validates URL:s of a local server that answers like an Ethereum node over HTTP and a Substrate node over WS."""
+
+    async def asyncSetUp(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def http_rpc(request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return web.json_response({'jsonrpc': '2.0', 'id': 1, 'result': hex(100)})
+
+        async def ws_rpc(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            await ws.receive()
+            await ws.send_json({'jsonrpc': '2.0', 'id': 1, 'result': {'number': hex(200)}})
+            await ws.close()
+            return ws
+
+        async def error(request):
+            return web.Response(status=503, text='Service unavailable')
+
+        app = web.Application()
+        app.router.add_post('/eth', http_rpc)
+        app.router.add_get('/dot', ws_rpc)
+        app.router.add_post('/down', error)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.base = f'127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def test_validate_rpcs(self):
+        chains = [{'name': 'Ethereum', 'api_class': 'ethereum'}, {'name': 'Polkadot', 'api_class': 'substrate'}]
+        rpcs = [{'url': f'http://{self.base}/eth', 'chain_name': 'ethereum'},
+                {'url': f'ws://{self.base}/dot', 'chain_name': 'Polkadot'},
+                {'url': f'http://{self.base}/down', 'chain_name': 'Ethereum'},
+                {'url': f'http://{self.base}/eth', 'chain_name': 'Unknown'}]
+        results = await validate_rpcs(rpcs, chains)
+        self.assertEqual([result['ok'] for result in results], [True, True, False, False])
+        self.assertEqual([result['block_height'] for result in results], [100, 200, None, None])
+        self.assertGreater(results[0]['latency'], 0)
+        self.assertIn('503', results[2]['error'])
+        self.assertIn('missing', results[3]['error'])
+
+    async def test_per_host_limit(self):
+        chains = [{'name': 'Ethereum', 'api_class': 'ethereum'}]
+        rpcs = [{'url': f'http://{self.base}/eth', 'chain_name': 'Ethereum'}] * 20
+        results = await validate_rpcs(rpcs, chains, concurrency=10, per_host=3)
+        self.assertTrue(all(result['ok'] for result in results))
+        self.assertGreater(self.max_in_flight, 1)
+        self.assertLessEqual(self.max_in_flight, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+#!/bin/env python3
+
+import unittest
+from emission import EmissionPolicy
+
+
+class EmissionPolicyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = EmissionPolicy(diff_deadband=2, latency_deadband=0.5, latency_deadband_min=0.01, heartbeat=60)
+        self.assertTrue(self.policy.should_emit('https://a', 100, 0, 0.2, now=0))
+
+    def test_unchanged_is_suppressed(self):
+        self.assertFalse(self.policy.should_emit('https://a', 100, 1, 0.25, now=10))
+
+    def test_height_change_is_emitted(self):
+        self.assertTrue(self.policy.should_emit('https://a', 101, 0, 0.2, now=10))
+
+    def test_diff_deadband(self):
+        self.assertTrue(self.policy.should_emit('https://a', 100, 2, 0.2, now=10))
+
+    def test_latency_deadband(self):
+        self.assertTrue(self.policy.should_emit('https://a', 100, 0, 0.31, now=10))
+
+    def test_heartbeat(self):
+        self.assertFalse(self.policy.should_emit('https://a', 100, 0, 0.2, now=59))
+        self.assertTrue(self.policy.should_emit('https://a', 100, 0, 0.2, now=60))
+
+    def test_forget(self):
+        self.policy.forget([('Ethereum mainnet', 'https://a', 'ethereum')])
+        self.assertTrue(self.policy.should_emit('https://a', 100, 0, 0.2, now=10))
+
+
+if __name__ == '__main__':
+    unittest.main()
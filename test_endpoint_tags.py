@@ -0,0 +1,21 @@
+#!/bin/env python3
+
+import unittest
+from endpoint_tags import endpoint_tags
+
+
+class EndpointTagsTestCase(unittest.TestCase):
+
+    def test_endpoint_tags(self):
+        self.assertEqual(endpoint_tags('https://rpc.ankr.com/eth'), {'scheme': 'https', 'host': 'rpc.ankr.com', 'provider': 'ankr.com'})
+        self.assertEqual(endpoint_tags('wss://Rpc.Polkadot.io/'), {'scheme': 'wss', 'host': 'rpc.polkadot.io', 'provider': 'polkadot.io'})
+        self.assertEqual(endpoint_tags('http://localhost:8545'), {'scheme': 'http', 'host': 'localhost:8545', 'provider': 'localhost'})
+
+    def test_provider(self):
+        self.assertEqual(endpoint_tags('https://eth.node.example.co.uk')['provider'], 'example.co.uk')
+        self.assertEqual(endpoint_tags('https://mainnet.infura.io/v3/key')['provider'], 'infura.io')
+        self.assertEqual(endpoint_tags('http://10.0.0.1:8545')['provider'], '10.0.0.1')
+
+
+if __name__ == '__main__':
+    unittest.main()
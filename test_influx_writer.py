@@ -0,0 +1,87 @@
+#!/bin/env python3
+
+from pathlib import Path
+import tempfile
+import time
+import unittest
+from influx_writer import InfluxWriter, Spool
+
+
+class FakeWriteApi:
+
+    def __init__(self):
+        self.fail = False
+        self.written = []
+
+    def write(self, bucket, record):
+        if self.fail:
+            raise ConnectionError('influx is down')
+        self.written.extend(record)
+
+
+class InfluxWriterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.spool = Spool(self.spool_dir.name, max_bytes=1000, segment_max_bytes=100)
+        self.writer = InfluxWriter('http://localhost:8086', 'token', 'org', 'bucket', self.spool, batch_size=2, flush_interval=3600)
+        self.writer.write_api = FakeWriteApi()
+
+    def tearDown(self):
+        self.writer.closed.set()
+        self.writer.client.close()
+        self.spool_dir.cleanup()
+
+    def test_batches_by_size(self):
+        self.writer.write(['m v=1 1'])
+        self.assertEqual(self.writer.write_api.written, [])
+        self.writer.write(['m v=2 2'])
+        self.assertEqual(self.writer.write_api.written, ['m v=1 1', 'm v=2 2'])
+
+    def test_failed_batches_are_spooled_and_drained(self):
+        self.writer.write_api.fail = True
+        self.writer.write(['m v=1 1', 'm v=2 2'])
+        self.assertFalse(self.spool.is_empty())
+        self.assertEqual(self.writer.backoff, 1.0)
+
+        self.writer.write_api.fail = False
+        self.writer.next_attempt = 0.0
+        self.writer.write(['m v=3 3', 'm v=4 4'])
+        self.assertTrue(self.spool.is_empty())
+        self.assertEqual(sorted(self.writer.write_api.written), ['m v=1 1', 'm v=2 2', 'm v=3 3', 'm v=4 4'])
+
+    def test_spool_is_bounded(self):
+        for i in range(100):
+            self.spool.append([f'measurement value={i} {i}'])
+        self.assertLessEqual(self.spool.size(), 1000 + 100)
+        self.assertNotIn('measurement value=0 0', (self.spool.segments()[0]).read_text())
+
+    def test_flushes_without_writes(self):
+        writer = InfluxWriter('http://localhost:8086', 'token', 'org', 'bucket', self.spool, batch_size=10, flush_interval=0.1)
+        writer.write_api = FakeWriteApi()
+        try:
+            writer.write(['m v=1 1'])
+            self.assertEqual(writer.write_api.written, [])
+            time.sleep(0.3)
+            self.assertEqual(writer.write_api.written, ['m v=1 1'])
+        finally:
+            writer.close()
+
+    def test_stray_files_in_spool(self):
+        Path(self.spool_dir.name, 'backup.lp').write_text('m v=0 0\n')
+        self.spool.append(['m v=1 1'])
+        reopened = Spool(self.spool_dir.name)
+        self.assertEqual([segment.name for segment in reopened.segments()], ['000000000000.lp'])
+        self.assertEqual(reopened.next_seq, 1)
+
+    def test_spool_survives_restart(self):
+        self.spool.append(['m v=1 1'])
+        self.writer.close()
+        reopened = Spool(self.spool_dir.name)
+        sent = []
+        self.assertTrue(reopened.drain(lambda lines: sent.extend(lines) or True, batch_size=10))
+        self.assertEqual(sent, ['m v=1 1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
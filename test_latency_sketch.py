@@ -0,0 +1,45 @@
+#!/bin/env python3
+
+import random
+import unittest
+from latency_sketch import LatencySketch, LatencySketches
+
+
+class LatencySketchTestCase(unittest.TestCase):
+
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(1)
+        values = sorted(rng.lognormvariate(-2, 1) for _ in range(10000))
+        sketch = LatencySketch(relative_accuracy=0.01)
+        for value in values:
+            sketch.add(value)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), exact, delta=0.011 * exact)
+        self.assertEqual(sketch.max, values[-1])
+
+    def test_merge_equals_single_sketch(self):
+        a, b, both = LatencySketch(), LatencySketch(), LatencySketch()
+        for i in range(1, 200):
+            (a if i % 2 else b).add(i / 1000)
+            both.add(i / 1000)
+        a.merge(b)
+        self.assertEqual(a.summary(), both.summary())
+
+    def test_empty_sketch(self):
+        self.assertIsNone(LatencySketch().quantile(0.5))
+
+    def test_periodic_flush_per_endpoint_and_chain(self):
+        sketches = LatencySketches(period=60)
+        sketches.add('Polkadot', 'wss://a', 0.1, now=0)
+        sketches.add('Polkadot', 'wss://b', 0.3, now=1)
+        self.assertFalse(sketches.due(now=59))
+        self.assertTrue(sketches.due(now=60))
+        summaries = {(chain, url): summary for chain, url, summary in sketches.flush(now=60)}
+        self.assertEqual(summaries[('Polkadot', None)]['count'], 2)
+        self.assertAlmostEqual(summaries[('Polkadot', None)]['max'], 0.3)
+        self.assertEqual(sketches.flush(now=120), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
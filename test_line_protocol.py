@@ -0,0 +1,80 @@
+#!/bin/env python3
+
+from datetime import datetime, timezone
+import unittest
+import influxdb_utils as iu
+from line_protocol import LineProtocolSerializer, format_field_value, parse
+
+
+def parse_line(line: str) -> tuple:
+    """Split a line without escaped spaces into series, fields and timestamp, field order and float format don't matter."""
+    series, field_set, timestamp = line.split(' ')
+    fields = {}
+    for field in field_set.split(','):
+        key, value = field.split('=')
+        fields[key] = value if value.endswith('i') else float(value)
+    return series, fields, timestamp
+
+
+class LineProtocolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.serializer = LineProtocolSerializer()
+        self.timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.timestamp_ns = int(self.timestamp.timestamp()) * 10**9
+
+    def test_same_as_point(self):
+        data = {'latest_block_height': 19000000, 'time_total': 0.123}
+        for chain, url in (('Ethereum mainnet', 'https://cloudflare-eth.com'), ('a,b=c', 'wss://rpc.polkadot.io/ws?x=1 2')):
+            point = iu.block_height_request_point(chain, url, data, 2, self.timestamp)
+            lines = []
+            self.serializer.block_height_request(lines, chain, url, data, 2, self.timestamp_ns)
+            self.assertEqual(lines, [point.to_line_protocol()])
+
+    def test_same_as_point_with_progress(self):
+        data = {'latest_block_height': 100, 'time_total': 0.5}
+        progress = {'block_rate': 0.5, 'lag_seconds': 4.0}
+        point = iu.block_height_request_point('Polkadot', 'wss://rpc.polkadot.io', data, 2, self.timestamp, progress)
+        lines = []
+        self.serializer.block_height_request(lines, 'Polkadot', 'wss://rpc.polkadot.io', data, 2, self.timestamp_ns, progress)
+        self.assertEqual(parse_line(lines[0]), parse_line(point.to_line_protocol()))
+
+    def test_parse(self):
+        lines = []
+        tags = {'chain': 'a,b=c d', 'node': 'wss://x\ny'}
+        fields = {'f 1': 1, 's': 'q"u\\o=,te x', 'b': True, 'x': 1.5}
+        self.serializer.write(lines, 'm e,a', tags, fields, 123)
+        self.assertEqual(parse(lines[0]), ('m e,a', tags, fields, 123))
+
+    def test_parse_without_timestamp(self):
+        self.assertEqual(parse('m,t=a\\ b f="x y",g=2i\n'), ('m', {'t': 'a b'}, {'f': 'x y', 'g': 2}, None))
+        with self.assertRaises(ValueError):
+            parse('m')
+
+    def test_endpoint_tags(self):
+        lines = []
+        self.serializer.block_height_request(lines, 'Polkadot', 'wss://RPC.Polkadot.io:443/ws', {'latest_block_height': 1}, 0, 1)
+        self.assertTrue(lines[0].startswith('block_height_request,chain=Polkadot,host=rpc.polkadot.io:443,provider=polkadot.io,'
+                                            'scheme=wss,url=wss://RPC.Polkadot.io:443/ws '))
+
+    def test_tag_set_is_cached(self):
+        lines = []
+        for height in range(3):
+            self.serializer.block_height_request(lines, 'Polkadot', 'wss://rpc.polkadot.io', {'latest_block_height': height}, 0, 1)
+        self.assertEqual(len(self.serializer.series), 1)
+        self.assertEqual(len(lines), 3)
+
+    def test_non_finite_and_missing_fields_are_skipped(self):
+        lines = []
+        self.serializer.write(lines, 'm', {'t': 'v'}, {'a': float('nan'), 'b': None, 'c': 1.5}, 1)
+        self.serializer.write(lines, 'm', {'t': 'v'}, {'a': float('inf')}, 2)
+        self.assertEqual(lines, ['m,t=v c=1.5 1'])
+
+    def test_field_values(self):
+        self.assertEqual(format_field_value(True), 'true')
+        self.assertEqual(format_field_value(3), '3i')
+        self.assertEqual(format_field_value('say "hi"'), r'"say \"hi\""')
+
+
+if __name__ == '__main__':
+    unittest.main()
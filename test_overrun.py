@@ -0,0 +1,59 @@
+#!/bin/env python3
+
+import unittest
+from overrun import OverrunGuard
+
+ENDPOINTS = [('Chain', f'https://rpc{i}.example.com', 'ethereum') for i in range(8)]
+
+
+class OverrunGuardTestCase(unittest.TestCase):
+
+    def test_skip_endpoints_in_flight(self):
+        guard = OverrunGuard()
+        admitted, skipped = guard.admit(ENDPOINTS[:2])
+        self.assertEqual(admitted, ENDPOINTS[:2])
+        admitted, skipped = guard.admit(ENDPOINTS[1:3])
+        self.assertEqual(admitted, [ENDPOINTS[2]])
+        self.assertEqual(skipped, [(ENDPOINTS[1], 'in_flight')])
+        self.assertTrue(guard.overrunning)
+        self.assertFalse(guard.finish(ENDPOINTS[:3], duration=1.0, interval=10.0))
+        self.assertFalse(guard.overrunning)
+        self.assertEqual(guard.admit(ENDPOINTS[1:2]), ([ENDPOINTS[1]], []))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            OverrunGuard(policy='panic')
+
+    def test_shrink_fan_out(self):
+        guard = OverrunGuard(policy='shrink', max_in_flight=100)
+        guard.admit(ENDPOINTS)
+        self.assertTrue(guard.finish(ENDPOINTS, duration=11.0, interval=10.0))
+        self.assertEqual(guard.limit, 4)
+        admitted, skipped = guard.admit(ENDPOINTS)
+        self.assertEqual(admitted, ENDPOINTS[:4])
+        self.assertEqual([reason for _, reason in skipped], ['fan_out'] * 4)
+        # Grows back after batches that finished in time
+        guard.finish(admitted, duration=1.0, interval=10.0)
+        self.assertEqual(guard.limit, 5)
+
+    def test_deprioritize_circuit_open(self):
+        guard = OverrunGuard(policy='deprioritize', failure_threshold=2)
+        for _ in range(2):
+            guard.record(ENDPOINTS[:2], [False, True])
+        self.assertTrue(guard.circuit_open(ENDPOINTS[0][1]))
+        self.assertFalse(guard.circuit_open(ENDPOINTS[1][1]))
+
+        # Circuit-open endpoints are still probed while the poller keeps up
+        admitted, _ = guard.admit(ENDPOINTS[:2])
+        self.assertEqual(admitted, ENDPOINTS[:2])
+        guard.finish(admitted, duration=11.0, interval=10.0)
+        admitted, skipped = guard.admit(ENDPOINTS[:2])
+        self.assertEqual(admitted, [ENDPOINTS[1]])
+        self.assertEqual(skipped, [(ENDPOINTS[0], 'circuit_open')])
+
+        guard.record(ENDPOINTS[:1], [True])
+        self.assertFalse(guard.circuit_open(ENDPOINTS[0][1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/bin/env python3
+
+import unittest
+from urllib.request import urlopen
+from urllib.error import HTTPError
+from line_protocol import LineProtocolSerializer
+from poller_metrics import PollerMetrics
+
+
+class PollerMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = PollerMetrics()
+        self.metrics.inc('probes_total', 3, result='healthy')
+        self.metrics.inc('probes_total', result='failed')
+        self.metrics.inc('probes_total', 2, result='healthy')
+        self.metrics.add('in_flight_probes', 4)
+        self.metrics.add('in_flight_probes', -1)
+        self.metrics.observe('stage_seconds', 0.5, stage='probe')
+        self.metrics.observe('stage_seconds', 1.5, stage='probe')
+
+    def test_render_prometheus_text(self):
+        text = self.metrics.render()
+        self.assertIn('# TYPE poller_probes_total counter\n', text)
+        self.assertIn('poller_probes_total{result="healthy"} 5\n', text)
+        self.assertIn('poller_probes_total{result="failed"} 1\n', text)
+        self.assertIn('# TYPE poller_in_flight_probes gauge\npoller_in_flight_probes 3\n', text)
+        self.assertIn('# TYPE poller_stage_seconds summary\n', text)
+        self.assertIn('poller_stage_seconds_sum{stage="probe"} 2.0\n', text)
+        self.assertIn('poller_stage_seconds_count{stage="probe"} 2\n', text)
+        self.assertIn('poller_stage_seconds_max{stage="probe"} 1.5\n', text)
+
+    def test_timer(self):
+        with self.metrics.timer('compute'):
+            pass
+        self.assertEqual(self.metrics.timers[('stage_seconds', (('stage', 'compute'),))][1], 1)
+
+    def test_lines(self):
+        lines = self.metrics.lines(LineProtocolSerializer(), 1)
+        self.assertIn('poller_metrics,metric=probes_total,result=healthy value=5.0 1', lines)
+        self.assertIn('poller_metrics,metric=stage_seconds,stage=probe sum=2.0,count=2i,max=1.5 1', lines)
+
+    def test_serve(self):
+        server = self.metrics.serve(0)
+        try:
+            port = server.server_address[1]
+            with urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+                self.assertEqual(response.read().decode('utf-8'), self.metrics.render())
+            with self.assertRaises(HTTPError):
+                urlopen(f'http://127.0.0.1:{port}/other')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
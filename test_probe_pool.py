@@ -0,0 +1,107 @@
+#!/bin/env python3
+
+import asyncio
+import os
+import signal
+import time
+import unittest
+from probe_pool import ProbePool, compact_result, expand_result
+
+
+async def fake_fetch_results(all_url_api_tuples: list) -> list:
+    """Answers every endpoint with the number at the end of its URL as height, after 0.2 s."""
+    await asyncio.sleep(0.2)
+    results = []
+    for _, url, _ in all_url_api_tuples:
+        if url.endswith('/error'):
+            results.append(ValueError('probe failed'))
+        else:
+            results.append({'latest_block_height': int(url.rsplit('/', 1)[1]), 'time_total': 0.1, 'http_code': 200, 'exit_code': 0})
+    return results
+
+
+async def slow_fetch_results(all_url_api_tuples: list) -> list:
+    await asyncio.sleep(10)
+    return [None] * len(all_url_api_tuples)
+
+
+def endpoints(n: int) -> list:
+    return [('Chain', f'https://rpc.example.com/{i}', 'ethereum') for i in range(n)]
+
+
+class ProbePoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ProbePool(workers=3, min_chunk_size=4, probe=fake_fetch_results)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_results_in_input_order(self):
+        # 3 chunks of interleaved endpoints, put back in place with results[i::n_chunks]
+        results = asyncio.run(self.pool.fetch_results(endpoints(14)))
+        self.assertEqual([result['latest_block_height'] for result in results], list(range(14)))
+
+    def test_failed_probe(self):
+        due = endpoints(2) + [('Chain', 'https://rpc.example.com/error', 'ethereum')]
+        results = asyncio.run(self.pool.fetch_results(due))
+        self.assertEqual(results[1]['latest_block_height'], 1)
+        self.assertIsNone(results[2])
+
+    def test_small_batches_run_concurrently(self):
+        async def ticks():
+            # More single-chunk batches than workers, like the due endpoints of consecutive scheduler ticks
+            return await asyncio.gather(*(self.pool.fetch_results(endpoints(2)) for _ in range(9)))
+
+        asyncio.run(self.pool.fetch_results(endpoints(1)))  # Wait for the workers to start
+        start = time.monotonic()
+        batches = asyncio.run(ticks())
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual([[r['latest_block_height'] for r in batch] for batch in batches], [[0, 1]] * 9)
+
+
+class DeadWorkerTestCase(unittest.TestCase):
+
+    def test_killed_worker_is_restarted(self):
+        pool = ProbePool(workers=1, probe=slow_fetch_results, check_interval=0.1)
+        try:
+            async def kill_mid_chunk():
+                probing = asyncio.create_task(pool.fetch_results(endpoints(3)))
+                await asyncio.sleep(0.3)
+                os.kill(pool.processes[0].pid, signal.SIGKILL)
+                return await asyncio.wait_for(probing, 2)
+
+            dead = pool.processes[0]
+            with self.assertLogs('probe_pool', level='ERROR'):
+                self.assertEqual(asyncio.run(kill_mid_chunk()), [None] * 3)
+            self.assertIsNot(pool.processes[0], dead)
+            self.assertTrue(pool.processes[0].is_alive())
+            self.assertEqual(pool.pending, {})
+        finally:
+            pool.close()
+
+    def test_unanswered_chunk_times_out(self):
+        pool = ProbePool(workers=1, probe=slow_fetch_results, timeout=0.3)
+        try:
+            with self.assertLogs('probe_pool', level='ERROR'):
+                self.assertEqual(asyncio.run(pool.fetch_results(endpoints(2))), [None, None])
+            self.assertEqual(pool.in_flight, [0])
+        finally:
+            pool.close()
+
+
+class CompactResultTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        result = {'latest_block_height': 123, 'time_total': 0.25, 'http_code': 200, 'exit_code': 0}
+        self.assertEqual(expand_result(compact_result(result)), result)
+        partial = {'latest_block_height': None, 'time_total': None, 'http_code': None, 'exit_code': None}
+        self.assertEqual(expand_result(compact_result({})), partial)
+
+    def test_exception(self):
+        self.assertIsNone(compact_result(ValueError('probe failed')))
+        self.assertIsNone(expand_result(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
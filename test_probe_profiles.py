@@ -0,0 +1,35 @@
+#!/bin/env python3
+
+from pathlib import Path
+import unittest
+from probe_profiles import ProbeProfiles, load_probe_profiles, resolve_params
+
+
+class ProbeProfilesTestCase(unittest.TestCase):
+
+    def test_resolve_head_tokens(self):
+        params = [{'fromBlock': '$head-101:hex', 'toBlock': '$head:hex'}, False]
+        self.assertEqual(resolve_params(params, 1000), [{'fromBlock': hex(899), 'toBlock': hex(1000)}, False])
+        self.assertEqual(resolve_params('/blocks/by_height/$head-10?with_transactions=true', 100), '/blocks/by_height/90?with_transactions=true')
+
+    def test_resolve_never_below_genesis(self):
+        self.assertEqual(resolve_params('$head-100000', 5), '0')
+
+    def test_resolve_block_hash(self):
+        self.assertEqual(resolve_params(['0x26aa', '$block_hash'], 10, '0xabc'), ['0x26aa', '0xabc'])
+
+    def test_due_respects_interval_and_heads(self):
+        profiles = ProbeProfiles({'ethereum': [{'name': 'p', 'method': 'eth_chainId', 'interval': 60}]})
+        endpoints = [('Ethereum mainnet', 'https://a', 'ethereum'), ('Ethereum mainnet', 'https://b', 'ethereum')]
+        due = profiles.due(endpoints, {'https://a': 1}, now=0)
+        self.assertEqual([endpoint[1] for endpoint, _ in due], ['https://a'])
+        self.assertEqual(profiles.due(endpoints, {'https://a': 1}, now=30), [])
+        self.assertEqual(len(profiles.due(endpoints, {'https://a': 1}, now=60)), 1)
+
+    def test_shipped_profiles_are_valid(self):
+        profiles = load_probe_profiles(Path(__file__).resolve().parent / 'probe_profiles.json')
+        self.assertEqual(set(profiles.keys()), {'ethereum', 'substrate', 'aptos'})
+
+
+if __name__ == '__main__':
+    unittest.main()
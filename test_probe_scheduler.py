@@ -0,0 +1,51 @@
+#!/bin/env python3
+
+import unittest
+from probe_scheduler import ProbeScheduler
+
+
+class ProbeSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = ProbeScheduler(default_interval=10, min_interval=1, max_interval=60, jitter=0.0)
+        self.endpoints = [('Ethereum mainnet', f'https://eth-{i}', 'ethereum') for i in range(20)]
+        self.scheduler.update_endpoints(self.endpoints, now=0)
+
+    def test_start_times_are_spread(self):
+        due_times = sorted(entry[0] for entry in self.scheduler.heap)
+        self.assertGreater(due_times[-1] - due_times[0], 1)
+        self.assertLessEqual(due_times[-1], 10)
+
+    def test_every_endpoint_due_once_per_interval(self):
+        self.assertEqual(len(self.scheduler.pop_due(now=10)), 20)
+        self.assertEqual(self.scheduler.pop_due(now=10), [])
+        self.assertEqual(len(self.scheduler.pop_due(now=20)), 20)
+
+    def test_no_drift_and_missed_slots_skipped(self):
+        self.scheduler.pop_due(now=10)
+        nominal = dict(self.scheduler.nominal)
+        self.assertEqual(len(self.scheduler.pop_due(now=55)), 20)
+        for url, due_time in self.scheduler.nominal.items():
+            intervals = (due_time - nominal[url]) / 10
+            self.assertAlmostEqual(intervals, round(intervals))
+            self.assertGreater(due_time, 55)
+
+    def test_interval_follows_block_time(self):
+        for height, now in ((100, 0.0), (105, 2.0), (110, 4.0)):
+            self.scheduler.observe_height('Fast chain', height, now)
+        self.assertAlmostEqual(self.scheduler.interval('Fast chain'), 1)  # 0.4 s block time, clamped to min_interval
+        self.scheduler.observe_height('Slow chain', 1, 0.0)
+        self.scheduler.observe_height('Slow chain', 2, 12.0)
+        self.assertAlmostEqual(self.scheduler.interval('Slow chain'), 12)
+        self.assertEqual(self.scheduler.interval('Unknown chain'), 10)
+
+    def test_update_endpoints(self):
+        added, removed = self.scheduler.update_endpoints(self.endpoints[1:] + [('Polkadot', 'wss://rpc.polkadot.io', 'substrate')], now=0)
+        self.assertEqual(added, [('Polkadot', 'wss://rpc.polkadot.io', 'substrate')])
+        self.assertEqual(removed, [self.endpoints[0]])
+        self.assertNotIn(self.endpoints[0], self.scheduler.pop_due(now=10))
+        self.assertEqual(len(self.scheduler), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
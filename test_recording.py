@@ -0,0 +1,81 @@
+#!/bin/env python3
+
+import asyncio
+from pathlib import Path
+import tempfile
+import unittest
+from poller_metrics import PollerMetrics
+from probe_scheduler import ProbeScheduler
+from recording import Recorder, read_recording
+from sinks import Sink
+import update_influxdb
+
+ETH = ('Ethereum mainnet', 'https://cloudflare-eth.com', 'ethereum')
+DOT = ('Polkadot', 'wss://rpc.polkadot.io', 'substrate')
+
+
+class ListSink(Sink):
+    def __init__(self):
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+
+class RecordingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name) / 'recording.jsonl'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def record(self, batches: int) -> None:
+        recorder = Recorder(self.path)
+        for i in range(batches):
+            results = [{'latest_block_height': 100 + i, 'time_total': 0.1 + i / 100, 'http_code': 200, 'exit_code': 0},
+                       {'latest_block_height': None, 'time_total': None, 'http_code': None, 'exit_code': None, 'error': 'timeout'}
+                       if i % 3 else ValueError('connection refused')]
+            recorder.record(1000.0 + i, 0.2, [ETH, DOT], results)
+        recorder.close()
+
+    def test_round_trip(self):
+        self.record(3)
+        batches = list(read_recording(self.path))
+        self.assertEqual(len(batches), 3)
+        recorded_at, duration, due, all_results = batches[1]
+        self.assertEqual((recorded_at, duration, due), (1001.0, 0.2, [ETH, DOT]))
+        self.assertEqual(all_results, [{'latest_block_height': 101, 'time_total': 0.11, 'http_code': 200, 'exit_code': 0},
+                                       {'latest_block_height': None, 'time_total': None, 'http_code': None, 'exit_code': None,
+                                        'error': 'timeout'}])
+        self.assertIsInstance(batches[0][3][1], Exception)
+        self.assertEqual(str(batches[0][3][1]), 'connection refused')
+
+    def test_endpoints_written_once(self):
+        self.record(3)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(sum(line.startswith('["E"') for line in f), 2)
+
+    def test_truncated_batch(self):
+        self.record(2)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('["B",1002.0,0.2,[[0,10')
+        self.assertEqual(len(list(read_recording(self.path))), 2)
+
+    def test_replay_is_deterministic(self):
+        self.record(30)
+        outputs = []
+        for speed in (0, 1000):
+            sink = ListSink()
+            poller = update_influxdb.Poller({'POLL_INTERVAL': 5, 'LATENCY_SUMMARY_PERIOD': 10}, ProbeScheduler(), sink, None, None, PollerMetrics())
+            with self.assertLogs(level='INFO'):
+                asyncio.run(poller.replay(read_recording(self.path), speed))
+            outputs.append([record if isinstance(record, str) else record.to_line_protocol() for record in sink.records])
+        self.assertEqual(outputs[0], outputs[1])
+        measurements = {line.split(',')[0] for line in outputs[0]}
+        self.assertEqual(measurements, {'block_height_request', 'chain_stats', 'latency_summary'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/bin/env python3
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from registry_cache import RegistryCache
+
+
+class FakeResponse:
+
+    def __init__(self, status_code, body=None, etag=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = {'ETag': etag} if etag else {}
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(f'status {self.status_code}')
+
+
+class FakeRegistry:
+    """Serves /all/chains and /all/rpc_urls with ETags, like app.py."""
+
+    def __init__(self):
+        self.tables = {
+            '/all/chains': [{'name': 'Polkadot', 'api_class': 'substrate'}],
+            '/all/rpc_urls': [{'url': 'wss://rpc.polkadot.io', 'chain_name': 'polkadot'}],
+        }
+        self.down = False
+        self.requests = []
+
+    def get(self, url, headers, timeout):
+        resource = url[len('http://registry'):]
+        self.requests.append((resource, headers))
+        if self.down:
+            return FakeResponse(503)
+        etag = str(hash(json.dumps(self.tables[resource])))
+        if headers.get('If-None-Match') == etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.tables[resource], etag)
+
+
+class RegistryCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.registry = FakeRegistry()
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def new_cache(self):
+        cache = RegistryCache('http://registry', Path(self.state_dir.name), max_age=-1)
+        cache.session = self.registry
+        return cache
+
+    def test_load_joins_chains_and_urls(self):
+        self.assertEqual(self.new_cache().load(), [('Polkadot', 'wss://rpc.polkadot.io', 'substrate')])
+
+    def test_unchanged_registry_costs_a_304(self):
+        cache = self.new_cache()
+        cache.load()
+        mtime = cache.path.stat().st_mtime_ns
+        self.assertFalse(cache.refresh())
+        self.assertEqual(cache.path.stat().st_mtime_ns, mtime)
+        self.assertIn('If-None-Match', self.registry.requests[-1][1])
+
+    def test_changed_resource_is_merged_with_cached_one(self):
+        cache = self.new_cache()
+        cache.load()
+        self.registry.tables['/all/rpc_urls'].append({'url': 'https://rpc.polkadot.io', 'chain_name': 'Polkadot'})
+        self.assertTrue(cache.refresh())
+        self.assertEqual(len(self.new_cache().endpoints), 2)
+
+    def test_failed_refresh_keeps_last_good_endpoints(self):
+        self.new_cache().load()
+        self.registry.down = True
+        self.assertEqual(len(self.new_cache().load()), 1)
+        Path(self.state_dir.name, 'cache.json').unlink()
+        self.assertEqual(self.new_cache().load(), [])
+
+    def test_corrupt_cache_is_ignored(self):
+        cache = self.new_cache()
+        cache.load()
+        data = json.loads(cache.path.read_text())
+        data['resources']['/all/chains']['body'] = []
+        cache.path.write_text(json.dumps(data))
+        self.assertEqual(self.new_cache().endpoints, [])
+
+    def test_legacy_list_cache_is_ignored(self):
+        path = Path(self.state_dir.name, 'cache.json')
+        path.write_text(json.dumps([[['Polkadot', 'wss://x', 'substrate']], 1700000000.0]))
+        cache = self.new_cache()
+        self.assertEqual(cache.endpoints, [])
+        self.assertEqual(cache.load(), [('Polkadot', 'wss://rpc.polkadot.io', 'substrate')])
+        self.assertEqual(json.loads(path.read_text())['schema_version'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
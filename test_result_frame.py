@@ -0,0 +1,54 @@
+#!/bin/env python3
+
+import unittest
+import numpy as np
+from result_frame import ResultFrame, HEALTHY, FAILED, grouped_percentiles
+
+
+class ResultFrameTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.frame = ResultFrame(capacity=2)
+        self.endpoints = [('Ethereum mainnet', 'https://eth-a', 'ethereum'),
+                          ('Ethereum mainnet', 'https://eth-b', 'ethereum'),
+                          ('Ethereum mainnet', 'https://eth-c', 'ethereum'),
+                          ('Polkadot', 'wss://rpc.polkadot.io', 'substrate')]
+        self.rows = self.frame.rows(self.endpoints)
+        self.frame.update(self.rows,
+                          np.array([100, 98, -1, 5000]),
+                          np.array([0.1, 0.3, np.nan, 0.2]),
+                          np.array([HEALTHY, HEALTHY, FAILED, HEALTHY], dtype=np.int8))
+
+    def test_rows_are_stable(self):
+        np.testing.assert_array_equal(self.frame.rows(self.endpoints[::-1]), self.rows[::-1])
+        self.assertEqual(len(self.frame), 4)
+
+    def test_block_height_diffs(self):
+        np.testing.assert_array_equal(self.frame.block_height_diffs(self.rows[[0, 1, 3]]), [0, 2, 0])
+
+    def test_chain_stats(self):
+        stats = self.frame.chain_stats()
+        self.assertEqual(stats['chain'], ['Ethereum mainnet', 'Polkadot'])
+        np.testing.assert_array_equal(stats['max_block_height'], [100, 5000])
+        np.testing.assert_array_equal(stats['healthy_endpoints'], [2, 1])
+        np.testing.assert_array_equal(stats['endpoints'], [3, 1])
+        np.testing.assert_allclose(stats['latency_p99'], [0.3, 0.2])
+        np.testing.assert_array_equal(stats['median_block_height_diff'], [0, 0])
+
+    def test_removed_rows_are_reused(self):
+        self.frame.remove([self.endpoints[0]])
+        np.testing.assert_array_equal(self.frame.chain_max_height(), [98, 5000])
+        row = self.frame.rows([('Kusama', 'wss://kusama-rpc.polkadot.io', 'substrate')])
+        self.assertEqual(row[0], self.rows[0])
+        self.assertEqual(self.frame.chain_stats()['endpoints'].tolist(), [2, 1, 1])
+
+    def test_grouped_percentiles(self):
+        groups = np.array([0, 1, 0, 0, 1])
+        values = np.array([3.0, 10.0, 1.0, 2.0, 20.0])
+        result = grouped_percentiles(groups, values, 3, [50, 100])
+        np.testing.assert_array_equal(result[:, :2], [[2.0, 10.0], [3.0, 20.0]])
+        self.assertTrue(np.isnan(result[:, 2]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+#!/bin/env python3
+
+from pathlib import Path
+import unittest
+from setup_downsampling import DEFAULT_TIERS, task_flux, tier_bucket
+
+
+class SetupDownsamplingTestCase(unittest.TestCase):
+
+    def test_task_flux(self):
+        flux = task_flux('block_heights', {'every': '1h', 'retention_days': 730})
+        self.assertIn('option task = {name: "downsample_block_heights_1h", every: 1h, offset: 30s}', flux)
+        self.assertIn('from(bucket: "block_heights")', flux)
+        self.assertIn('range(start: date.truncate(t: -2h, unit: 1h), stop: date.truncate(t: now(), unit: 1h))', flux)
+        self.assertEqual(flux.count('to(bucket: "block_heights_1h")'), 4)
+        for field in ('block_height_diff_max', 'request_time_total_max', 'request_time_total_p99', 'block_height_last'):
+            self.assertIn(f'value: "{field}"', flux)
+        self.assertNotIn('$', flux.split('\n', 2)[2])
+
+    def test_default_tiers_match_dashboard(self):
+        with open(Path(__file__).parent / 'grafana' / 'block-height-monitoring-dashboard.json', encoding='utf-8') as f:
+            dashboard = f.read()
+        for tier in DEFAULT_TIERS:
+            self.assertIn(f'\\"{tier_bucket("", tier)}\\"', dashboard)
+
+
+if __name__ == '__main__':
+    unittest.main()
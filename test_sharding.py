@@ -0,0 +1,90 @@
+#!/bin/env python3
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from sharding import Shard, SqliteMembership
+
+
+class ShardingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.endpoints = [(f'chain-{i}', f'https://rpc-{i}-{j}.io', 'ethereum') for i in range(200) for j in range(3)]
+
+    def test_static_shards_are_disjoint_and_complete(self):
+        slices = [Shard(i, 4).filter(self.endpoints) for i in range(4)]
+        self.assertEqual(sorted(sum(slices, [])), sorted(self.endpoints))
+        for endpoint_slice in slices:
+            self.assertGreater(len(endpoint_slice), 0)
+
+    def test_chain_stays_on_one_shard(self):
+        owners = {}
+        for i in range(3):
+            for chain, _, _ in Shard(i, 3).filter(self.endpoints):
+                owners.setdefault(chain, set()).add(i)
+        self.assertTrue(all(len(shards) == 1 for shards in owners.values()))
+
+    def test_adding_a_shard_moves_few_chains(self):
+        before = {e[0] for e in Shard(0, 4).filter(self.endpoints)}
+        after = {e[0] for e in Shard(0, 5).filter(self.endpoints)}
+        self.assertTrue(after.issubset(before))
+
+    def test_invalid_shard_id(self):
+        with self.assertRaises(ValueError):
+            Shard(3, 3)
+
+    def test_lease_membership(self):
+        db_fd, db_file = tempfile.mkstemp(suffix='.db')
+        try:
+            a = SqliteMembership(db_file, 'a')
+            b = SqliteMembership(db_file, 'b')
+            shard_a = Shard(membership=a)
+            shard_b = Shard(membership=b)
+            shard_a.refresh()
+            shard_a.refresh()
+            self.assertEqual(shard_a.filter(self.endpoints), self.endpoints)
+
+            # b only probes its slice once a has seen it join, while a drops that slice at its next heartbeat
+            shard_b.refresh()
+            self.assertEqual(shard_b.filter(self.endpoints), [])
+            shard_a.refresh()
+            self.assertEqual(shard_a.members, ['a', 'b'])
+            shard_b.refresh()
+            self.assertEqual(sorted(shard_a.filter(self.endpoints) + shard_b.filter(self.endpoints)), sorted(self.endpoints))
+            self.assertGreater(len(shard_b.filter(self.endpoints)), 0)
+
+            b.leave()
+            shard_a.refresh()
+            self.assertLess(len(shard_a.filter(self.endpoints)), len(self.endpoints))
+            shard_a.refresh()
+            self.assertEqual(shard_a.filter(self.endpoints), self.endpoints)
+        finally:
+            os.close(db_fd)
+            os.unlink(db_file)
+
+    def test_failed_heartbeat_owns_nothing(self):
+        db_fd, db_file = tempfile.mkstemp(suffix='.db')
+        try:
+            membership = SqliteMembership(db_file, 'a')
+            shard = Shard(membership=membership)
+            shard.refresh()
+            shard.refresh()
+            with mock.patch.object(membership, 'heartbeat', side_effect=sqlite3.OperationalError('database is locked')):
+                with self.assertRaises(sqlite3.OperationalError):
+                    shard.refresh()
+            self.assertEqual(shard.filter(self.endpoints), [])
+            shard.refresh()
+            self.assertEqual(shard.filter(self.endpoints), [])
+            shard.refresh()
+            self.assertEqual(shard.filter(self.endpoints), self.endpoints)
+        finally:
+            os.close(db_fd)
+            os.unlink(db_file)
+
+    def test_single_static_shard(self):
+        self.assertEqual(Shard(0, 1).filter(self.endpoints), self.endpoints)
+
+if __name__ == '__main__':
+    unittest.main()
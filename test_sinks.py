@@ -0,0 +1,82 @@
+#!/bin/env python3
+
+from datetime import datetime, timezone
+import io
+import json
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+import influxdb_utils as iu
+from sinks import BufferedSink, FanOutSink, JsonlSink, NullSink, SqliteSink, StdoutSink, create_sink
+
+LINE = 'block_height_request,chain=Polkadot,url=wss://rpc.polkadot.io block_height=100i,block_height_diff=2i,request_time_total=0.5 1704067200000000000'
+
+
+class SinksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp_dir.name)
+        self.point = iu.chain_stats_point('Polkadot', {'max_block_height': 100, 'median_block_height_diff': 0, 'latency_p50': 0.1,
+                                                       'latency_p99': 0.2, 'healthy_endpoints': 2, 'endpoints': 2},
+                                          datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_jsonl(self):
+        sink = JsonlSink(self.path / 'points.jsonl', buffer_size=10)
+        sink.write([LINE, self.point])
+        self.assertFalse((self.path / 'points.jsonl').exists())
+        sink.close()
+        with open(self.path / 'points.jsonl', encoding='utf-8') as f:
+            objects = [json.loads(line) for line in f]
+        self.assertEqual(objects[0], {'measurement': 'block_height_request', 'tags': {'chain': 'Polkadot', 'url': 'wss://rpc.polkadot.io'},
+                                      'fields': {'block_height': 100, 'block_height_diff': 2, 'request_time_total': 0.5},
+                                      'time': 1704067200000000000})
+        self.assertEqual(objects[1]['measurement'], 'chain_stats')
+        self.assertEqual(objects[1]['fields']['healthy_endpoints'], 2)
+
+    def test_sqlite(self):
+        sink = SqliteSink(self.path / 'points.db', buffer_size=2)
+        sink.write([LINE])
+        sink.close()
+        connection = sqlite3.connect(self.path / 'points.db')
+        rows = connection.execute('SELECT time, measurement, tags, field, value FROM points ORDER BY field').fetchall()
+        connection.close()
+        tags = '{"chain": "Polkadot", "url": "wss://rpc.polkadot.io"}'
+        self.assertEqual(rows, [(1704067200000000000, 'block_height_request', tags, 'block_height', 100),
+                                (1704067200000000000, 'block_height_request', tags, 'block_height_diff', 2),
+                                (1704067200000000000, 'block_height_request', tags, 'request_time_total', 0.5)])
+
+    def test_sink_interface(self):
+        class IncompleteSink(BufferedSink):
+            def store(self, items):
+                pass
+
+        with self.assertRaises(TypeError):
+            IncompleteSink()
+
+    def test_fan_out_survives_failing_sink(self):
+        class FailingSink(NullSink):
+            def write(self, records):
+                raise IOError('disk full')
+
+        stream = io.StringIO()
+        null = NullSink()
+        sink = FanOutSink([FailingSink(), null, StdoutSink(stream)])
+        with self.assertLogs('sinks', level='ERROR'):
+            sink.write([LINE, self.point])
+        self.assertEqual(null.count, 2)
+        self.assertEqual(stream.getvalue().splitlines(), [LINE, self.point.to_line_protocol()])
+
+    def test_create_sink(self):
+        self.assertIsInstance(create_sink({'type': 'null'}), NullSink)
+        self.assertIsInstance(create_sink({'type': 'jsonl', 'path': str(self.path / 'p.jsonl')}), JsonlSink)
+        with self.assertRaises(ValueError):
+            create_sink({'type': 'kafka'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/bin/env python3
+
+import asyncio
+import unittest
+from poller_metrics import PollerMetrics
+from probe_scheduler import ProbeScheduler
+from sharding import Shard
+from sinks import NullSink
+import update_influxdb
+
+ETH = ('Ethereum mainnet', 'https://cloudflare-eth.com', 'ethereum')
+DOT = ('Polkadot', 'wss://rpc.polkadot.io', 'substrate')
+KSM = ('Kusama', 'wss://kusama-rpc.polkadot.io', 'substrate')
+
+
+class FakeRegistry:
+    """Returns `endpoints` on every load, or raises while `down`."""
+
+    def __init__(self, endpoints: list):
+        self.endpoints = endpoints
+        self.down = False
+
+    def load(self) -> list:
+        if self.down:
+            raise ConnectionError('registry down')
+        return list(self.endpoints)
+
+
+class DiscoverTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.probed = []
+
+        async def fetch_results(due: list) -> list:
+            self.probed.extend(due)
+            return [{'latest_block_height': 100, 'time_total': 0.1, 'http_code': 200, 'exit_code': 0} for _ in due]
+
+        self.registry = FakeRegistry([ETH, DOT])
+        self.scheduler = ProbeScheduler(default_interval=0.02, min_interval=0.01, max_interval=0.05)
+        self.poller = update_influxdb.Poller({'POLL_INTERVAL': 0.05}, self.scheduler, NullSink(), None, fetch_results, PollerMetrics())
+        self.running = asyncio.create_task(self.poller.run(self.registry, Shard()))
+
+    async def asyncTearDown(self):
+        self.running.cancel()
+        await asyncio.gather(self.running, return_exceptions=True)
+        self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+
+    async def test_registry_changes_are_applied(self):
+        await asyncio.sleep(0.2)
+        self.assertEqual(set(self.scheduler.endpoints.values()), {ETH, DOT})
+        self.assertEqual({endpoint[1] for endpoint in self.probed}, {ETH[1], DOT[1]})
+        self.assertIn(DOT[1], self.poller.frame.rows_by_url)
+
+        with self.assertLogs(update_influxdb.logger, level='INFO'):
+            self.registry.endpoints = [ETH, KSM]
+            await asyncio.sleep(0.2)
+        self.assertEqual(set(self.scheduler.endpoints.values()), {ETH, KSM})
+        self.assertNotIn(DOT[1], self.poller.progress.endpoint_advances)
+        self.assertNotIn(DOT[1], self.poller.frame.rows_by_url)
+
+        # Once the removal is applied and in-flight probes are done, the removed endpoint isn't probed anymore
+        await asyncio.sleep(0.05)
+        self.probed.clear()
+        await asyncio.sleep(0.2)
+        self.assertEqual({endpoint[1] for endpoint in self.probed}, {ETH[1], KSM[1]})
+
+    async def test_failed_discovery_keeps_endpoints(self):
+        await asyncio.sleep(0.1)
+        with self.assertLogs(update_influxdb.logger, level='ERROR'):
+            self.registry.down = True
+            await asyncio.sleep(0.1)
+        self.assertEqual(set(self.scheduler.endpoints.values()), {ETH, DOT})
+        self.assertGreater(self.poller.metrics.counters[('discovery_failures_total', ())], 0)
+
+
+class SlowProfiles:
+    """Probe profiles that are always due and never finish, counting the probes in flight."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def due(self, due: list, heads: dict) -> list:
+        return [(endpoint, {'name': 'slow'}) for endpoint in due]
+
+    async def fetch_results(self, profiles_due: list, heads: dict) -> list:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self.in_flight -= 1
+
+
+class ProfilesTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_slow_profiles_are_bounded(self):
+        async def fetch_results(due: list) -> list:
+            return [{'latest_block_height': 100, 'time_total': 0.1, 'http_code': 200, 'exit_code': 0} for _ in due]
+
+        profiles = SlowProfiles()
+        config = {'POLL_INTERVAL': 0.05, 'PROFILE_CONCURRENCY': 2, 'STAGE_QUEUE_SIZE': 3}
+        scheduler = ProbeScheduler(default_interval=0.01, min_interval=0.01, max_interval=0.01)
+        poller = update_influxdb.Poller(config, scheduler, NullSink(), profiles, fetch_results, PollerMetrics())
+        running = asyncio.create_task(poller.run(FakeRegistry([ETH, DOT]), Shard()))
+        with self.assertLogs(update_influxdb.logger, level='WARNING'):
+            await asyncio.sleep(0.3)
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        self.assertEqual(asyncio.all_tasks(), {asyncio.current_task()})
+        self.assertEqual(profiles.max_in_flight, 2)
+        self.assertLessEqual(poller.profile_queue.qsize(), 3)
+        self.assertGreater(poller.metrics.counters[('dropped_profile_batches_total', ())], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
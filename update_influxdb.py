@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import asyncio
+from collections import Counter
 from datetime import datetime
 import json
 import logging
@@ -8,13 +9,28 @@ from color_logger import ColoredFormatter
 import sys
 from pathlib import Path
 from typing import Callable
-import requests
 import warnings
 import argparse
 import time
-from influxdb_client import InfluxDBClient
-from influxdb_client.client.write_api import SYNCHRONOUS
+import atexit
+import signal
 import influxdb_utils as iu
+from influx_writer import InfluxWriter, Spool
+from line_protocol import LineProtocolSerializer
+from sinks import FanOutSink, Sink, create_sink
+from emission import EmissionPolicy
+from chain_progress import ChainProgress
+from latency_sketch import LatencySketches
+from probe_scheduler import ProbeScheduler
+from poller_metrics import PollerMetrics
+from overrun import OverrunGuard
+from probe_pool import ProbePool
+from recording import Recorder, read_recording
+from registry_cache import RegistryCache
+from sharding import Shard, SqliteMembership
+import numpy as np
+from result_frame import ResultFrame, HEALTHY, FAILED
+import probe_profiles as pp
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
@@ -28,6 +44,14 @@ logger.addHandler(console_handler)
 def main():
     parser = argparse.ArgumentParser(description='Continuously update the InfluxDB specified in the config file')
     parser.add_argument('config_file', type=str, help="The file with the target database's config", default='config.json')
+    parser.add_argument('--shard_id', type=int, help='Only probe the chains of this shard, out of --shard_count shards', default=0)
+    parser.add_argument('--shard_count', type=int, help='The number of poller instances sharing the endpoints, default=1', default=1)
+    parser.add_argument('--lease_db', type=str, help='Share the endpoints with the other instances holding a lease in this SQLite file')
+    parser.add_argument('--instance_id', type=str, help='Name of this instance in the lease database, default=<hostname>-<pid>')
+    parser.add_argument('--record', type=str, help='Append the raw probe results to this file, to replay them later')
+    parser.add_argument('--replay', type=str, help="Don't probe, feed the probe results recorded in this file through the updater instead")
+    parser.add_argument('--replay_speed', type=float, help='Replay this many times faster than recorded, 0 for as fast as possible, default=10',
+                        default=10)
     args = parser.parse_args()
 
     if not (Path.cwd() / args.config_file).exists():
@@ -37,19 +61,17 @@ def main():
 
     # TODO: add validation of config through schema? rpc api and influxdb required, cache age and update interval optional
 
-    influxdb = {
-        'url': config['INFLUXDB_URL'],
-        'token': config['INFLUXDB_TOKEN'],
-        'org': config['INFLUXDB_ORG'],
-        'bucket': config['INFLUXDB_BUCKET']
-    }
-    cache_max_age = config.get('CACHE_MAX_AGE', 60)
     poll_interval = config.get('POLL_INTERVAL', 10)
+    probe_profiles = pp.ProbeProfiles(pp.load_probe_profiles(config['PROBE_PROFILES'])) if config.get('PROBE_PROFILES') else None
 
-    # Test connection to influx before attempting to start.
-    if not iu.test_influxdb_connection(influxdb['url'], influxdb['token'], influxdb['org']):
-        logger.error("Couldn't connect to influxdb at url %s\nExiting.", influxdb['url'])
-        sys.exit(1)
+    metrics = PollerMetrics()
+    if config.get('METRICS_PORT'):
+        metrics.serve(config['METRICS_PORT'], config.get('METRICS_HOST', '127.0.0.1'))
+
+    sink = create_sink_from_config(config, metrics)
+    # Flush or spool unwritten points on exit, SIGTERM is turned into a regular exit so atexit runs
+    atexit.register(sink.close)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     with warnings.catch_warnings(record=True) as warn:
         loop = asyncio.get_event_loop()
@@ -61,135 +83,396 @@ def main():
                 break
         warnings.simplefilter("ignore")
 
-    while True:
-        # Get all RPC endpoints from all chains.
-        # Place them in a list with their corresponding class.
-        # This is all the endpoints we are to query and update the influxdb with.
-        # all_url_api_tuples = get_all_endpoints_from_api(rpc_flask_api)
-        all_endpoints = load_endpoints(config['RPC_FLASK_API'], cache_max_age)
-        # all_chains = load_chains(config['RPC_FLASK_API'], cache_max_age)
-        # TODO: update how to return a none result?
-        all_results = loop.run_until_complete(iu.fetch_results(all_endpoints))
-
-        # Create block_heights dict
-        block_heights = {}
-        for endpoint, results in zip(all_endpoints, all_results):
-            if results and results.get('latest_block_height'):
-                chain = endpoint[0]
-                if chain not in block_heights.keys():
-                    block_heights[chain] = []
-                block_heights[chain].append((endpoint[1], int(results.get('latest_block_height', -1))))
-            else:
-                logger.warning("Results of endpoint %s not accessible.", endpoint[1])
-
-        # Calculate block_height diffs and append points
-        block_height_diffs = {}
-        for chain in block_heights:
-            # print(chain)
-            rpc_list = block_heights[chain]
-            # print(rpc_list)
-            block_height_diffs[chain] = {}
-            max_height = max(rpc_list, key=lambda x: x[1])[1]
-            # print("max_height: ", max_height)
-            for rpc in rpc_list:
-                # print("rpc: ", rpc)
-                block_height_diffs[chain][rpc[0]] = max_height - rpc[1]
-            # for rpc in block_height_diffs:
-            #     records.append(iu.block_height_diff_point(chain=chain, url=rpc[0], block_height_diff=rpc[1], timestamp=rpc[2]))
+    if args.lease_db:
+        membership = SqliteMembership(args.lease_db, args.instance_id, lease_ttl=config.get('SHARD_LEASE_TTL', 3 * poll_interval))
+        atexit.register(membership.leave)
+        shard = Shard(membership=membership)
+    else:
+        shard = Shard(args.shard_id, args.shard_count)
 
-        timestamp = datetime.utcnow()
-        records = []
-        # Create block_height_request points
-        for endpoint, results in zip(all_endpoints, all_results):
-            if results:
+    scheduler = ProbeScheduler(default_interval=poll_interval,
+                               min_interval=config.get('MIN_PROBE_INTERVAL', 2),
+                               max_interval=config.get('MAX_PROBE_INTERVAL', 60),
+                               blocks_per_probe=config.get('BLOCKS_PER_PROBE', 1),
+                               jitter=config.get('PROBE_JITTER', 0.1))
+    if args.replay:
+        poller = Poller(config, scheduler, sink, None, None, metrics)
+        loop.run_until_complete(poller.replay(read_recording(args.replay), args.replay_speed))
+        return
+
+    # Probe in worker processes when more than one is configured, otherwise on this process' event loop
+    fetch_results = iu.fetch_results
+    if config.get('PROBE_WORKERS', 1) > 1:
+        probe_pool = ProbePool(config['PROBE_WORKERS'], timeout=config.get('PROBE_POOL_TIMEOUT', 60))
+        atexit.register(probe_pool.close)
+        fetch_results = probe_pool.fetch_results
+
+    recorder = None
+    if args.record:
+        recorder = Recorder(args.record)
+        atexit.register(recorder.close)
+
+    registry = RegistryCache(config['RPC_FLASK_API'], Path(config.get('STATE_DIR', '.')), config.get('CACHE_MAX_AGE', 60))
+    loop.run_until_complete(poll(config, registry, shard, scheduler, sink, probe_profiles, fetch_results, metrics, recorder))
+
+
+def create_sink_from_config(config: dict, metrics: PollerMetrics) -> Sink:
+    """Create the sinks in SINKS, or only InfluxDB if it's not set. Several sinks are fanned out to."""
+    sinks = []
+    for spec in config.get('SINKS', [{'type': 'influx'}]):
+        if spec['type'] != 'influx':
+            sinks.append(create_sink(spec))
+            continue
+
+        # Test connection to influx before attempting to start.
+        if not iu.test_influxdb_connection(config['INFLUXDB_URL'], config['INFLUXDB_TOKEN'], config['INFLUXDB_ORG']):
+            logger.error("Couldn't connect to influxdb at url %s\nExiting.", config['INFLUXDB_URL'])
+            sys.exit(1)
+        spool = Spool(Path(config.get('SPOOL_DIR', 'spool')), max_bytes=config.get('SPOOL_MAX_BYTES', 100_000_000))
+        sinks.append(InfluxWriter(config['INFLUXDB_URL'], config['INFLUXDB_TOKEN'], config['INFLUXDB_ORG'], config['INFLUXDB_BUCKET'], spool,
+                                  batch_size=config.get('INFLUXDB_BATCH_SIZE', 5000),
+                                  flush_interval=config.get('INFLUXDB_FLUSH_INTERVAL', config.get('POLL_INTERVAL', 10)),
+                                  metrics=metrics))
+    return sinks[0] if len(sinks) == 1 else FanOutSink(sinks)
+
+
+async def poll(config: dict, registry: RegistryCache, shard: Shard, scheduler: ProbeScheduler, sink: Sink, probe_profiles: pp.ProbeProfiles,
+               fetch_results: Callable, metrics: PollerMetrics, recorder: Recorder = None) -> None:
+    """Probe each endpoint whenever the scheduler says it's due, without waiting for slower probes to finish."""
+    await Poller(config, scheduler, sink, probe_profiles, fetch_results, metrics, recorder).run(registry, shard)
+
+
+class Poller:
+    """
+    The probe, compute and write stages of the updater, connected by bounded queues.
+
+    Probe batches run concurrently and hand their raw results to a single compute stage, which hands the
+    records to a single write stage that writes to the sink from a thread. When the sink is slow the write queue fills up,
+    then the compute queue, and then probe batches finish late. The `OverrunGuard` sees that and sheds
+    load, so memory is bounded by the queue sizes instead of growing with the backlog.
+    """
+
+    def __init__(self, config: dict, scheduler: ProbeScheduler, sink: Sink, probe_profiles: pp.ProbeProfiles, fetch_results: Callable,
+                 metrics: PollerMetrics, recorder: Recorder = None):
+        self.config = config
+        self.poll_interval = config.get('POLL_INTERVAL', 10)
+        self.scheduler = scheduler
+        self.sink = sink
+        self.probe_profiles = probe_profiles
+        self.fetch_results = fetch_results
+        self.metrics = metrics
+        self.frame = ResultFrame()
+        self.serializer = LineProtocolSerializer()
+        self.emission = EmissionPolicy(diff_deadband=config.get('EMIT_DIFF_DEADBAND', 1),
+                                       latency_deadband=config.get('EMIT_LATENCY_DEADBAND', 0.2),
+                                       heartbeat=config.get('EMIT_HEARTBEAT', 60))
+        self.progress = ChainProgress(window=config.get('PROGRESS_WINDOW', 30))
+        self.sketches = LatencySketches(period=config.get('LATENCY_SUMMARY_PERIOD', 60))
+        self.guard = OverrunGuard(policy=config.get('OVERRUN_POLICY', 'skip'),
+                                  max_in_flight=config.get('MAX_IN_FLIGHT', 1000),
+                                  failure_threshold=config.get('CIRCUIT_FAILURE_THRESHOLD', 3))
+        self.compute_queue = asyncio.Queue(config.get('STAGE_QUEUE_SIZE', 100))
+        self.write_queue = asyncio.Queue(config.get('STAGE_QUEUE_SIZE', 100))
+        self.profile_queue = asyncio.Queue(config.get('STAGE_QUEUE_SIZE', 100))
+        self.endpoints_changed = asyncio.Event()
+        self.tasks = set()
+        self.next_stats = None
+        self.recorder = recorder
+
+    async def run(self, registry: RegistryCache, shard: Shard) -> None:
+        stages = [asyncio.create_task(self.discover(registry, shard)),
+                  asyncio.create_task(self.compute()),
+                  asyncio.create_task(self.write())]
+        if self.probe_profiles:
+            stages += [asyncio.create_task(self.profiles()) for _ in range(self.config.get('PROFILE_CONCURRENCY', 4))]
+        try:
+            while True:
+                for stage in stages:
+                    if stage.done():
+                        stage.result()  # Raise whatever stopped the stage
+                for records in self.periodic_records(time.monotonic(), time.time_ns()):
+                    self.enqueue_write(records)
+
+                # How late the most overdue probe starts, a growing lag means the poller can't keep up
+                next_due = self.scheduler.next_due_time()
+                if next_due is not None:
+                    self.metrics.set('schedule_lag_seconds', max(0.0, time.monotonic() - next_due))
+                due = self.scheduler.pop_due()
+                if due:
+                    admitted, skipped = self.guard.admit(due)
+                    if skipped:
+                        reasons = Counter(reason for _, reason in skipped)
+                        for reason, count in reasons.items():
+                            self.metrics.inc('skipped_probes_total', count, reason=reason)
+                        logger.warning("Poller is overrunning, skipping the probes of %s endpoints (%s)", len(skipped), dict(reasons))
+                    if admitted:
+                        self.spawn(self.probe(admitted))
+                self.metrics.set('fan_out_limit', self.guard.limit)
+                self.metrics.set('queue_size', self.compute_queue.qsize(), stage='compute')
+                self.metrics.set('queue_size', self.write_queue.qsize(), stage='write')
+                self.metrics.set('queue_size', self.profile_queue.qsize(), stage='profiles')
+
+                # Sleep until the next probe is due, or until discovery has changed the endpoints
+                next_due = self.scheduler.next_due_time()
+                wake_up = self.next_stats if next_due is None else min(next_due, self.next_stats)
+                self.endpoints_changed.clear()
                 try:
-                    exit_code = int(results.get('exit_code', -1)) if results.get('exit_code') is not None else None
-                    if exit_code is None:
-                        logger.warning("None result for %s. Datapoint will not be added.", endpoint)
-                    elif exit_code != 0:
-                        logger.warning("Non-zero exit code found for %s. This is an indication that the endpoint isn't healthy.", endpoint)
-                    else:
-                        brp = iu.block_height_request_point(
-                            chain=endpoint[0],
-                            url=endpoint[1],
-                            data=results,
-                            block_height_diff=block_height_diffs[endpoint[0]][endpoint[1]],
-                            timestamp=timestamp)
-                        logger.info("Writing to influx %s", brp)
-                        records.append(brp)
-                except Exception as e:
-                    logger.error("Error while accessing results for %s: %s %s", endpoint, results, str(e))
-            else:
-                logger.warning("Couldn't get information from %s. Skipping.", endpoint)
+                    await asyncio.wait_for(self.endpoints_changed.wait(), max(0.0, wake_up - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Stop the stages and the probes in flight with the poller, instead of leaving them pending
+            running = stages + list(self.tasks)
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def replay(self, batches, speed: float) -> None:
+        """
+        Feed recorded probe batches through the compute and write stages, `speed` times faster than recorded.
 
-        write_to_influxdb(influxdb['url'], influxdb['token'], influxdb['org'], influxdb['bucket'], records)
-        # Sleep between making requests to avoid triggering rate limits.
-        time.sleep(poll_interval)
+        The recorded times stand in for the clock and batches are computed in order, so the points, rates and
+        summaries are the same at any speed. With a speed of 0 the batches are fed as fast as they're computed.
+        """
+        writing = asyncio.create_task(self.write())
+        start = time.perf_counter()
+        first_recorded_at = None
+        count = 0
+        for recorded_at, _, due, all_results in batches:
+            if first_recorded_at is None:
+                first_recorded_at = recorded_at
+            elif speed:
+                await asyncio.sleep(max(0.0, start + (recorded_at - first_recorded_at) / speed - time.perf_counter()))
+            for records in self.periodic_records(recorded_at, int(recorded_at * 10**9)):
+                await self.write_queue.put(records)
+            with self.metrics.timer('compute'):
+                records, _ = self.compute_records(due, all_results, recorded_at, int(recorded_at * 10**9))
+            if records:
+                await self.write_queue.put(records)
+            count += len(due)
+        await self.write_queue.join()
+        writing.cancel()
+        elapsed = time.perf_counter() - start
+        logger.info("Replayed %s probe results in %.2fs, %.0f results/s", count, elapsed, count / elapsed if elapsed else 0)
 
+    def periodic_records(self, now: float, timestamp_ns: int) -> list:
+        """The chain statistics, latency summaries and metrics that are due, as a list of record batches."""
+        batches = []
+        if self.next_stats is None:
+            self.next_stats = now + self.poll_interval
+        if now >= self.next_stats:
+            batches.append(chain_stats_points(self.frame, datetime.utcfromtimestamp(timestamp_ns / 10**9)))
+            if self.config.get('METRICS_INFLUX'):
+                batches.append(self.metrics.lines(self.serializer, timestamp_ns))
+            self.next_stats = now + self.poll_interval
+        if self.sketches.due(now):
+            batches.append(latency_summary_lines(self.serializer, self.sketches.flush(now), timestamp_ns))
+        return [records for records in batches if records]
 
-def write_to_influxdb(url: str, token: str, org: str, bucket: str, records: list) -> None:
-    try:
-        client = InfluxDBClient(url=url, token=token, org=org)
-        write_api = client.write_api(write_options=SYNCHRONOUS)
-        write_api.write(bucket=bucket, record=records)
-    except Exception as e:
-        logger.critical("Failed writing to influx. %s",  str(e))
-        sys.exit(1)
+    def spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
 
+    def enqueue_write(self, records: list) -> None:
+        """Queue records from the poll loop itself, which must not block, so they're dropped if the queue is full."""
+        if not records:
+            return
+        try:
+            self.write_queue.put_nowait(records)
+        except asyncio.QueueFull:
+            self.metrics.inc('dropped_records_total', len(records))
+            logger.warning("Write queue is full, dropping %s records", len(records))
 
-def load_endpoints(rpc_flask_api: str, cache_refresh_interval: int) -> list:
-    return load_from_flask_api(rpc_flask_api, get_all_endpoints, 'cache.json', cache_refresh_interval)
+    def remove_endpoints(self, removed: list) -> None:
+        self.frame.remove(removed)
+        self.emission.forget(removed)
+        self.progress.forget(removed)
+        self.sketches.forget(removed)
+        self.guard.forget(removed)
 
+    async def discover(self, registry: RegistryCache, shard: Shard) -> None:
+        """
+        Refresh the endpoints in the background and apply the added and removed ones to the scheduler.
 
-def load_from_flask_api(rpc_flask_api: str, rpc_flask_get_function: Callable, cache_filename: str, cache_refresh_interval: int) -> list:
-    """Load endpoints from cache or refresh if cache is stale."""
-    # Load cached values from file
-    try:
-        with open(cache_filename, 'r', encoding='utf-8') as f:
-            results, last_cache_refresh = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        logger.warning('Could not load values from %s', cache_filename)
-        results, last_cache_refresh = None, 0
+        The blocking registry and lease requests run in a thread, while the probes keep using the last good set of
+        endpoints in this instance's slice. A failed lease heartbeat leaves the slice empty until one succeeds again.
+        The new set is swapped in without awaiting in between, so probes never see a half-applied update.
+        """
+        loop = asyncio.get_running_loop()
+        all_endpoints = []
 
-    # Check if cache is stale
-    if time.time() - last_cache_refresh > cache_refresh_interval:
-        refresh_cache = True
-    else:
-        diff = time.time() - last_cache_refresh
-        remains = cache_refresh_interval - diff
-        logger.info("%s will be updated in: %s", cache_filename, remains)
-        refresh_cache = False
+        def load() -> list:
+            nonlocal all_endpoints
+            # Only keep the slice of this instance, which changes as instances join or leave. The lease is renewed
+            # first, so it doesn't expire while the registry is down.
+            shard.refresh()
+            all_endpoints = registry.load()
+            return shard.filter(all_endpoints)
+
+        while True:
+            try:
+                with self.metrics.timer('discovery'):
+                    endpoints = await loop.run_in_executor(None, load)
+            except Exception as e:
+                self.metrics.inc('discovery_failures_total')
+                logger.error("Endpoint discovery failed, keeping the last good endpoints that are still in this slice: %s", str(e))
+                endpoints = shard.filter(all_endpoints)
+            self.metrics.set('endpoints', len(endpoints))
+            added, removed = self.scheduler.update_endpoints(endpoints)
+            self.remove_endpoints(removed)
+            if added or removed:
+                logger.info("Endpoints updated, %s added and %s removed, now probing %s", len(added), len(removed), len(self.scheduler))
+                self.endpoints_changed.set()
+            await asyncio.sleep(self.poll_interval)
 
-    if refresh_cache:
+    async def probe(self, due: list) -> None:
+        """Probe the due endpoints and queue their results for the compute stage."""
+        start = time.monotonic()
+        self.metrics.add('in_flight_probes', len(due))
         try:
-            logger.info("Updating cache from Flask API")
-            results = rpc_flask_get_function(rpc_flask_api)
-            last_cache_refresh = time.time()
+            with self.metrics.timer('probe'):
+                all_results = await self.fetch_results(due)
+            if self.recorder:
+                self.recorder.record(time.time(), time.monotonic() - start, due, all_results)
+            # Waiting for room in the compute queue counts towards the duration, so backpressure shows up as overruns
+            await self.compute_queue.put((due, all_results, time.monotonic(), time.time_ns()))
+        finally:
+            self.metrics.add('in_flight_probes', -len(due))
+            interval = min(self.scheduler.interval(endpoint[0]) for endpoint in due)
+            if self.guard.finish(due, time.monotonic() - start, interval):
+                self.metrics.inc('overruns_total')
+                logger.warning("Probing %s endpoints took longer than their %.1fs interval", len(due), interval)
 
-            # Save updated cache to file
-            with open(cache_filename, 'w', encoding='utf-8') as f:
-                json.dump((results, last_cache_refresh), f)
+    async def compute(self) -> None:
+        while True:
+            due, all_results, now, timestamp_ns = await self.compute_queue.get()
+            # Results of endpoints removed or changed while they were probed would bring back their state
+            current = [i for i, endpoint in enumerate(due) if self.scheduler.endpoints.get(endpoint[1]) == endpoint]
+            if len(current) < len(due):
+                due = [due[i] for i in current]
+                all_results = [all_results[i] for i in current]
+            if not due:
+                continue
+            try:
+                with self.metrics.timer('compute'):
+                    records, heads = self.compute_records(due, all_results, now, timestamp_ns)
+                if records:
+                    await self.write_queue.put(records)
+                if self.probe_profiles:
+                    self.enqueue_profiles(due, heads)
+            except Exception as e:
+                logger.error("Couldn't compute the points of %s endpoints: %s", len(due), str(e))
 
-        except Exception as e:
-            # Log the error
-            logger.error("An error occurred while updating cache: %s", str(e))
+    def compute_records(self, due: list, all_results: list, now: float, timestamp_ns: int) -> tuple:
+        """Update the rows of the due endpoints in the result frame, return their records and head heights."""
+        # Collect the results as columns, diffs are calculated against the highest healthy endpoint of each chain
+        rows = self.frame.rows(due)
+        heights = np.full(len(due), -1, dtype=np.int64)
+        latencies = np.full(len(due), np.nan)
+        statuses = np.full(len(due), FAILED, dtype=np.int8)
+        for i, (endpoint, results) in enumerate(zip(due, all_results)):
+            if not isinstance(results, dict) or results.get('exit_code') is None:
+                logger.warning("Couldn't get information from %s. Skipping.", endpoint)
+            elif results.get('exit_code') != 0 or not results.get('latest_block_height'):
+                logger.warning("Non-zero exit code found for %s. This is an indication that the endpoint isn't healthy.", endpoint)
+            else:
+                heights[i] = int(results['latest_block_height'])
+                latencies[i] = float(results.get('time_total') or 0)
+                statuses[i] = HEALTHY
+        self.frame.update(rows, heights, latencies, statuses)
+        self.guard.record(due, statuses == HEALTHY)
+        healthy = np.flatnonzero(statuses == HEALTHY)
+        chain_max = self.frame.chain_max_height()
+        for chain_idx in np.unique(self.frame.chain_idx[rows[healthy]]):
+            self.scheduler.observe_height(self.frame.chains[chain_idx], int(chain_max[chain_idx]), now)
+            self.progress.observe_chain(self.frame.chains[chain_idx], int(chain_max[chain_idx]), now)
+        diffs = chain_max[self.frame.chain_idx[rows]] - heights
+        self.metrics.inc('probes_total', len(healthy), result='healthy')
+        self.metrics.inc('probes_total', len(due) - len(healthy), result='failed')
 
-            # Load the previous cache value
-            with open(cache_filename, 'r', encoding='utf-8') as f:
-                results, last_cache_refresh = json.load(f)
-    else:
-        logger.info("Using cached values")
-    return results
-
-
-def get_all_endpoints(rpc_flask_api: str) -> list:
-    url_api_tuples = []
-    all_chains = requests.get(f'{rpc_flask_api}/all/chains', timeout=3)
-    for chain in all_chains.json():
-        chain_info = requests.get(f'{rpc_flask_api}/chain_info?chain_name={chain["name"]}', timeout=1)
-        for url in chain_info.json()['urls']:
-            url_api_tuples.append((chain_info.json()['chain_name'], url, chain_info.json()['api_class']))
-    return url_api_tuples
+        records = []
+        # Serialize block_height_request points straight to line protocol, if they carry new information
+        for i in healthy:
+            endpoint = due[i]
+            self.progress.observe_endpoint(endpoint[0], endpoint[1], int(heights[i]), int(diffs[i]), now)
+            self.sketches.add(endpoint[0], endpoint[1], float(latencies[i]), now)
+            if not self.emission.should_emit(endpoint[1], int(heights[i]), int(diffs[i]), float(latencies[i]), now):
+                continue
+            self.serializer.block_height_request(records, endpoint[0], endpoint[1], all_results[i], int(diffs[i]), timestamp_ns,
+                                                 self.progress.stats(endpoint[0], endpoint[1], int(diffs[i]), now))
+            logger.info("Writing to influx %s", records[-1])
+        self.metrics.inc('emitted_points_total', len(records))
+        self.metrics.inc('suppressed_points_total', len(healthy) - len(records))
+        return records, {due[i][1]: int(heights[i]) for i in healthy}
+
+    def enqueue_profiles(self, due: list, heads: dict) -> None:
+        """
+        Queue the endpoints for the profiles stage. Profiles are extra, so when slow profile probes have filled the
+        queue they're dropped rather than holding up the block height points, and are due again at the next probe.
+        """
+        try:
+            self.profile_queue.put_nowait((due, heads))
+        except asyncio.QueueFull:
+            self.metrics.inc('dropped_profile_batches_total')
+            logger.warning("Profile queue is full, skipping the probe profiles of %s endpoints", len(due))
+
+    async def profiles(self) -> None:
+        """One of `PROFILE_CONCURRENCY` workers of the profiles stage, which bounds the profile probes in flight."""
+        while True:
+            due, heads = await self.profile_queue.get()
+            try:
+                await self.probe_profiles_due(due, heads)
+            except Exception as e:
+                logger.error("Couldn't run the probe profiles of %s endpoints: %s", len(due), str(e))
+
+    async def probe_profiles_due(self, due: list, heads: dict) -> None:
+        """Run the probe profiles that are due, relative to the head heights of the endpoints."""
+        profiles_due = self.probe_profiles.due(due, heads)
+        if not profiles_due:
+            return
+        with self.metrics.timer('profiles'):
+            profile_results = await self.probe_profiles.fetch_results(profiles_due, heads)
+        timestamp = datetime.utcnow()
+        records = []
+        for (endpoint, profile), results in zip(profiles_due, profile_results):
+            if isinstance(results, Exception):
+                logger.warning("Probe profile %s failed for %s: %s", profile['name'], endpoint, str(results))
+                continue
+            prp = iu.probe_request_point(chain=endpoint[0], url=endpoint[1], profile=profile['name'], data=results, timestamp=timestamp)
+            logger.info("Writing to influx %s", prp)
+            records.append(prp)
+        if records:
+            await self.write_queue.put(records)
+
+    async def write(self) -> None:
+        """Hand the queued records to the sink one batch at a time, in a thread so a slow sink doesn't block the loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            records = await self.write_queue.get()
+            try:
+                await loop.run_in_executor(None, self.sink.write, records)
+            except Exception as e:
+                logger.error("Couldn't write %s records: %s", len(records), str(e))
+            finally:
+                self.write_queue.task_done()
+
+
+def latency_summary_lines(serializer: LineProtocolSerializer, summaries: list, timestamp_ns: int) -> list:
+    lines = []
+    for chain, url, summary in summaries:
+        tags = {'chain': chain, 'scope': 'endpoint', 'url': url} if url else {'chain': chain, 'scope': 'chain'}
+        serializer.write(lines, 'latency_summary', tags, summary, timestamp_ns)
+    return lines
+
+
+def chain_stats_points(frame: ResultFrame, timestamp: datetime) -> list:
+    stats = frame.chain_stats()
+    points = []
+    for i, chain in enumerate(stats['chain']):
+        if stats['healthy_endpoints'][i] > 0:
+            points.append(iu.chain_stats_point(chain, {key: values[i] for key, values in stats.items() if key != 'chain'}, timestamp))
+    return points
 
 
 if __name__ == '__main__':